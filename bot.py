@@ -2,9 +2,16 @@ import logging
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 from config import Config
-from database.db import init_db, get_session
-from database.models import User, UserRole
+from database.db import init_db
+from database.models import UserRole
 from handlers import admin, manager, user, rating
+from services.report_queue import report_queue
+from services.question_pipeline import question_pipeline
+from services.persistence import create_persistence
+from services.routing import create_router
+from utils.settings import start_settings_listener, stop_settings_listener
+from utils.user_cache import get_user, get_or_create_user
+from utils.update_processor import PerUserUpdateProcessor
 from utils.keyboards import get_admin_main_menu, get_manager_main_menu, get_user_main_menu
 
 logging.basicConfig(
@@ -23,41 +30,33 @@ async def start(update: Update, context):
     telegram_id = update.effective_user.id
     chat_type = update.effective_chat.type
     
-    with get_session() as session:
-        db_user = session.query(User).filter_by(telegram_id=telegram_id).first()
-        
-        if not db_user:
-            db_user = User(
-                telegram_id=telegram_id,
-                username=update.effective_user.username,
-                full_name=update.effective_user.full_name,
-                role=UserRole.ADMIN if telegram_id == Config.INITIAL_ADMIN_ID else UserRole.USER
-            )
-            session.add(db_user)
-            session.commit()
-        
-        if chat_type != 'private':
-            return
-        
-        if db_user.role == UserRole.ADMIN:
-            await update.message.reply_text(
-                "👋 Добро пожаловать, администратор!\n\n"
-                "Используйте меню ниже для управления системой:",
-                reply_markup=get_admin_main_menu()
-            )
-        elif db_user.role == UserRole.MANAGER:
-            await update.message.reply_text(
-                "👋 Добро пожаловать, менеджер!\n\n"
-                "Вы можете задавать вопросы и отвечать пользователям в рабочей группе.",
-                reply_markup=get_manager_main_menu()
-            )
-        else:
-            await update.message.reply_text(
-                "👋 Добро пожаловать!\n\n"
-                "Здесь вы можете задавать вопросы во время мероприятий "
-                "и оценивать завершенные события.",
-                reply_markup=get_user_main_menu()
-            )
+    db_user = await get_or_create_user(
+        update.effective_user,
+        UserRole.ADMIN if telegram_id == Config.INITIAL_ADMIN_ID else UserRole.USER
+    )
+    
+    if chat_type != 'private':
+        return
+    
+    if db_user.role == UserRole.ADMIN:
+        await update.message.reply_text(
+            "👋 Добро пожаловать, администратор!\n\n"
+            "Используйте меню ниже для управления системой:",
+            reply_markup=get_admin_main_menu()
+        )
+    elif db_user.role == UserRole.MANAGER:
+        await update.message.reply_text(
+            "👋 Добро пожаловать, менеджер!\n\n"
+            "Вы можете задавать вопросы и отвечать пользователям в рабочей группе.",
+            reply_markup=get_manager_main_menu()
+        )
+    else:
+        await update.message.reply_text(
+            "👋 Добро пожаловать!\n\n"
+            "Здесь вы можете задавать вопросы во время мероприятий "
+            "и оценивать завершенные события.",
+            reply_markup=get_user_main_menu()
+        )
 
 
 async def cancel_command(update: Update, context):
@@ -70,41 +69,41 @@ async def help_command(update: Update, context):
     """Обработчик команды /help"""
     telegram_id = update.effective_user.id
     
-    with get_session() as session:
-        db_user = session.query(User).filter_by(telegram_id=telegram_id).first()
-        
-        if not db_user:
-            await update.message.reply_text("Используйте /start для начала работы")
-            return
-        
-        if db_user.role == UserRole.ADMIN:
-            help_text = (
-                "📖 <b>Справка для администратора</b>\n\n"
-                "Используйте кнопки меню для управления:\n\n"
-                "📅 <b>Мероприятия</b> - создание и управление\n"
-                "👥 <b>Пользователи</b> - назначение ролей\n"
-                "📊 <b>Статистика</b> - отчеты и аналитика\n"
-                "⚙️ <b>Настройки</b> - настройки бота\n\n"
-                "❓ <b>Задать вопрос</b> - вопрос во время мероприятия\n"
-                "⭐ <b>Оценить</b> - оценить завершенное мероприятие\n\n"
-                "<i>💡 Администратор автоматически имеет права менеджера</i>"
-            )
-        elif db_user.role == UserRole.MANAGER:
-            help_text = (
-                "📖 <b>Справка для менеджера</b>\n\n"
-                "❓ <b>Задать вопрос</b> - задать вопрос во время мероприятия\n"
-                "⭐ <b>Оценить</b> - оценить завершенное мероприятие\n\n"
-                "В рабочей группе отвечайте на вопросы пользователей через Reply."
-            )
-        else:
-            help_text = (
-                "📖 <b>Справка</b>\n\n"
-                "❓ <b>Задать вопрос</b> - задать вопрос во время активного мероприятия\n"
-                "⭐ <b>Оценить мероприятие</b> - оценить завершенное мероприятие\n\n"
-                "Просто выбирайте кнопки и следуйте инструкциям бота!"
-            )
-        
-        await update.message.reply_text(help_text, parse_mode='HTML')
+    db_user = await get_user(telegram_id)
+    
+    if not db_user:
+        await update.message.reply_text("Используйте /start для начала работы")
+        return
+    
+    if db_user.role == UserRole.ADMIN:
+        help_text = (
+            "📖 <b>Справка для администратора</b>\n\n"
+            "Используйте кнопки меню для управления:\n\n"
+            "📅 <b>Мероприятия</b> - создание и управление\n"
+            "👥 <b>Пользователи</b> - назначение ролей\n"
+            "📊 <b>Статистика</b> - отчеты и аналитика\n"
+            "⚙️ <b>Настройки</b> - настройки бота\n"
+            "🔎 /search - поиск по вопросам и комментариям\n\n"
+            "❓ <b>Задать вопрос</b> - вопрос во время мероприятия\n"
+            "⭐ <b>Оценить</b> - оценить завершенное мероприятие\n\n"
+            "<i>💡 Администратор автоматически имеет права менеджера</i>"
+        )
+    elif db_user.role == UserRole.MANAGER:
+        help_text = (
+            "📖 <b>Справка для менеджера</b>\n\n"
+            "❓ <b>Задать вопрос</b> - задать вопрос во время мероприятия\n"
+            "⭐ <b>Оценить</b> - оценить завершенное мероприятие\n\n"
+            "В рабочей группе отвечайте на вопросы пользователей через Reply."
+        )
+    else:
+        help_text = (
+            "📖 <b>Справка</b>\n\n"
+            "❓ <b>Задать вопрос</b> - задать вопрос во время активного мероприятия\n"
+            "⭐ <b>Оценить мероприятие</b> - оценить завершенное мероприятие\n\n"
+            "Просто выбирайте кнопки и следуйте инструкциям бота!"
+        )
+    
+    await update.message.reply_text(help_text, parse_mode='HTML')
 
 
 async def handle_private_message(update: Update, context):
@@ -128,10 +127,22 @@ async def handle_private_message(update: Update, context):
         await admin.handle_remove_role_input(update, context)
         return
     
+    if 'bulk_role' in context.user_data:
+        await admin.handle_bulk_roles_input(update, context)
+        return
+    
     if 'editing_no_events_msg' in context.user_data:
         await admin.handle_no_events_message_input(update, context)
         return
     
+    if 'searching_users' in context.user_data:
+        await admin.handle_user_search_input(update, context)
+        return
+    
+    if 'searching' in context.user_data:
+        await admin.handle_search_input(update, context)
+        return
+    
     if 'pending_rating_id' in context.user_data:
         await rating.handle_rating_comment(update, context)
         return
@@ -142,40 +153,130 @@ async def handle_private_message(update: Update, context):
     
     telegram_id = update.effective_user.id
     
-    with get_session() as session:
-        db_user = session.query(User).filter_by(telegram_id=telegram_id).first()
-        
-        if not db_user:
-            await update.message.reply_text("Используйте /start для начала работы")
-            return
-        
-        # Обработка кнопок главного меню
-        if text == "❓ Задать вопрос":
-            await user.start_question(update, context)
-        
-        elif text == "⭐ Оценить мероприятие" or text == "⭐ Оценить":
-            await rating.start_rating(update, context)
-        
-        elif text == "ℹ️ Помощь" or text == "📋 Помощь":
-            await help_command(update, context)
-        
-        elif db_user.role == UserRole.ADMIN:
-            if text == "📅 Мероприятия":
-                await admin.show_events_menu(update, context)
-            elif text == "👥 Пользователи":
-                await admin.show_users_menu(update, context)
-            elif text == "📊 Статистика":
-                await admin.show_stats_menu(update, context)
-            elif text == "⚙️ Настройки":
-                await admin.show_settings_menu(update, context)
-            else:
-                await update.message.reply_text(
-                    "Используйте кнопки меню для навигации или /start для начала."
-                )
+    db_user = await get_user(telegram_id)
+    
+    if not db_user:
+        await update.message.reply_text("Используйте /start для начала работы")
+        return
+    
+    # Обработка кнопок главного меню
+    if text == "❓ Задать вопрос":
+        await user.start_question(update, context)
+    
+    elif text == "⭐ Оценить мероприятие" or text == "⭐ Оценить":
+        await rating.start_rating(update, context)
+    
+    elif text == "ℹ️ Помощь" or text == "📋 Помощь":
+        await help_command(update, context)
+    
+    elif db_user.role == UserRole.ADMIN:
+        if text == "📅 Мероприятия":
+            await admin.show_events_menu(update, context)
+        elif text == "👥 Пользователи":
+            await admin.show_users_menu(update, context)
+        elif text == "📊 Статистика":
+            await admin.show_stats_menu(update, context)
+        elif text == "⚙️ Настройки":
+            await admin.show_settings_menu(update, context)
         else:
             await update.message.reply_text(
                 "Используйте кнопки меню для навигации или /start для начала."
             )
+    else:
+        await update.message.reply_text(
+            "Используйте кнопки меню для навигации или /start для начала."
+        )
+
+
+async def on_startup(application: Application):
+    """Загрузка настроек в кэш, подписка на их изменения и запуск приема вопросов"""
+    await start_settings_listener()
+    await question_pipeline.start(application.bot)
+
+
+async def on_shutdown(application: Application):
+    """Освобождение фоновых ресурсов при остановке бота"""
+    await question_pipeline.stop()
+    await stop_settings_listener()
+    report_queue.shutdown()
+
+
+def run_webhook(application: Application):
+    """Прием обновлений через встроенный HTTP-сервер (за reverse proxy с TLS)"""
+    url_path = Config.WEBHOOK_PATH.strip('/')
+    webhook_url = f"{Config.WEBHOOK_URL.rstrip('/')}/{url_path}"
+    
+    logger.info(f"Webhook {webhook_url}, слушаем {Config.WEBHOOK_LISTEN}:{Config.WEBHOOK_PORT}/{url_path}")
+    
+    # Все реплики регистрируют один и тот же URL; при остановке webhook не удаляется,
+    # поэтому перезапуск одной реплики не прерывает прием обновлений остальными
+    application.run_webhook(
+        listen=Config.WEBHOOK_LISTEN,
+        port=Config.WEBHOOK_PORT,
+        url_path=url_path,
+        webhook_url=webhook_url,
+        secret_token=Config.WEBHOOK_SECRET,
+        max_connections=Config.WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=Update.ALL_TYPES
+    )
+
+
+def build_application(builder=None) -> Application:
+    """Собрать приложение бота со всеми обработчиками"""
+    builder = builder or Application.builder().token(Config.BOT_TOKEN)
+    
+    # Состояние диалогов (user_data) хранится вне процесса и переживает перезапуск
+    persistence = create_persistence()
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    
+    router = create_router(persistence)
+    
+    application = (
+        builder
+        .concurrent_updates(PerUserUpdateProcessor(Config.CONCURRENT_UPDATES, router))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
+    
+    # Команды
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("cancel", cancel_command))
+    application.add_handler(CommandHandler("search", admin.search_command))
+    
+    # Callback-кнопки
+    application.add_handler(CallbackQueryHandler(admin.handle_admin_callbacks))
+    
+    # Текстовые сообщения в личке
+    application.add_handler(MessageHandler(
+        filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE,
+        handle_private_message
+    ))
+    
+    # Фото в личке
+    application.add_handler(MessageHandler(
+        filters.PHOTO & filters.ChatType.PRIVATE, 
+        user.handle_question_photo
+    ))
+    
+    # CSV со списком пользователей для массового назначения ролей
+    application.add_handler(MessageHandler(
+        filters.Document.ALL & filters.ChatType.PRIVATE,
+        admin.handle_bulk_roles_document
+    ))
+    
+    # Ответы менеджеров в рабочей группе
+    application.add_handler(MessageHandler(
+        filters.ChatType.SUPERGROUP & filters.REPLY & filters.TEXT, 
+        manager.handle_manager_reply
+    ))
+    
+    # Команда назначения менеджера в группе
+    application.add_handler(CommandHandler("promote", admin.promote_from_group))
+    
+    return application
 
 
 def main():
@@ -187,39 +288,13 @@ def main():
         init_db()
         logger.info("База данных инициализирована")
         
-        application = Application.builder().token(Config.BOT_TOKEN).build()
-        
-        # Команды
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("cancel", cancel_command))
-        
-        # Callback-кнопки
-        application.add_handler(CallbackQueryHandler(admin.handle_admin_callbacks))
-        
-        # Текстовые сообщения в личке
-        application.add_handler(MessageHandler(
-            filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE,
-            handle_private_message
-        ))
+        application = build_application()
         
-        # Фото в личке
-        application.add_handler(MessageHandler(
-            filters.PHOTO & filters.ChatType.PRIVATE, 
-            user.handle_question_photo
-        ))
-        
-        # Ответы менеджеров в рабочей группе
-        application.add_handler(MessageHandler(
-            filters.ChatType.SUPERGROUP & filters.REPLY & filters.TEXT, 
-            manager.handle_manager_reply
-        ))
-        
-        # Команда назначения менеджера в группе
-        application.add_handler(CommandHandler("promote", admin.promote_from_group))
-        
-        logger.info("✅ Бот успешно запущен")
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        logger.info(f"✅ Бот успешно запущен (режим: {Config.BOT_MODE})")
+        if Config.BOT_MODE == 'webhook':
+            run_webhook(application)
+        else:
+            application.run_polling(allowed_updates=Update.ALL_TYPES)
     
     except Exception as e:
         logger.error(f"❌ Критическая ошибка при запуске бота: {e}")
@@ -1,4 +1,5 @@
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,14 +19,87 @@ class Config:
     
     # Формируем DATABASE_URL из компонентов
     DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+    
+    # Режим получения обновлений: polling или webhook
+    BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+    
+    # Webhook (TLS терминируется на reverse proxy, бот слушает обычный HTTP)
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+    WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+    WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+    WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+    
+    # Сколько обновлений разных пользователей обрабатывать одновременно
+    CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '1'))
+    
+    # Состояние диалогов: postgres, memory (в памяти процесса) или none
+    PERSISTENCE_BACKEND = os.getenv('PERSISTENCE_BACKEND', 'postgres').lower()
+    PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', '10'))
+    
+    # Несколько реплик: внутренние адреса webhook всех реплик через запятую и номер этой реплики
+    REPLICA_URLS = [url.strip() for url in os.getenv('REPLICA_URLS', '').split(',') if url.strip()]
+    REPLICA_ID = int(os.getenv('REPLICA_ID', '0'))
     
     # Settings
     TIMEZONE = os.getenv('TIMEZONE', 'Europe/Moscow')
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     
+    # Cache
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '300'))
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '50000'))
+    ACTIVE_EVENTS_CACHE_TTL = float(os.getenv('ACTIVE_EVENTS_CACHE_TTL', '60'))
+    SETTINGS_LISTEN_RETRY = float(os.getenv('SETTINGS_LISTEN_RETRY', '5'))
+    
+    # Broadcast (лимиты Telegram: ~30 сообщений/с всего, ~1 сообщение/с в один чат)
+    BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '25'))
+    BROADCAST_PER_CHAT_INTERVAL = float(os.getenv('BROADCAST_PER_CHAT_INTERVAL', '1.0'))
+    BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '10'))
+    BROADCAST_MAX_RETRIES = int(os.getenv('BROADCAST_MAX_RETRIES', '3'))
+    
+    # Прием вопросов: пачки записи в БД и пересылка в рабочую группу
+    QUESTION_BATCH_SIZE = int(os.getenv('QUESTION_BATCH_SIZE', '200'))
+    QUESTION_QUEUE_SIZE = int(os.getenv('QUESTION_QUEUE_SIZE', '5000'))
+    QUESTION_FORWARD_INTERVAL = float(os.getenv('QUESTION_FORWARD_INTERVAL', '1.0'))  # секунд между сообщениями в группу
+    QUESTION_WRITE_BACK_DELAY = float(os.getenv('QUESTION_WRITE_BACK_DELAY', '0.2'))
+    QUESTION_FORWARD_MAX_ATTEMPTS = int(os.getenv('QUESTION_FORWARD_MAX_ATTEMPTS', '5'))  # серий повторов пересылки
+    QUESTION_BACKLOG_LIMIT = int(os.getenv('QUESTION_BACKLOG_LIMIT', '1000'))
+    
+    # Reports
+    REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+    REPORT_MAX_PENDING = int(os.getenv('REPORT_MAX_PENDING', '5'))
+    CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR', '/app/reports/charts')
+    CHART_CACHE_MAX_MB = int(os.getenv('CHART_CACHE_MAX_MB', '100'))
+    CHART_DPI = int(os.getenv('CHART_DPI', '150'))
+    # Каталог для копий отправленных отчетов (пусто - отчеты не сохраняются на диск)
+    REPORT_ARCHIVE_DIR = os.getenv('REPORT_ARCHIVE_DIR', '')
+    
+    # Частотный словарь вопросов (после изменения - python scripts/rebuild_feedback_terms.py)
+    TERMS_STOP_WORDS_FILE = os.getenv('TERMS_STOP_WORDS_FILE', '')  # доп. стоп-слова, по одному в строке
+    TERMS_STEMMER = os.getenv('TERMS_STEMMER', '')  # пусто - без стемминга, snowball - пакет snowballstemmer
+    TERMS_MIN_LENGTH = int(os.getenv('TERMS_MIN_LENGTH', '4'))
+    
     # Rating settings
     RATING_MIN = 1
     RATING_MAX = 5
+    RATING_PAGE_SIZE = int(os.getenv('RATING_PAGE_SIZE', '8'))
+    RATING_MENU_CACHE_TTL = int(os.getenv('RATING_MENU_CACHE_TTL', '600'))
+    
+    # Список мероприятий у администратора
+    EVENTS_PAGE_SIZE = int(os.getenv('EVENTS_PAGE_SIZE', '10'))
+    
+    # Справочник пользователей у администратора
+    USERS_PAGE_SIZE = int(os.getenv('USERS_PAGE_SIZE', '15'))
+    
+    # Массовое назначение ролей: не больше стольких пользователей за раз
+    BULK_ROLES_MAX_USERS = int(os.getenv('BULK_ROLES_MAX_USERS', '1000'))
+    
+    # Поиск по вопросам
+    SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', '5'))
     
     # Validation
     @classmethod
@@ -46,6 +120,27 @@ class Config:
         if missing:
             raise ValueError(f"Missing required config: {', '.join(missing)}")
         
+        if cls.BOT_MODE not in ('polling', 'webhook'):
+            raise ValueError("BOT_MODE должен быть 'polling' или 'webhook'")
+        
+        if cls.BOT_MODE == 'webhook':
+            missing = [key for key, value in (('WEBHOOK_URL', cls.WEBHOOK_URL),
+                                              ('WEBHOOK_SECRET', cls.WEBHOOK_SECRET)) if not value]
+            if missing:
+                raise ValueError(f"Missing required webhook config: {', '.join(missing)}")
+            
+            # Telegram принимает в заголовке только A-Z, a-z, 0-9, _ и -, до 256 символов
+            if not re.fullmatch(r'[A-Za-z0-9_-]{1,256}', cls.WEBHOOK_SECRET):
+                raise ValueError("WEBHOOK_SECRET: допустимы только A-Z, a-z, 0-9, _ и -, до 256 символов")
+        
+        if len(cls.REPLICA_URLS) > 1:
+            if cls.BOT_MODE != 'webhook':
+                raise ValueError("Несколько реплик (REPLICA_URLS) поддерживаются только в режиме webhook")
+            if not 0 <= cls.REPLICA_ID < len(cls.REPLICA_URLS):
+                raise ValueError(f"REPLICA_ID должен быть от 0 до {len(cls.REPLICA_URLS) - 1}")
+            if cls.PERSISTENCE_BACKEND != 'postgres':
+                raise ValueError("Для нескольких реплик нужен PERSISTENCE_BACKEND=postgres")
+        
         # Проверяем формат WORK_GROUP_ID (должен быть отрицательным)
         if cls.WORK_GROUP_ID >= 0:
             raise ValueError("WORK_GROUP_ID должен быть отрицательным числом (ID супергруппы)")
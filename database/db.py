@@ -1,19 +1,45 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
-from contextlib import contextmanager
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from contextlib import contextmanager, asynccontextmanager
+from alembic.config import Config as AlembicConfig
+from alembic import command
 from config import Config
-from database.models import Base
+import os
 import logging
 
 logger = logging.getLogger(__name__)
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 engine = create_engine(Config.DATABASE_URL, echo=False, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок для обработчиков бота: запросы не блокируют event loop
+async_engine = create_async_engine(
+    Config.ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True,
+    pool_size=Config.DB_POOL_SIZE, max_overflow=Config.DB_MAX_OVERFLOW
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+# Ключ pg_advisory_lock на время миграций; общий для всех реплик бота
+MIGRATION_LOCK_KEY = 7316402851
+
 def init_db():
-    """Инициализация базы данных"""
+    """Инициализация базы данных: применение миграций Alembic до последней версии"""
     try:
-        Base.metadata.create_all(bind=engine)
+        alembic_cfg = AlembicConfig(os.path.join(BASE_DIR, 'alembic.ini'))
+        alembic_cfg.attributes['configure_logger'] = False
+        # Реплики стартуют одновременно: миграции применяет первая, остальные ждут
+        # освобождения блокировки и находят базу уже в head
+        with engine.connect() as lock_connection:
+            lock_connection.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            try:
+                command.upgrade(alembic_cfg, 'head')
+            finally:
+                lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
         logger.info("База данных инициализирована")
     except Exception as e:
         logger.error(f"Ошибка инициализации БД: {e}")
@@ -33,6 +59,20 @@ def get_session() -> Session:
     finally:
         session.close()
 
+@asynccontextmanager
+async def get_async_session() -> AsyncSession:
+    """Асинхронный контекстный менеджер для работы с сессией"""
+    session = AsyncSessionLocal()
+    try:
+        yield session
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Ошибка в сессии БД: {e}")
+        raise
+    finally:
+        await session.close()
+
 def get_db():
     """Получить сессию БД (для dependency injection)"""
     db = SessionLocal()
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Text, Enum, Boolean
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Float, Text, Enum, Boolean, Index, UniqueConstraint, Computed, func, text
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import declarative_base, relationship, deferred
 from datetime import datetime
 import enum
 
@@ -24,12 +25,21 @@ class User(Base):
     __tablename__ = 'users'
     
     id = Column(Integer, primary_key=True)
-    telegram_id = Column(Integer, unique=True, nullable=False)
-    username = Column(String(255))
+    telegram_id = Column(BigInteger, unique=True, nullable=False)
+    username = Column(String(255), index=True)
     full_name = Column(String(255))
     role = Column(Enum(UserRole), default=UserRole.USER)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Поиск по началу username/имени без учета регистра и список сотрудников
+    __table_args__ = (
+        Index('ix_users_username_lower', func.lower(username).label('username_lower'),
+              postgresql_ops={'username_lower': 'text_pattern_ops'}),
+        Index('ix_users_full_name_lower', func.lower(full_name).label('full_name_lower'),
+              postgresql_ops={'full_name_lower': 'text_pattern_ops'}),
+        Index('ix_users_staff', 'role', postgresql_where=role != UserRole.USER),
+    )
+    
     feedbacks = relationship("Feedback", foreign_keys="Feedback.user_id", back_populates="user")
     ratings = relationship("Rating", back_populates="user")
     answered_feedbacks = relationship("Feedback", foreign_keys="Feedback.answered_by", back_populates="manager")
@@ -41,7 +51,7 @@ class Event(Base):
     name = Column(String(500), nullable=False)
     description = Column(Text)
     topic_id = Column(Integer)
-    status = Column(Enum(EventStatus), default=EventStatus.ACTIVE)
+    status = Column(Enum(EventStatus), default=EventStatus.ACTIVE, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     closed_at = Column(DateTime)
     created_by = Column(Integer, ForeignKey('users.id'))
@@ -51,17 +61,26 @@ class Event(Base):
 
 class Feedback(Base):
     __tablename__ = 'feedbacks'
+    __table_args__ = (
+        Index('ix_feedbacks_event_id_status', 'event_id', 'status'),
+        Index('ix_feedbacks_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_feedbacks_unforwarded', 'id',
+              postgresql_where=text("topic_message_id IS NULL AND status = 'NEW'")),
+    )
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
     event_id = Column(Integer, ForeignKey('events.id'), nullable=False)
     message_text = Column(Text, nullable=False)
     photo_file_id = Column(String(255))
     status = Column(Enum(FeedbackStatus), default=FeedbackStatus.NEW)
-    topic_message_id = Column(Integer)
+    topic_message_id = Column(Integer, index=True)
+    forward_attempts = Column(Integer, nullable=False, default=0, server_default='0')
     created_at = Column(DateTime, default=datetime.utcnow)
     answered_at = Column(DateTime)
     answered_by = Column(Integer, ForeignKey('users.id'))
+    # Полнотекстовый поиск; вычисляется базой и не загружается вместе с вопросом
+    search_vector = deferred(Column(TSVECTOR, Computed("to_tsvector('russian', message_text)", persisted=True)))
     
     user = relationship("User", foreign_keys=[user_id], back_populates="feedbacks")
     event = relationship("Event", back_populates="feedbacks")
@@ -69,13 +88,19 @@ class Feedback(Base):
 
 class Rating(Base):
     __tablename__ = 'ratings'
+    __table_args__ = (
+        UniqueConstraint('user_id', 'event_id', name='uq_ratings_user_event'),
+        Index('ix_ratings_search_vector', 'search_vector', postgresql_using='gin'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    event_id = Column(Integer, ForeignKey('events.id'), nullable=False)
+    event_id = Column(Integer, ForeignKey('events.id'), nullable=False, index=True)
     rating = Column(Integer, nullable=False)
     comment = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    search_vector = deferred(Column(TSVECTOR, Computed("to_tsvector('russian', coalesce(comment, ''))", persisted=True)))
     
     user = relationship("User", back_populates="ratings")
     event = relationship("Event", back_populates="ratings")
@@ -88,3 +113,30 @@ class BotSetting(Base):
     value = Column(Text)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     updated_by = Column(Integer, ForeignKey('users.id'))
+
+class ReportCache(Base):
+    """Отправленный PDF отчет по мероприятию: file_id в Telegram и версия данных, по которым он построен"""
+    __tablename__ = 'report_cache'
+    
+    id = Column(Integer, primary_key=True)
+    event_id = Column(Integer, ForeignKey('events.id', ondelete='CASCADE'), unique=True, nullable=False)
+    version = Column(String(64), nullable=False)
+    file_id = Column(String(255), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class FeedbackTerm(Base):
+    """Частота термина в вопросах мероприятия (обновляется при сохранении вопроса)"""
+    __tablename__ = 'feedback_terms'
+    
+    event_id = Column(Integer, ForeignKey('events.id', ondelete='CASCADE'), primary_key=True)
+    term = Column(String(64), primary_key=True)
+    count = Column(Integer, nullable=False)
+
+class ConversationState(Base):
+    """Состояние диалога (context.user_data / chat_data), общее для всех реплик бота"""
+    __tablename__ = 'conversation_state'
+    
+    kind = Column(String(16), primary_key=True)  # 'user' или 'chat'
+    key = Column(BigInteger, primary_key=True)   # telegram id пользователя или чата
+    data = Column(JSONB, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,21 +1,64 @@
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
-from database.db import get_session
+from sqlalchemy import select, func, exists
+from database.db import get_async_session
 from database.models import User, Event, EventStatus, UserRole, Feedback, Rating
 from utils.decorators import admin_only
+from utils.user_cache import get_user, invalidate_user, invalidate_users, get_user_cache_stats
+from handlers import user, rating
+from handlers.rating import invalidate_unrated_events
+from utils.event_registry import invalidate_active_events
+from utils.callback_router import CallbackRouter
+from services.event_list import get_events_page
+from services.user_directory import get_staff, get_users_page, normalize_user_query
+from services.roles import (parse_identifier_list, parse_identifier_csv, apply_bulk_role, build_role_notifications,
+                           IdentifierColumnNotFound)
+from services.search import parse_search_query, search_feedback
+from services.report_cache import get_report_version, get_cached_report, store_cached_report, drop_cached_report
 from utils.keyboards import (
     get_events_management_menu, get_users_management_menu, 
     get_stats_menu, get_settings_menu, get_back_button,
     get_events_to_close_keyboard, get_events_for_report_keyboard,
-    get_confirm_keyboard
+    get_confirm_keyboard, get_search_results_keyboard, get_events_list_keyboard,
+    get_users_page_keyboard, get_bulk_roles_keyboard
 )
 from config import Config
 from datetime import datetime
-import os
+import html
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Длинные названия обрезаются, чтобы страница списка укладывалась в одно сообщение
+EVENT_NAME_PREVIEW = 100
+
+SEARCH_PROMPT = (
+    "🔎 <b>Поиск по вопросам и комментариям</b>\n\n"
+    "Введите слова для поиска. Поддерживаются \"фразы\", or и -исключение.\n"
+    "Чтобы искать в одном мероприятии, добавьте его номер: <code>#12 звук</code>\n\nОтмена: /cancel"
+)
+
+ROLE_BADGES = {UserRole.ADMIN: "👑", UserRole.MANAGER: "👔", UserRole.USER: "👤"}
+
+USER_SEARCH_PROMPT = (
+    "🔎 <b>Поиск пользователя</b>\n\n"
+    "Введите начало username, имени или Telegram ID.\n"
+    "<i>Например: @ivan, Иван или 123456789</i>\n\nОтмена: /cancel"
+)
+
+BULK_ROLE_TITLES = {
+    UserRole.ADMIN: "👑 Назначение администраторов",
+    UserRole.MANAGER: "👔 Назначение менеджеров",
+    UserRole.USER: "➖ Снятие ролей",
+}
+
+# Новых ID в подтверждении: сообщение Telegram не длиннее 4096 символов
+BULK_ROLES_PREVIEW_IDS = 200
+
+# CSV больше этого размера не читаем: BULK_ROLES_MAX_USERS строк в него заведомо помещаются
+BULK_ROLES_MAX_FILE_SIZE = 1024 * 1024
+
 # ============ МЕНЮ ============
 
 @admin_only
@@ -56,187 +99,44 @@ async def show_settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 
 async def handle_admin_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Центральный обработчик всех callback запросов"""
-    query = update.callback_query
-    await query.answer()
-    
-    data = query.data
-    telegram_id = update.effective_user.id
-    
-    from handlers import user, rating
-    
-    # ВОПРОСЫ И ОЦЕНКИ
-    if data.startswith("event_"):
-        await user.handle_event_selection(update, context)
-        return
-    
-    if data.startswith("rate_"):
-        await rating.handle_rating(update, context)
-        return
-    
-    if data == "cancel":
-        context.user_data.clear()
-        try:
-            await query.edit_message_text("❌ Действие отменено.")
-        except Exception:
-            pass
-        return
-    
-    if data == "main_menu":
-        await query.edit_message_text("👋 Главное меню\n\nИспользуйте кнопки ниже для навигации.")
-        return
-    
-    # Проверка прав
-    with get_session() as session:
-        db_user = session.query(User).filter_by(telegram_id=telegram_id).first()
-        is_admin = db_user and db_user.role == UserRole.ADMIN
-    
-    # ====== МЕРОПРИЯТИЯ ======
-    if data == "events_menu":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await query.edit_message_text(
-            "📅 <b>Управление мероприятиями</b>\n\nВыберите действие:",
-            parse_mode='HTML', reply_markup=get_events_management_menu())
-    
-    elif data == "events_create":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await create_event_start(update, context)
-    
-    elif data == "events_list":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await list_events_callback(update, context)
-    
-    elif data == "events_close":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await close_event_select(update, context)
-    
-    elif data.startswith("close_event_"):
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        event_id = int(data.split("_")[2])
-        await close_event_confirm(update, context, event_id)
-    
-    elif data.startswith("confirm_close_") and not data.startswith("confirm_close_all"):
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        event_id = int(data.split("_")[2])
-        await close_event_execute(update, context, event_id)
-    
-    elif data.startswith("cancel_close_") and not data.startswith("cancel_close_all"):
-        await query.edit_message_text("❌ Закрытие отменено.", reply_markup=get_back_button("events_menu"))
-    
-    elif data == "events_close_all":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await close_all_events_confirm(update, context)
-    
-    elif data.startswith("confirm_close_all"):
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await close_all_events_execute(update, context)
-    
-    elif data.startswith("cancel_close_all"):
-        await query.edit_message_text("❌ Отменено.", reply_markup=get_back_button("events_menu"))
-    
-    # ====== ПОЛЬЗОВАТЕЛИ ======
-    elif data == "users_menu":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await query.edit_message_text(
-            "👥 <b>Управление пользователями</b>\n\nВыберите действие:",
-            parse_mode='HTML', reply_markup=get_users_management_menu())
-    
-    elif data == "users_list":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await list_users_callback(update, context)
-    
-    elif data == "users_add_admin":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await add_admin_start(update, context)
-    
-    elif data == "users_add_manager":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await add_manager_start(update, context)
-    
-    elif data == "users_remove_role":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await remove_role_start(update, context)
-    
-    # ====== СТАТИСТИКА ======
-    elif data == "stats_menu":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await query.edit_message_text(
-            "📊 <b>Статистика и отчеты</b>\n\nВыберите действие:",
-            parse_mode='HTML', reply_markup=get_stats_menu())
-    
-    elif data == "stats_general":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await show_stats_callback(update, context)
-    
-    elif data == "stats_export_all":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await export_report_all(update, context)
-    
-    elif data == "stats_export_event":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await export_report_select_event(update, context)
-    
-    elif data.startswith("report_event_"):
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        event_id = int(data.split("_")[2])
-        await export_report_event(update, context, event_id)
-    
-    # ====== НАСТРОЙКИ ======
-    elif data == "settings_menu":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await query.edit_message_text(
-            "⚙️ <b>Настройки бота</b>\n\nВыберите действие:",
-            parse_mode='HTML', reply_markup=get_settings_menu())
-    
-    elif data == "settings_no_events":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await edit_no_events_message_start(update, context)
-    
-    elif data == "settings_view":
-        if not is_admin:
-            await query.answer("❌ У вас нет прав", show_alert=True)
-            return
-        await view_settings_callback(update, context)
+    """Центральный обработчик всех callback запросов (таблица маршрутов - в конце модуля)"""
+    await callback_router.dispatch(update, context)
+
+
+async def cancel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data.clear()
+    try:
+        await update.callback_query.edit_message_text("❌ Действие отменено.")
+    except Exception:
+        pass
+
+
+async def main_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.edit_message_text("👋 Главное меню\n\nИспользуйте кнопки ниже для навигации.")
+
+
+async def events_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.edit_message_text(
+        "📅 <b>Управление мероприятиями</b>\n\nВыберите действие:",
+        parse_mode='HTML', reply_markup=get_events_management_menu())
+
+
+async def users_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.edit_message_text(
+        "👥 <b>Управление пользователями</b>\n\nВыберите действие:",
+        parse_mode='HTML', reply_markup=get_users_management_menu())
+
+
+async def stats_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.edit_message_text(
+        "📊 <b>Статистика и отчеты</b>\n\nВыберите действие:",
+        parse_mode='HTML', reply_markup=get_stats_menu())
+
+
+async def settings_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.edit_message_text(
+        "⚙️ <b>Настройки бота</b>\n\nВыберите действие:",
+        parse_mode='HTML', reply_markup=get_settings_menu())
 
 
 # ============ МЕРОПРИЯТИЯ ============
@@ -274,10 +174,9 @@ async def create_event_execute(update: Update, context: ContextTypes.DEFAULT_TYP
     try:
         topic = await context.bot.create_forum_topic(chat_id=Config.WORK_GROUP_ID, name=event_name[:128])
         
-        with get_session() as session:
-            telegram_id = update.effective_user.id
-            admin_user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            
+        admin_user = await get_user(update.effective_user.id)
+        
+        async with get_async_session() as session:
             event = Event(
                 name=event_name,
                 topic_id=topic.message_thread_id,
@@ -285,7 +184,8 @@ async def create_event_execute(update: Update, context: ContextTypes.DEFAULT_TYP
                 status=EventStatus.ACTIVE
             )
             session.add(event)
-            session.commit()
+            await session.commit()
+            await invalidate_active_events()
             
             await update.message.reply_text(
                 f"✅ Мероприятие создано!\n\n📅 Название: {event_name}\n🆔 ID: {event.id}\n"
@@ -308,41 +208,45 @@ async def create_event_execute(update: Update, context: ContextTypes.DEFAULT_TYP
             f"2. В группе включены топики (Topics)\n3. У бота есть права на управление топиками")
 
 
-async def list_events_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def list_events_callback(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                              before_id: int = None, after_id: int = None):
     query = update.callback_query
     
-    with get_session() as session:
-        events = session.query(Event).order_by(Event.created_at.desc()).all()
-        
-        if not events:
-            await query.edit_message_text("📋 Мероприятий пока нет.", reply_markup=get_back_button("events_menu"))
-            return
-        
-        message = "📋 <b>Список мероприятий:</b>\n\n"
-        for event in events:
-            status_emoji = "✅" if event.status == EventStatus.ACTIVE else "🔒"
-            feedback_count = len(event.feedbacks)
-            rating_count = len(event.ratings)
-            avg_rating = "—"
-            if rating_count > 0:
-                avg = sum(r.rating for r in event.ratings) / rating_count
-                avg_rating = f"{avg:.1f}⭐"
-            
-            message += f"{status_emoji} <b>#{event.id}</b> {event.name}\n"
-            message += f"   💬 Вопросов: {feedback_count} | ⭐ Оценок: {rating_count} ({avg_rating})\n"
-            message += f"   📅 Создано: {event.created_at.strftime('%d.%m.%Y %H:%M')}\n"
-            if event.status == EventStatus.CLOSED and event.closed_at:
-                message += f"   🔒 Закрыто: {event.closed_at.strftime('%d.%m.%Y %H:%M')}\n"
-            message += "\n"
+    async with get_async_session() as session:
+        page = await get_events_page(session, before_id=before_id, after_id=after_id)
+        if not page.rows and (before_id is not None or after_id is not None):
+            # Соседняя страница опустела - показываем самые новые
+            page = await get_events_page(session)
+    
+    if not page.rows:
+        await query.edit_message_text("📋 Мероприятий пока нет.", reply_markup=get_back_button("events_menu"))
+        return
+    
+    message = "📋 <b>Список мероприятий:</b>\n\n"
+    for event, feedback_count, rating_count, rating_avg in page.rows:
+        status_emoji = "✅" if event.status == EventStatus.ACTIVE else "🔒"
+        avg_rating = "—"
+        if rating_count > 0:
+            avg_rating = f"{rating_avg:.1f}⭐"
         
-        await query.edit_message_text(message, parse_mode='HTML', reply_markup=get_back_button("events_menu"))
+        message += f"{status_emoji} <b>#{event.id}</b> {html.escape(event.name[:EVENT_NAME_PREVIEW])}\n"
+        message += f"   💬 Вопросов: {feedback_count} | ⭐ Оценок: {rating_count} ({avg_rating})\n"
+        message += f"   📅 Создано: {event.created_at.strftime('%d.%m.%Y %H:%M')}\n"
+        if event.status == EventStatus.CLOSED and event.closed_at:
+            message += f"   🔒 Закрыто: {event.closed_at.strftime('%d.%m.%Y %H:%M')}\n"
+        message += "\n"
+    
+    await query.edit_message_text(
+        message, parse_mode='HTML',
+        reply_markup=get_events_list_keyboard(page.first_id, page.last_id, page.has_newer, page.has_older)
+    )
 
 
 async def close_event_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     
-    with get_session() as session:
-        active_events = session.query(Event).filter_by(status=EventStatus.ACTIVE).all()
+    async with get_async_session() as session:
+        active_events = (await session.scalars(select(Event).filter_by(status=EventStatus.ACTIVE))).all()
         
         if not active_events:
             await query.edit_message_text("ℹ️ Нет активных мероприятий для закрытия.",
@@ -356,8 +260,8 @@ async def close_event_select(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def close_event_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int):
     query = update.callback_query
     
-    with get_session() as session:
-        event = session.query(Event).filter_by(id=event_id).first()
+    async with get_async_session() as session:
+        event = await session.scalar(select(Event).filter_by(id=event_id))
         
         if not event:
             await query.edit_message_text("❌ Мероприятие не найдено.",
@@ -373,8 +277,8 @@ async def close_event_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def close_event_execute(update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int):
     query = update.callback_query
     
-    with get_session() as session:
-        event = session.query(Event).filter_by(id=event_id).first()
+    async with get_async_session() as session:
+        event = await session.scalar(select(Event).filter_by(id=event_id))
         
         if not event:
             await query.edit_message_text("❌ Мероприятие не найдено.",
@@ -385,34 +289,52 @@ async def close_event_execute(update: Update, context: ContextTypes.DEFAULT_TYPE
         event.closed_at = datetime.utcnow()
         event_name = event.name
         topic_id = event.topic_id
-        feedbacks_count = len(event.feedbacks)
-        user_ids = set(f.user_id for f in event.feedbacks)
-        session.commit()
-        
-        if topic_id:
-            try:
-                await context.bot.send_message(
-                    chat_id=Config.WORK_GROUP_ID,
-                    message_thread_id=topic_id,
-                    text=f"🔒 Сбор вопросов завершен!\n\n📊 Всего вопросов: {feedbacks_count}")
-            except Exception as e:
-                logger.warning(f"Не удалось отправить уведомление: {e}")
-        
-        await request_ratings_for_event(context, event_id, event_name, user_ids)
-        
-        await query.edit_message_text(
-            f"✅ Мероприятие закрыто!\n\n📅 {event_name}\n💬 Вопросов: {feedbacks_count}\n\n"
-            f"Пользователям отправлены запросы на оценку.",
-            reply_markup=get_back_button("events_menu"))
-        
-        logger.info(f"Закрыто мероприятие {event_id}")
+        feedbacks_count = await session.scalar(
+            select(func.count(Feedback.id)).where(Feedback.event_id == event_id)
+        )
+        await session.commit()
+    
+    await invalidate_active_events()
+    
+    if topic_id:
+        try:
+            await context.bot.send_message(
+                chat_id=Config.WORK_GROUP_ID,
+                message_thread_id=topic_id,
+                text=f"🔒 Сбор вопросов завершен!\n\n📊 Всего вопросов: {feedbacks_count}")
+        except Exception as e:
+            logger.warning(f"Не удалось отправить уведомление: {e}")
+    
+    await query.edit_message_text(
+        f"✅ Мероприятие закрыто!\n\n📅 {event_name}\n💬 Вопросов: {feedbacks_count}\n\n"
+        f"Запросы на оценку отправляются в фоне, прогресс будет ниже.",
+        reply_markup=get_back_button("events_menu"))
+    
+    # Новое закрытое мероприятие появляется в меню оценки у всех пользователей
+    await invalidate_unrated_events()
+    
+    # Рассылка идет в фоне, чтобы не блокировать обработку callback
+    context.application.create_task(
+        request_ratings_for_event(context, event_id, event_name, update.effective_chat.id))
+    
+    logger.info(f"Закрыто мероприятие {event_id}")
+
+
+async def cancel_close_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int = None):
+    await update.callback_query.edit_message_text("❌ Закрытие отменено.", reply_markup=get_back_button("events_menu"))
+
+
+async def cancel_close_all_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.edit_message_text("❌ Отменено.", reply_markup=get_back_button("events_menu"))
 
 
 async def close_all_events_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     
-    with get_session() as session:
-        active_count = session.query(Event).filter_by(status=EventStatus.ACTIVE).count()
+    async with get_async_session() as session:
+        active_count = await session.scalar(
+            select(func.count(Event.id)).where(Event.status == EventStatus.ACTIVE)
+        )
         
         if active_count == 0:
             await query.edit_message_text("ℹ️ Нет активных мероприятий.",
@@ -428,102 +350,185 @@ async def close_all_events_confirm(update: Update, context: ContextTypes.DEFAULT
 async def close_all_events_execute(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     
-    with get_session() as session:
-        active_events = session.query(Event).filter_by(status=EventStatus.ACTIVE).all()
+    async with get_async_session() as session:
+        active_events = (await session.scalars(select(Event).filter_by(status=EventStatus.ACTIVE))).all()
         count = len(active_events)
-        events_data = []
         
+        feedback_counts = dict((await session.execute(
+            select(Feedback.event_id, func.count(Feedback.id))
+            .where(Feedback.event_id.in_([event.id for event in active_events]))
+            .group_by(Feedback.event_id)
+        )).all()) if active_events else {}
+        
+        events_data = []
         for event in active_events:
             event.status = EventStatus.CLOSED
             event.closed_at = datetime.utcnow()
             events_data.append({
                 'id': event.id, 'name': event.name, 'topic_id': event.topic_id,
-                'feedbacks_count': len(event.feedbacks),
-                'user_ids': set(f.user_id for f in event.feedbacks)
+                'feedbacks_count': feedback_counts.get(event.id, 0)
             })
-        session.commit()
-        
-        for event_data in events_data:
-            if event_data['topic_id']:
-                try:
-                    await context.bot.send_message(
-                        chat_id=Config.WORK_GROUP_ID,
-                        message_thread_id=event_data['topic_id'],
-                        text=f"🔒 Сбор вопросов завершен!\n\n📊 Всего вопросов: {event_data['feedbacks_count']}")
-                except Exception as e:
-                    logger.warning(f"Не удалось отправить уведомление в топик: {e}")
-            
-            await request_ratings_for_event(context, event_data['id'], event_data['name'], event_data['user_ids'])
-        
-        await query.edit_message_text(
-            f"✅ Закрыто мероприятий: {count}\n\nПользователям отправлены запросы на оценку.",
-            reply_markup=get_back_button("events_menu"))
-        
-        logger.info(f"Закрыто всех активных мероприятий: {count}")
+        await session.commit()
+    
+    await invalidate_active_events()
+    
+    for event_data in events_data:
+        if event_data['topic_id']:
+            try:
+                await context.bot.send_message(
+                    chat_id=Config.WORK_GROUP_ID,
+                    message_thread_id=event_data['topic_id'],
+                    text=f"🔒 Сбор вопросов завершен!\n\n📊 Всего вопросов: {event_data['feedbacks_count']}")
+            except Exception as e:
+                logger.warning(f"Не удалось отправить уведомление в топик: {e}")
+    
+    await invalidate_unrated_events()
+    
+    await query.edit_message_text(
+        f"✅ Закрыто мероприятий: {count}\n\nЗапросы на оценку отправляются в фоне, прогресс будет ниже.",
+        reply_markup=get_back_button("events_menu"))
+    
+    for event_data in events_data:
+        context.application.create_task(request_ratings_for_event(
+            context, event_data['id'], event_data['name'], update.effective_chat.id))
+    
+    logger.info(f"Закрыто всех активных мероприятий: {count}")
 
 
 async def request_ratings_for_event(context: ContextTypes.DEFAULT_TYPE, event_id: int,
-                                    event_name: str, user_ids: set):
+                                    event_name: str, admin_chat_id: int = None):
+    """Разослать запросы на оценку участникам, которые еще не оценили мероприятие"""
     from utils.keyboards import get_rating_keyboard
+    from services.broadcast import Broadcaster
     
-    with get_session() as session:
-        for user_id in user_ids:
-            user = session.query(User).filter_by(id=user_id).first()
-            if not user:
-                continue
-            
-            existing_rating = session.query(Rating).filter_by(user_id=user_id, event_id=event_id).first()
-            if existing_rating:
-                continue
-            
-            try:
-                await context.bot.send_message(
-                    chat_id=user.telegram_id,
-                    text=f"📊 Мероприятие \"{event_name}\" завершено!\n\nПожалуйста, оцените его:",
-                    reply_markup=get_rating_keyboard(event_id))
-            except Exception as e:
-                logger.warning(f"Не удалось отправить запрос оценки пользователю {user.telegram_id}: {e}")
+    # Один запрос: авторы вопросов без оценки этого мероприятия
+    async with get_async_session() as session:
+        recipients = (await session.scalars(
+            select(User.telegram_id).distinct()
+            .join(Feedback, Feedback.user_id == User.id)
+            .where(Feedback.event_id == event_id)
+            .where(~exists().where(Rating.user_id == User.id, Rating.event_id == event_id))
+        )).all()
+    
+    reply_markup = get_rating_keyboard(event_id)
+    text = f"📊 Мероприятие \"{event_name}\" завершено!\n\nПожалуйста, оцените его:"
+    messages = [(telegram_id, {'text': text, 'reply_markup': reply_markup}) for telegram_id in recipients]
+    
+    progress_message = None
+    if admin_chat_id:
+        try:
+            progress_message = await context.bot.send_message(
+                chat_id=admin_chat_id,
+                text=f"📨 Рассылка запросов на оценку «{event_name}»: 0/{len(messages)}")
+        except Exception as e:
+            logger.warning(f"Не удалось отправить сообщение о прогрессе: {e}")
+    
+    async def report_progress(sent: int, failed: int, total: int):
+        if progress_message:
+            await context.bot.edit_message_text(
+                chat_id=admin_chat_id, message_id=progress_message.message_id,
+                text=f"📨 Рассылка запросов на оценку «{event_name}»: {sent + failed}/{total}")
+    
+    result = await Broadcaster(context.bot).send_all(messages, on_progress=report_progress)
+    
+    if progress_message:
+        try:
+            await context.bot.edit_message_text(
+                chat_id=admin_chat_id, message_id=progress_message.message_id,
+                text=f"✅ Запросы на оценку «{event_name}» разосланы\n\n"
+                     f"📨 Доставлено: {result['sent']} из {result['total']}\n"
+                     f"⚠️ Не доставлено: {result['failed']}")
+        except Exception as e:
+            logger.warning(f"Не удалось обновить сообщение о прогрессе: {e}")
+    
+    logger.info(f"Рассылка оценок по мероприятию {event_id}: {result}")
 
 
 # ============ ПОЛЬЗОВАТЕЛИ ============
 
-async def list_users_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+def format_user_line(user: User) -> str:
+    name = html.escape(user.full_name or user.username or f"ID{user.telegram_id}")
+    username = f" @{html.escape(user.username)}" if user.username else ""
+    return f"{ROLE_BADGES.get(user.role, '👤')} {name}{username} (ID: <code>{user.telegram_id}</code>)\n"
+
+
+async def list_users_callback(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                              before_id: int = None, after_id: int = None):
     query = update.callback_query
+    first_page = before_id is None and after_id is None
     
-    with get_session() as session:
-        admins = session.query(User).filter_by(role=UserRole.ADMIN).all()
-        managers = session.query(User).filter_by(role=UserRole.MANAGER).all()
-        users = session.query(User).filter_by(role=UserRole.USER).limit(50).all()
-        
-        message = "👥 <b>Список пользователей:</b>\n\n👑 <b>Администраторы:</b>\n"
-        if admins:
-            for admin in admins:
-                name = admin.full_name or admin.username or f"ID{admin.telegram_id}"
-                username = f"@{admin.username}" if admin.username else ""
-                message += f"  • {name} {username} (ID: <code>{admin.telegram_id}</code>)\n"
-        else:
-            message += "  Нет администраторов\n"
-        
+    async with get_async_session() as session:
+        page = await get_users_page(session, before_id=before_id, after_id=after_id)
+        if not page.users and not first_page:
+            page = await get_users_page(session)
+            first_page = True
+        staff = await get_staff(session) if first_page else []
+    
+    message = "👥 <b>Список пользователей:</b>\n\n"
+    if first_page:
+        admins = [member for member in staff if member.role == UserRole.ADMIN]
+        managers = [member for member in staff if member.role == UserRole.MANAGER]
+        message += "👑 <b>Администраторы:</b>\n"
+        message += "".join(f"  • {format_user_line(member)}" for member in admins) or "  Нет администраторов\n"
         message += "\n👔 <b>Менеджеры:</b>\n"
-        if managers:
-            for manager in managers:
-                name = manager.full_name or manager.username or f"ID{manager.telegram_id}"
-                username = f"@{manager.username}" if manager.username else ""
-                message += f"  • {name} {username} (ID: <code>{manager.telegram_id}</code>)\n"
-        else:
-            message += "  Нет менеджеров\n"
-        
-        total_users = session.query(User).filter_by(role=UserRole.USER).count()
-        message += f"\n👤 <b>Обычные пользователи:</b> {total_users} чел.\n"
-        if users:
-            for user in users[:10]:
-                name = user.full_name or user.username or f"ID{user.telegram_id}"
-                username = f"@{user.username}" if user.username else ""
-                message += f"  • {name} {username}\n"
-            if total_users > 10:
-                message += f"  ... и еще {total_users - 10} пользователей\n"
-        
-        await query.edit_message_text(message, parse_mode='HTML', reply_markup=get_back_button("users_menu"))
+        message += "".join(f"  • {format_user_line(member)}" for member in managers) or "  Нет менеджеров\n"
+        message += "\n"
+    
+    message += "🆕 <b>Все пользователи (новые сначала):</b>\n"
+    message += "".join(f"  • {format_user_line(user)}" for user in page.users) or "  Пока никого нет\n"
+    
+    await query.edit_message_text(
+        message, parse_mode='HTML',
+        reply_markup=get_users_page_keyboard(page.first_id, page.last_id, page.has_newer, page.has_older)
+    )
+
+
+async def users_search_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    context.user_data['searching_users'] = True
+    await query.edit_message_text(USER_SEARCH_PROMPT, parse_mode='HTML')
+
+
+async def handle_user_search_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if 'searching_users' not in context.user_data:
+        return
+    
+    prefix = normalize_user_query(update.message.text)
+    if not prefix:
+        await update.message.reply_text("❌ Введите начало username, имени или Telegram ID.")
+        return
+    
+    context.user_data.pop('searching_users', None)
+    context.user_data['user_search'] = prefix
+    message, keyboard = await render_found_users(prefix)
+    await update.message.reply_text(message, parse_mode='HTML', reply_markup=keyboard)
+
+
+async def show_found_users(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                           before_id: int = None, after_id: int = None):
+    query = update.callback_query
+    prefix = context.user_data.get('user_search')
+    if not prefix:
+        await query.edit_message_text("❌ Поиск устарел, начните заново.", reply_markup=get_back_button("users_menu"))
+        return
+    
+    message, keyboard = await render_found_users(prefix, before_id, after_id)
+    await query.edit_message_text(message, parse_mode='HTML', reply_markup=keyboard)
+
+
+async def render_found_users(prefix: str, before_id: int = None, after_id: int = None) -> tuple:
+    async with get_async_session() as session:
+        page = await get_users_page(session, prefix=prefix, before_id=before_id, after_id=after_id)
+        if not page.users and (before_id is not None or after_id is not None):
+            page = await get_users_page(session, prefix=prefix)
+    
+    if not page.users:
+        return (f"🔎 Пользователи на «{html.escape(prefix)}» не найдены.",
+                get_users_page_keyboard(None, None, False, False, found=True))
+    
+    message = f"🔎 <b>Пользователи на «{html.escape(prefix)}»:</b>\n\n"
+    message += "".join(f"  • {format_user_line(user)}" for user in page.users)
+    return message, get_users_page_keyboard(page.first_id, page.last_id, page.has_newer, page.has_older, found=True)
 
 
 async def add_admin_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -544,12 +549,12 @@ async def handle_add_admin_input(update: Update, context: ContextTypes.DEFAULT_T
 
 
 async def add_admin_execute(update: Update, context: ContextTypes.DEFAULT_TYPE, identifier: str):
-    with get_session() as session:
+    async with get_async_session() as session:
         user = None
         
         if identifier.startswith('@'):
             username = identifier[1:]
-            user = session.query(User).filter_by(username=username).first()
+            user = await session.scalar(select(User).filter_by(username=username))
             if not user:
                 await update.message.reply_text(
                     f"❌ Пользователь @{username} не найден.\n\nПользователь должен сначала написать боту /start",
@@ -563,17 +568,18 @@ async def add_admin_execute(update: Update, context: ContextTypes.DEFAULT_TYPE,
                                                 reply_markup=get_back_button("users_menu"))
                 return
             
-            user = session.query(User).filter_by(telegram_id=new_admin_id).first()
+            user = await session.scalar(select(User).filter_by(telegram_id=new_admin_id))
             if not user:
                 user = User(telegram_id=new_admin_id, role=UserRole.ADMIN)
                 session.add(user)
-                session.flush()
+                await session.flush()
         
         old_role = user.role.value
         user.role = UserRole.ADMIN
         user_telegram_id = user.telegram_id
         user_display = user.full_name or user.username or f"ID{user.telegram_id}"
-        session.commit()
+        await session.commit()
+        await invalidate_user(user_telegram_id)
         
         await update.message.reply_text(
             f"✅ Пользователь {user_display} назначен администратором.\nПредыдущая роль: {old_role}\n\n"
@@ -609,12 +615,12 @@ async def handle_add_manager_input(update: Update, context: ContextTypes.DEFAULT
 
 
 async def add_manager_execute(update: Update, context: ContextTypes.DEFAULT_TYPE, identifier: str):
-    with get_session() as session:
+    async with get_async_session() as session:
         user = None
         
         if identifier.startswith('@'):
             username = identifier[1:]
-            user = session.query(User).filter_by(username=username).first()
+            user = await session.scalar(select(User).filter_by(username=username))
             if not user:
                 await update.message.reply_text(
                     f"❌ Пользователь @{username} не найден.\n\nПользователь должен сначала написать боту /start",
@@ -628,11 +634,11 @@ async def add_manager_execute(update: Update, context: ContextTypes.DEFAULT_TYPE
                                                 reply_markup=get_back_button("users_menu"))
                 return
             
-            user = session.query(User).filter_by(telegram_id=new_manager_id).first()
+            user = await session.scalar(select(User).filter_by(telegram_id=new_manager_id))
             if not user:
                 user = User(telegram_id=new_manager_id, role=UserRole.MANAGER)
                 session.add(user)
-                session.flush()
+                await session.flush()
         
         if user.role == UserRole.ADMIN:
             user_display = user.full_name or user.username or f"ID{user.telegram_id}"
@@ -646,7 +652,8 @@ async def add_manager_execute(update: Update, context: ContextTypes.DEFAULT_TYPE
         user.role = UserRole.MANAGER
         user_telegram_id = user.telegram_id
         user_display = user.full_name or user.username or f"ID{user.telegram_id}"
-        session.commit()
+        await session.commit()
+        await invalidate_user(user_telegram_id)
         
         await update.message.reply_text(
             f"✅ Пользователь {user_display} назначен менеджером.\nПредыдущая роль: {old_role}",
@@ -681,16 +688,16 @@ async def handle_remove_role_input(update: Update, context: ContextTypes.DEFAULT
 
 
 async def remove_role_execute(update: Update, context: ContextTypes.DEFAULT_TYPE, identifier: str):
-    with get_session() as session:
+    async with get_async_session() as session:
         user = None
         
         if identifier.startswith('@'):
             username = identifier[1:]
-            user = session.query(User).filter_by(username=username).first()
+            user = await session.scalar(select(User).filter_by(username=username))
         else:
             try:
                 user_id = int(identifier)
-                user = session.query(User).filter_by(telegram_id=user_id).first()
+                user = await session.scalar(select(User).filter_by(telegram_id=user_id))
             except ValueError:
                 await update.message.reply_text("❌ ID должен быть числом.",
                                                 reply_markup=get_back_button("users_menu"))
@@ -711,7 +718,8 @@ async def remove_role_execute(update: Update, context: ContextTypes.DEFAULT_TYPE
         user.role = UserRole.USER
         user_telegram_id = user.telegram_id
         user_display = user.full_name or user.username or f"ID{user.telegram_id}"
-        session.commit()
+        await session.commit()
+        await invalidate_user(user_telegram_id)
         
         await update.message.reply_text(
             f"✅ С пользователя {user_display} снята роль.\nПредыдущая роль: {old_role}\n"
@@ -742,8 +750,8 @@ async def promote_from_group(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("❌ Нельзя назначить бота менеджером.")
         return
     
-    with get_session() as session:
-        user = session.query(User).filter_by(telegram_id=target_user.id).first()
+    async with get_async_session() as session:
+        user = await session.scalar(select(User).filter_by(telegram_id=target_user.id))
         
         if not user:
             user = User(telegram_id=target_user.id, username=target_user.username,
@@ -762,7 +770,8 @@ async def promote_from_group(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
         user_telegram_id = user.telegram_id
         user_display = user.full_name or user.username or f"ID{user.telegram_id}"
-        session.commit()
+        await session.commit()
+        await invalidate_user(user_telegram_id)
         
         await update.message.reply_text(f"✅ {user_display} назначен менеджером!")
         
@@ -776,14 +785,200 @@ async def promote_from_group(update: Update, context: ContextTypes.DEFAULT_TYPE)
         logger.info(f"Менеджер назначен через группу: {user_telegram_id}")
 
 
+# ============ МАССОВОЕ НАЗНАЧЕНИЕ РОЛЕЙ ============
+
+async def bulk_roles_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.edit_message_text(
+        "📥 <b>Массовое назначение ролей</b>\n\nВыберите действие:",
+        parse_mode='HTML', reply_markup=get_bulk_roles_keyboard())
+
+
+async def bulk_roles_start(update: Update, context: ContextTypes.DEFAULT_TYPE, role: str):
+    query = update.callback_query
+    try:
+        user_role = UserRole(role)
+    except ValueError:
+        await query.edit_message_text("❌ Неизвестная роль.", reply_markup=get_back_button("users_menu"))
+        return
+    
+    context.user_data['bulk_role'] = user_role.value
+    await query.edit_message_text(
+        f"{BULK_ROLE_TITLES[user_role]}\n\n"
+        f"Отправьте список Telegram ID и @username через пробел, запятую или с новой строки "
+        f"либо CSV-файл: из одной колонки или с колонкой <code>telegram_id</code> или <code>username</code> "
+        f"в заголовке (остальные колонки не читаются).\n\n"
+        f"<i>Например: 123456789, @ivan_petrov, @anna</i>\n\n"
+        f"Не больше {Config.BULK_ROLES_MAX_USERS} пользователей за раз.\n\nОтмена: /cancel",
+        parse_mode='HTML')
+
+
+async def handle_bulk_roles_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Состояние снимается до проверки прав: отклоненный запрос не должен перехватывать следующие сообщения
+    role = context.user_data.pop('bulk_role', None)
+    if role is None:
+        return
+    
+    identifiers, invalid = parse_identifier_list(update.message.text)
+    await bulk_roles_execute(update, context, role, identifiers, invalid)
+
+
+async def handle_bulk_roles_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    role = context.user_data.pop('bulk_role', None)
+    if role is None:
+        return
+    
+    document = update.message.document
+    if document.file_size and document.file_size > BULK_ROLES_MAX_FILE_SIZE:
+        context.user_data['bulk_role'] = role
+        await update.message.reply_text("❌ Файл слишком большой. Разбейте список на несколько файлов.")
+        return
+    
+    try:
+        telegram_file = await document.get_file()
+        content = bytes(await telegram_file.download_as_bytearray()).decode('utf-8-sig')
+    except UnicodeDecodeError:
+        context.user_data['bulk_role'] = role
+        await update.message.reply_text("❌ Не удалось прочитать файл. Сохраните CSV в кодировке UTF-8.")
+        return
+    except TelegramError as e:
+        logger.warning(f"Не удалось скачать CSV для назначения ролей: {e}")
+        context.user_data['bulk_role'] = role
+        await update.message.reply_text("❌ Не удалось скачать файл, попробуйте еще раз.")
+        return
+    
+    try:
+        identifiers, invalid = parse_identifier_csv(content)
+    except IdentifierColumnNotFound:
+        context.user_data['bulk_role'] = role
+        await update.message.reply_text(
+            "❌ В файле несколько колонок, но нет колонки telegram_id или username в первой строке. "
+            "Добавьте заголовок или оставьте в файле одну колонку с ID и @username.")
+        return
+    await bulk_roles_execute(update, context, role, identifiers, invalid)
+
+
+@admin_only
+async def bulk_roles_execute(update: Update, context: ContextTypes.DEFAULT_TYPE, role: str,
+                             identifiers: list, invalid: list):
+    if not identifiers or len(identifiers) > Config.BULK_ROLES_MAX_USERS:
+        # Права подтверждены: ждем исправленный список
+        context.user_data['bulk_role'] = role
+        if not identifiers:
+            await update.message.reply_text("❌ Не найдено ни одного Telegram ID или @username. Попробуйте еще раз.")
+        else:
+            await update.message.reply_text(
+                f"❌ Слишком много пользователей: {len(identifiers)}. "
+                f"Не больше {Config.BULK_ROLES_MAX_USERS} за раз.")
+        return
+    
+    async with get_async_session() as session:
+        preview = await apply_bulk_role(session, identifiers, UserRole(role), update.effective_user.id,
+                                        invalid, dry_run=True)
+    
+    if not preview.changed and not preview.created:
+        await update.message.reply_text(format_bulk_role_summary(preview), parse_mode='HTML',
+                                        reply_markup=get_back_button("users_menu"))
+        return
+    
+    # Роли меняются только после подтверждения: админ видит, кто будет добавлен по ID
+    context.user_data['bulk_pending'] = {'role': role, 'identifiers': identifiers, 'invalid': invalid}
+    await update.message.reply_text(format_bulk_role_summary(preview, preview=True), parse_mode='HTML',
+                                    reply_markup=get_confirm_keyboard("bulk_roles"))
+
+
+async def bulk_roles_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    pending = context.user_data.pop('bulk_pending', None)
+    if pending is None:
+        await query.edit_message_text("ℹ️ Список уже применен или отменен.",
+                                      reply_markup=get_back_button("users_menu"))
+        return
+    
+    async with get_async_session() as session:
+        result = await apply_bulk_role(session, pending['identifiers'], UserRole(pending['role']),
+                                       update.effective_user.id, pending['invalid'])
+    
+    await invalidate_users(result.affected_telegram_ids)
+    
+    await query.edit_message_text(format_bulk_role_summary(result), parse_mode='HTML',
+                                  reply_markup=get_back_button("users_menu"))
+    
+    messages = build_role_notifications(result)
+    if messages:
+        context.application.create_task(
+            notify_role_changes(context, messages, update.effective_chat.id))
+
+
+async def bulk_roles_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data.pop('bulk_pending', None)
+    await update.callback_query.edit_message_text("❌ Отменено.", reply_markup=get_back_button("users_menu"))
+
+
+def _summary_list(items: list, limit: int = 20) -> str:
+    shown = ", ".join(html.escape(str(item)) for item in items[:limit])
+    if len(items) > limit:
+        shown += f" и еще {len(items) - limit}"
+    return shown
+
+
+def format_bulk_role_summary(result, preview: bool = False) -> str:
+    """Итог массовой смены роли; preview=True - что изменится после подтверждения"""
+    if preview:
+        message = f"{BULK_ROLE_TITLES[result.role]}: <b>проверьте список</b>\n\n"
+        message += f"✅ Будет изменено: {len(result.changed)}\n"
+    else:
+        message = f"{BULK_ROLE_TITLES[result.role]}: <b>готово</b>\n\n"
+        message += f"✅ Изменено: {len(result.changed)}\n"
+    if result.changed:
+        message += _summary_list([f"{name} ({old_role.value})" for _, name, old_role in result.changed]) + "\n"
+    if result.created:
+        if preview:
+            # Новых ID бот еще не видел: показываем сколько влезает в сообщение, чтобы админ их проверил
+            message += f"🆕 Будут добавлены по ID (еще не писали боту): {len(result.created)}\n"
+            message += _summary_list(result.created, limit=BULK_ROLES_PREVIEW_IDS) + "\n"
+        else:
+            message += f"🆕 Добавлено по ID (еще не писали боту): {len(result.created)}\n"
+            message += _summary_list(result.created) + "\n"
+    if result.unchanged:
+        message += f"ℹ️ Уже с этой ролью: {len(result.unchanged)}\n"
+        message += _summary_list(result.unchanged) + "\n"
+    if result.skipped:
+        message += f"⚠️ Пропущено: {len(result.skipped)}\n"
+        message += _summary_list([f"{name} - {reason}" for name, reason in result.skipped]) + "\n"
+    if result.not_found:
+        message += f"❌ Не найдены (должны сначала написать боту /start): {len(result.not_found)}\n"
+        message += _summary_list(result.not_found) + "\n"
+    if result.invalid:
+        message += f"❓ Не распознаны: {len(result.invalid)}\n"
+        message += _summary_list(result.invalid) + "\n"
+    return message
+
+
+async def notify_role_changes(context: ContextTypes.DEFAULT_TYPE, messages: list, admin_chat_id: int):
+    """Уведомить пользователей о смене роли через общий ограничитель рассылок"""
+    from services.broadcast import Broadcaster
+    
+    result = await Broadcaster(context.bot).send_all(messages)
+    logger.info(f"Уведомления о смене роли: {result}")
+    
+    if result['failed']:
+        try:
+            await context.bot.send_message(
+                chat_id=admin_chat_id,
+                text=f"📨 Уведомления о смене роли доставлены: {result['sent']} из {result['total']}\n"
+                     f"Не доставлены тем, кто заблокировал бота или еще не писал ему.")
+        except Exception as e:
+            logger.warning(f"Не удалось сообщить итоги уведомлений: {e}")
+
+
 # ============ СТАТИСТИКА ============
 
 async def show_stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     from services.analytics import get_general_stats
     
-    with get_session() as session:
-        stats = get_general_stats(session)
+    async with get_async_session() as session:
+        stats = await session.run_sync(get_general_stats)
         
         message = "📊 <b>Общая статистика:</b>\n\n"
         message += f"📅 Всего мероприятий: {stats['total_events']}\n"
@@ -805,41 +1000,18 @@ async def show_stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 
 async def export_report_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.edit_message_text("⏳ Генерирую общий отчет, пожалуйста подождите...")
-    
-    try:
-        from services.pdf_report import generate_pdf_report
-        
-        with get_session() as session:
-            pdf_path = generate_pdf_report(session, event_id=None)
-            
-            with open(pdf_path, 'rb') as pdf_file:
-                await context.bot.send_document(
-                    chat_id=update.effective_chat.id,
-                    document=pdf_file,
-                    filename=f"report_all_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                    caption="📊 Общий отчет по всем мероприятиям")
-            
-            try:
-                os.remove(pdf_path)
-            except Exception:
-                pass
-            
-            await query.edit_message_text("✅ Отчет сгенерирован!", reply_markup=get_back_button("stats_menu"))
-            logger.info(f"Общий отчет успешно сгенерирован")
-    
-    except Exception as e:
-        logger.error(f"Ошибка генерации отчета: {e}")
-        await query.edit_message_text(f"❌ Ошибка генерации отчета: {str(e)}",
-                                      reply_markup=get_back_button("stats_menu"))
+    await enqueue_report(
+        update, context, event_id=None,
+        filename_prefix="report_all",
+        caption="📊 Общий отчет по всем мероприятиям",
+        title="общий отчет")
 
 
 async def export_report_select_event(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     
-    with get_session() as session:
-        events = session.query(Event).filter_by(status=EventStatus.CLOSED).all()
+    async with get_async_session() as session:
+        events = (await session.scalars(select(Event).filter_by(status=EventStatus.CLOSED))).all()
         
         if not events:
             await query.edit_message_text("ℹ️ Нет завершенных мероприятий для отчета.",
@@ -853,36 +1025,97 @@ async def export_report_select_event(update: Update, context: ContextTypes.DEFAU
 async def export_report_event(update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int):
     query = update.callback_query
     
-    with get_session() as session:
-        event = session.query(Event).filter_by(id=event_id).first()
+    cache_version = None
+    cached_file_id = None
+    async with get_async_session() as session:
+        event = await session.scalar(select(Event).filter_by(id=event_id))
         if not event:
             await query.edit_message_text("❌ Мероприятие не найдено.",
                                           reply_markup=get_back_button("stats_menu"))
             return
         event_name = event.name
+        
+        # Данные закрытого мероприятия почти не меняются: отчет той же версии отправляем повторно
+        if event.status == EventStatus.CLOSED:
+            cache_version = await get_report_version(session, event_id)
+            cached_file_id = await get_cached_report(session, event_id, cache_version)
+    
+    caption = f"📊 Отчет по мероприятию: {event_name}"
     
-    await query.edit_message_text(f"⏳ Генерирую отчет по мероприятию \"{event_name}\"...")
+    if cached_file_id:
+        try:
+            await context.bot.send_document(
+                chat_id=update.effective_chat.id, document=cached_file_id, caption=caption)
+            await query.edit_message_text("✅ Отчет отправлен (данные не менялись с прошлой выгрузки).",
+                                          reply_markup=get_back_button("stats_menu"))
+            logger.info(f"Отчет по мероприятию {event_id} отправлен из кэша")
+            return
+        except TelegramError as e:
+            logger.warning(f"Не удалось отправить отчет по file_id, формируем заново: {e}")
+            await drop_cached_report(event_id)
     
+    await enqueue_report(
+        update, context, event_id=event_id,
+        filename_prefix=f"report_{event_id}",
+        caption=caption,
+        title=f"отчет по мероприятию \"{event_name}\"",
+        cache_version=cache_version)
+
+
+async def enqueue_report(update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int,
+                         filename_prefix: str, caption: str, title: str, cache_version: str = None):
+    """Поставить отчет в фоновую очередь и отправить его админу, когда он будет готов"""
+    from services.report_queue import report_queue, ReportQueueFull
+    query = update.callback_query
+    
+    try:
+        job, is_new = report_queue.submit(event_id)
+    except ReportQueueFull:
+        await query.edit_message_text(
+            "⚠️ Сейчас формируется слишком много отчетов. Попробуйте через минуту.",
+            reply_markup=get_back_button("stats_menu"))
+        return
+    
+    position = report_queue.position(job)
+    if not is_new:
+        status_text = f"⏳ Такой отчет уже формируется ({title}), пришлю его, как только он будет готов."
+    elif position:
+        status_text = f"🕒 Отчет поставлен в очередь (позиция {position}): {title}."
+    else:
+        status_text = f"⚙️ Формирую {title}..."
+    await query.edit_message_text(status_text)
+    
+    context.application.create_task(deliver_report(
+        context, query, job, update.effective_chat.id, filename_prefix, caption, title, cache_version))
+
+
+async def deliver_report(context: ContextTypes.DEFAULT_TYPE, query, job, chat_id: int,
+                         filename_prefix: str, caption: str, title: str, cache_version: str = None):
+    """Дождаться готовности отчета и отправить документ"""
     try:
-        from services.pdf_report import generate_pdf_report
+        if job.status == 'queued':
+            await job.wait_started()
+            if job.status == 'running':
+                await query.edit_message_text(f"⚙️ Формирую {title}...")
         
-        with get_session() as session:
-            pdf_path = generate_pdf_report(session, event_id=event_id)
-            
-            with open(pdf_path, 'rb') as pdf_file:
-                await context.bot.send_document(
-                    chat_id=update.effective_chat.id,
-                    document=pdf_file,
-                    filename=f"report_{event_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                    caption=f"📊 Отчет по мероприятию: {event_name}")
-            
+        pdf_bytes = await job.result()
+        
+        message = await context.bot.send_document(
+            chat_id=chat_id,
+            document=pdf_bytes,
+            filename=f"{filename_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+            caption=caption)
+        
+        # Версия вычислена до генерации: если данные успели измениться, версия следующего запроса не совпадет
+        if cache_version and message.document:
             try:
-                os.remove(pdf_path)
-            except Exception:
-                pass
-            
-            await query.edit_message_text("✅ Отчет сгенерирован!", reply_markup=get_back_button("stats_menu"))
-            logger.info(f"Отчет по мероприятию {event_id} успешно сгенерирован")
+                await store_cached_report(job.event_id, cache_version, message.document.file_id)
+            except Exception as e:
+                # Отчет уже отправлен, без кэша он просто будет сгенерирован заново
+                logger.warning(f"Не удалось сохранить отчет по мероприятию {job.event_id} в кэш: {e}")
+        
+        await query.edit_message_text("✅ Отчет сгенерирован!", reply_markup=get_back_button("stats_menu"))
+        logger.info(f"Отчет {filename_prefix} успешно отправлен в чат {chat_id}")
     
     except Exception as e:
         logger.error(f"Ошибка генерации отчета: {e}")
@@ -890,26 +1123,105 @@ async def export_report_event(update: Update, context: ContextTypes.DEFAULT_TYPE
                                       reply_markup=get_back_button("stats_menu"))
 
 
+# ============ ПОИСК ============
+
+@admin_only
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/search [#id_мероприятия] текст - поиск по вопросам и комментариям"""
+    if not context.args:
+        context.user_data['searching'] = True
+        await update.message.reply_text(SEARCH_PROMPT, parse_mode='HTML')
+        return
+    
+    await run_search(update, context, ' '.join(context.args))
+
+
+async def search_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    context.user_data['searching'] = True
+    await query.edit_message_text(SEARCH_PROMPT, parse_mode='HTML')
+
+
+async def handle_search_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if 'searching' not in context.user_data:
+        return
+    
+    context.user_data.pop('searching', None)
+    await run_search(update, context, update.message.text)
+
+
+async def run_search(update: Update, context: ContextTypes.DEFAULT_TYPE, raw_query: str):
+    text, event_id = parse_search_query(raw_query)
+    if not text:
+        await update.message.reply_text("❌ Введите слова для поиска.", reply_markup=get_back_button("stats_menu"))
+        return
+    
+    # Запрос хранится в user_data: в callback_data он может не поместиться
+    context.user_data['search'] = {'text': text, 'event_id': event_id}
+    message, keyboard = await render_search_page(text, event_id, 0)
+    await update.message.reply_text(message, parse_mode='HTML', reply_markup=keyboard)
+
+
+async def show_search_results(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    query = update.callback_query
+    search = context.user_data.get('search')
+    if not search:
+        await query.edit_message_text("❌ Поиск устарел, начните заново.", reply_markup=get_back_button("stats_menu"))
+        return
+    
+    message, keyboard = await render_search_page(search['text'], search['event_id'], page)
+    await query.edit_message_text(message, parse_mode='HTML', reply_markup=keyboard)
+
+
+async def render_search_page(text: str, event_id: int, page: int) -> tuple:
+    async with get_async_session() as session:
+        hits, has_next = await search_feedback(session, text, event_id=event_id, page=page)
+    
+    scope = f" в мероприятии #{event_id}" if event_id else ""
+    if not hits and page == 0:
+        return (f"🔎 По запросу «{html.escape(text)}»{scope} ничего не найдено.",
+                get_search_results_keyboard())
+    
+    message = f"🔎 <b>Поиск:</b> «{html.escape(text)}»{scope} (стр. {page + 1})\n\n"
+    for hit in hits:
+        snippet = hit.text if len(hit.text) <= 300 else hit.text[:300] + "…"
+        if hit.kind == 'feedback':
+            message += f"❓ <b>Вопрос #{hit.id}</b>"
+        else:
+            message += f"⭐ <b>Оценка {hit.rating}</b>"
+        message += f" | #{hit.event_id} {html.escape(hit.event_name)}\n"
+        if hit.created_at:
+            message += f"   📅 {hit.created_at.strftime('%d.%m.%Y %H:%M')}\n"
+        message += f"{html.escape(snippet)}\n\n"
+    
+    return message, get_search_results_keyboard(page, has_next)
+
+
 # ============ НАСТРОЙКИ ============
 
 async def view_settings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    from utils.settings import get_setting, DEFAULT_NO_EVENTS_MESSAGE
+    from utils.settings import get_no_events_message
     
-    no_events_msg = get_setting('no_events_message', DEFAULT_NO_EVENTS_MESSAGE)
+    no_events_msg = get_no_events_message()
     
     message = "⚙️ <b>Настройки бота:</b>\n\n"
     message += "<b>1. Сообщение при отсутствии мероприятий:</b>\n"
     message += f"{no_events_msg}\n\n"
     
+    cache_stats = get_user_cache_stats()
+    message += "<b>Кэш пользователей:</b>\n"
+    message += (f"Попаданий: {cache_stats['hits']} | Промахов: {cache_stats['misses']} "
+                f"({cache_stats['hit_rate']}%) | Записей: {cache_stats['size']}\n")
+    
     await query.edit_message_text(message, parse_mode='HTML', reply_markup=get_back_button("settings_menu"))
 
 
 async def edit_no_events_message_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    from utils.settings import get_setting, DEFAULT_NO_EVENTS_MESSAGE
+    from utils.settings import get_no_events_message
     
-    current_msg = get_setting('no_events_message', DEFAULT_NO_EVENTS_MESSAGE)
+    current_msg = get_no_events_message()
     context.user_data['editing_no_events_msg'] = True
     
     await query.edit_message_text(
@@ -926,13 +1238,70 @@ async def handle_no_events_message_input(update: Update, context: ContextTypes.D
     context.user_data.pop('editing_no_events_msg', None)
     
     from utils.settings import set_setting
-    with get_session() as session:
-        telegram_id = update.effective_user.id
-        admin_user = session.query(User).filter_by(telegram_id=telegram_id).first()
-        set_setting('no_events_message', new_message, admin_user.id if admin_user else None)
+    admin_user = await get_user(update.effective_user.id)
+    await set_setting('no_events_message', new_message, admin_user.id if admin_user else None)
     
     await update.message.reply_text(
         f"✅ Сообщение обновлено!\n\n<b>Новое сообщение:</b>\n{new_message}",
         parse_mode='HTML', reply_markup=get_back_button("settings_menu"))
     
     logger.info(f"Обновлено сообщение no_events_message администратором {update.effective_user.id}")
+
+
+# ============ МАРШРУТЫ CALLBACK-КНОПОК ============
+
+ADMIN_ONLY = (UserRole.ADMIN,)
+
+callback_router = CallbackRouter()
+
+# Вопросы и оценки (доступны всем, роль не проверяется)
+callback_router.add("event_{event_id:int}", user.handle_event_selection)
+callback_router.add("rate_page_{page:int}", rating.show_rating_page)
+callback_router.add("rate_select_{event_id:int}", rating.select_event_to_rate)
+callback_router.add("rate_{event_id:int}_{rating_value:int}", rating.submit_rating)
+callback_router.add("cancel", cancel_callback)
+callback_router.add("main_menu", main_menu_callback)
+
+# Мероприятия
+callback_router.add("events_menu", events_menu_callback, ADMIN_ONLY)
+callback_router.add("events_create", create_event_start, ADMIN_ONLY)
+callback_router.add("events_list", list_events_callback, ADMIN_ONLY)
+callback_router.add("events_older_{before_id:int}", list_events_callback, ADMIN_ONLY)
+callback_router.add("events_newer_{after_id:int}", list_events_callback, ADMIN_ONLY)
+callback_router.add("events_close", close_event_select, ADMIN_ONLY)
+callback_router.add("close_event_{event_id:int}", close_event_confirm, ADMIN_ONLY)
+callback_router.add("confirm_close_{event_id:int}", close_event_execute, ADMIN_ONLY)
+callback_router.add("cancel_close_{event_id:int}", cancel_close_callback)
+callback_router.add("events_close_all", close_all_events_confirm, ADMIN_ONLY)
+callback_router.add("confirm_close_all", close_all_events_execute, ADMIN_ONLY)
+callback_router.add("cancel_close_all", cancel_close_all_callback)
+
+# Пользователи
+callback_router.add("users_menu", users_menu_callback, ADMIN_ONLY)
+callback_router.add("users_list", list_users_callback, ADMIN_ONLY)
+callback_router.add("users_older_{before_id:int}", list_users_callback, ADMIN_ONLY)
+callback_router.add("users_newer_{after_id:int}", list_users_callback, ADMIN_ONLY)
+callback_router.add("users_search", users_search_start, ADMIN_ONLY)
+callback_router.add("users_found_older_{before_id:int}", show_found_users, ADMIN_ONLY)
+callback_router.add("users_found_newer_{after_id:int}", show_found_users, ADMIN_ONLY)
+callback_router.add("users_add_admin", add_admin_start, ADMIN_ONLY)
+callback_router.add("users_add_manager", add_manager_start, ADMIN_ONLY)
+callback_router.add("users_remove_role", remove_role_start, ADMIN_ONLY)
+callback_router.add("users_bulk", bulk_roles_menu, ADMIN_ONLY)
+callback_router.add("users_bulk_{role:str}", bulk_roles_start, ADMIN_ONLY)
+callback_router.add("confirm_bulk_roles", bulk_roles_confirm, ADMIN_ONLY)
+callback_router.add("cancel_bulk_roles", bulk_roles_cancel, ADMIN_ONLY)
+
+# Статистика и поиск
+callback_router.add("stats_menu", stats_menu_callback, ADMIN_ONLY)
+callback_router.add("stats_general", show_stats_callback, ADMIN_ONLY)
+callback_router.add("stats_export_all", export_report_all, ADMIN_ONLY)
+callback_router.add("stats_export_event", export_report_select_event, ADMIN_ONLY)
+callback_router.add("report_event_{event_id:int}", export_report_event, ADMIN_ONLY)
+callback_router.add("search_start", search_start, ADMIN_ONLY)
+callback_router.add("search_page_{page:int}", show_search_results, ADMIN_ONLY)
+
+# Настройки
+callback_router.add("settings_menu", settings_menu_callback, ADMIN_ONLY)
+callback_router.add("settings_no_events", edit_no_events_message_start, ADMIN_ONLY)
+callback_router.add("settings_view", view_settings_callback, ADMIN_ONLY)
@@ -1,8 +1,10 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from database.db import get_session
-from database.models import Feedback, User
+from sqlalchemy import select
+from database.db import get_async_session
+from database.models import Feedback, User, Event
 from utils.decorators import manager_or_admin
+from utils.user_cache import get_user
 from config import Config
 from datetime import datetime
 import logging
@@ -21,25 +23,24 @@ async def handle_manager_reply(update: Update, context: ContextTypes.DEFAULT_TYP
     reply_to_message_id = update.message.reply_to_message.message_id
     manager_reply = update.message.text
     
-    with get_session() as session:
-        feedback = session.query(Feedback).filter_by(
-            topic_message_id=reply_to_message_id
-        ).first()
+    async with get_async_session() as session:
+        feedback = await session.scalar(
+            select(Feedback).filter_by(topic_message_id=reply_to_message_id)
+        )
         
         if not feedback:
             return
         
-        user = session.query(User).filter_by(id=feedback.user_id).first()
-        manager = session.query(User).filter_by(
-            telegram_id=update.effective_user.id
-        ).first()
+        user = await session.get(User, feedback.user_id)
+        event = await session.get(Event, feedback.event_id)
+        manager = await get_user(update.effective_user.id)
         
         if not user or not manager:
             return
         
         feedback.answered_by = manager.id
         feedback.answered_at = datetime.utcnow()
-        session.commit()
+        await session.commit()
         
         try:
             manager_name = manager.full_name or manager.username or "Менеджер"
@@ -48,7 +49,7 @@ async def handle_manager_reply(update: Update, context: ContextTypes.DEFAULT_TYP
                 chat_id=user.telegram_id,
                 text=f"💬 Ответ на ваш вопрос:\n"
                      f"👔 От: {manager_name}\n"
-                     f"📅 Мероприятие: {feedback.event.name}\n\n"
+                     f"📅 Мероприятие: {event.name}\n\n"
                      f"{manager_reply}"
             )
             
@@ -1,119 +1,181 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from database.db import get_session
-from database.models import Event, Rating, User, EventStatus
+from sqlalchemy import select, exists
+from sqlalchemy.exc import IntegrityError
+from database.db import get_async_session
+from database.models import Event, Rating, EventStatus
 from utils.decorators import registered_user
+from utils.user_cache import get_user
+from utils.cache import TTLCache
+from utils.settings import register_invalidator, publish_invalidation
 from utils.keyboards import get_rating_keyboard, get_events_to_rate_keyboard
+from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Непроцененные мероприятия пользователя: {user_id: {page: (events, has_next)}}
+_unrated_cache = TTLCache(ttl=Config.RATING_MENU_CACHE_TTL, maxsize=Config.USER_CACHE_SIZE)
+
+
+async def get_unrated_events(user_id: int, page: int = 0) -> tuple:
+    """Страница закрытых мероприятий, которые пользователь еще не оценил: (events, has_next)"""
+    pages = _unrated_cache.get(user_id)
+    if pages is not None and page in pages:
+        return pages[page]
+    
+    page_size = Config.RATING_PAGE_SIZE
+    async with get_async_session() as session:
+        rows = (await session.execute(
+            select(Event.id, Event.name)
+            .where(Event.status == EventStatus.CLOSED)
+            .where(~exists().where(Rating.event_id == Event.id, Rating.user_id == user_id))
+            .order_by(Event.closed_at.desc().nullslast(), Event.id.desc())
+            .offset(page * page_size)
+            .limit(page_size + 1)
+        )).all()
+    
+    result = (rows[:page_size], len(rows) > page_size)
+    if pages is None:
+        pages = {}
+        _unrated_cache.set(user_id, pages)
+    pages[page] = result
+    return result
+
+
+def _invalidate_unrated_local(user_id: int = None) -> None:
+    if user_id is None:
+        _unrated_cache.clear()
+    else:
+        _unrated_cache.invalidate(user_id)
+
+
+register_invalidator('unrated_events', _invalidate_unrated_local)
+
+
+async def invalidate_unrated_events(user_id: int = None) -> None:
+    """Сбросить кэш меню оценки во всех репликах для пользователя (или для всех, если мероприятие закрыто)"""
+    _invalidate_unrated_local(user_id)
+    await publish_invalidation('unrated_events', None if user_id is None else [user_id])
+
+
 @registered_user
 async def start_rating(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начать процесс оценки мероприятия"""
-    with get_session() as session:
-        telegram_id = update.effective_user.id
-        user = session.query(User).filter_by(telegram_id=telegram_id).first()
-        
-        # Получаем закрытые мероприятия, которые пользователь еще не оценил
-        closed_events = session.query(Event).filter_by(status=EventStatus.CLOSED).all()
-        
-        unrated_events = []
-        for event in closed_events:
-            existing_rating = session.query(Rating).filter_by(
-                user_id=user.id,
-                event_id=event.id
-            ).first()
-            
-            if not existing_rating:
-                unrated_events.append(event)
-        
-        if not unrated_events:
-            await update.message.reply_text(
-                "ℹ️ Нет завершенных мероприятий для оценки.\n\n"
-                "Вы уже оценили все доступные мероприятия!"
-            )
-            return
-        
+    user = await get_user(update.effective_user.id)
+    
+    unrated_events, has_next = await get_unrated_events(user.id)
+    
+    if not unrated_events:
         await update.message.reply_text(
-            "⭐ Выберите мероприятие для оценки:",
-            reply_markup=get_events_to_rate_keyboard(unrated_events)
+            "ℹ️ Нет завершенных мероприятий для оценки.\n\n"
+            "Вы уже оценили все доступные мероприятия!"
         )
+        return
+    
+    await update.message.reply_text(
+        "⭐ Выберите мероприятие для оценки:",
+        reply_markup=get_events_to_rate_keyboard(unrated_events, page=0, has_next=has_next)
+    )
 
 @registered_user
-async def handle_rating(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработка оценки"""
+async def show_rating_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    """Переключение страницы меню оценки"""
     query = update.callback_query
-    await query.answer()
+    page = max(page, 0)
     
-    callback_data = query.data.split("_")
+    user = await get_user(update.effective_user.id)
+    unrated_events, has_next = await get_unrated_events(user.id, page)
     
-    if callback_data[1] == "select":
-        # Выбрано мероприятие для оценки
-        event_id = int(callback_data[2])
+    if not unrated_events:
+        await query.edit_message_text("ℹ️ Нет завершенных мероприятий для оценки.")
+        return
+    
+    await query.edit_message_text(
+        "⭐ Выберите мероприятие для оценки:",
+        reply_markup=get_events_to_rate_keyboard(unrated_events, page=page, has_next=has_next)
+    )
+
+@registered_user
+async def select_event_to_rate(update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int):
+    """Выбрано мероприятие для оценки"""
+    query = update.callback_query
+    
+    async with get_async_session() as session:
+        event = await session.get(Event, event_id)
         
-        with get_session() as session:
-            event = session.query(Event).filter_by(id=event_id).first()
-            
-            if not event:
-                await query.edit_message_text("❌ Мероприятие не найдено.")
-                return
+        if not event:
+            await query.edit_message_text("❌ Мероприятие не найдено.")
+            return
+    
+    await query.edit_message_text(
+        f"⭐ Оцените мероприятие:\n\n"
+        f"📅 {event.name}\n\n"
+        f"Выберите количество звезд:",
+        reply_markup=get_rating_keyboard(event_id)
+    )
+
+@registered_user
+async def submit_rating(update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int, rating_value: int):
+    """Сохранение выбранной оценки"""
+    query = update.callback_query
+    
+    if not Config.RATING_MIN <= rating_value <= Config.RATING_MAX:
+        await query.answer("❌ Некорректная оценка", show_alert=True)
+        return
+    
+    telegram_id = update.effective_user.id
+    
+    user = await get_user(telegram_id)
+    
+    async with get_async_session() as session:
+        event = await session.get(Event, event_id)
+        
+        if not event:
+            await query.edit_message_text("❌ Мероприятие не найдено.")
+            return
+        
+        # Проверяем, не оставлена ли уже оценка
+        existing_rating = await session.scalar(
+            select(Rating).filter_by(user_id=user.id, event_id=event.id)
+        )
+        
+        if existing_rating:
+            await query.edit_message_text("ℹ️ Вы уже оценили это мероприятие.")
+            return
+        
+        # Сохраняем оценку
+        rating = Rating(
+            user_id=user.id,
+            event_id=event.id,
+            rating=rating_value
+        )
+        session.add(rating)
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Параллельное нажатие: оценка уже сохранена другим запросом
+            await session.rollback()
+            await query.edit_message_text("ℹ️ Вы уже оценили это мероприятие.")
+            return
+        
+        # Обновления пользователя обрабатывает одна реплика: рассылать сброс не нужно
+        _invalidate_unrated_local(user.id)
+        
+        stars = "⭐" * rating_value
         
         await query.edit_message_text(
-            f"⭐ Оцените мероприятие:\n\n"
-            f"📅 {event.name}\n\n"
-            f"Выберите количество звезд:",
-            reply_markup=get_rating_keyboard(event_id)
+            f"✅ Спасибо за оценку!\n\n"
+            f"📅 Мероприятие: {event.name}\n"
+            f"⭐ Ваша оценка: {stars}\n\n"
+            f"Хотите оставить комментарий? Напишите его следующим сообщением.\n"
+            f"Или отправьте /skip чтобы пропустить."
         )
-    
-    else:
-        # Выбрана оценка
-        event_id = int(callback_data[1])
-        rating_value = int(callback_data[2])
         
-        telegram_id = update.effective_user.id
+        # Сохраняем в контексте для добавления комментария
+        context.user_data['pending_rating_id'] = rating.id
         
-        with get_session() as session:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            event = session.query(Event).filter_by(id=event_id).first()
-            
-            if not event:
-                await query.edit_message_text("❌ Мероприятие не найдено.")
-                return
-            
-            # Проверяем, не оставлена ли уже оценка
-            existing_rating = session.query(Rating).filter_by(
-                user_id=user.id,
-                event_id=event.id
-            ).first()
-            
-            if existing_rating:
-                await query.edit_message_text("ℹ️ Вы уже оценили это мероприятие.")
-                return
-            
-            # Сохраняем оценку
-            rating = Rating(
-                user_id=user.id,
-                event_id=event.id,
-                rating=rating_value
-            )
-            session.add(rating)
-            session.commit()
-            
-            stars = "⭐" * rating_value
-            
-            await query.edit_message_text(
-                f"✅ Спасибо за оценку!\n\n"
-                f"📅 Мероприятие: {event.name}\n"
-                f"⭐ Ваша оценка: {stars}\n\n"
-                f"Хотите оставить комментарий? Напишите его следующим сообщением.\n"
-                f"Или отправьте /skip чтобы пропустить."
-            )
-            
-            # Сохраняем в контексте для добавления комментария
-            context.user_data['pending_rating_id'] = rating.id
-            
-            logger.info(f"Пользователь {telegram_id} оценил мероприятие {event_id} на {rating_value}")
+        logger.info(f"Пользователь {telegram_id} оценил мероприятие {event_id} на {rating_value}")
 
 @registered_user
 async def handle_rating_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -129,12 +191,12 @@ async def handle_rating_comment(update: Update, context: ContextTypes.DEFAULT_TY
         context.user_data.pop('pending_rating_id', None)
         return
     
-    with get_session() as session:
-        rating = session.query(Rating).filter_by(id=rating_id).first()
+    async with get_async_session() as session:
+        rating = await session.get(Rating, rating_id)
         
         if rating:
             rating.comment = comment
-            session.commit()
+            await session.commit()
             
             await update.message.reply_text(
                 "✅ Спасибо! Ваша оценка и комментарий сохранены."
@@ -0,0 +1,96 @@
+"""initial schema
+
+Схема, которую раньше создавал Base.metadata.create_all. Таблицы создаются
+только если их еще нет, поэтому миграция безопасна для существующих баз.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'users' not in existing:
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('telegram_id', sa.Integer(), nullable=False, unique=True),
+            sa.Column('username', sa.String(255)),
+            sa.Column('full_name', sa.String(255)),
+            sa.Column('role', sa.Enum('USER', 'MANAGER', 'ADMIN', name='userrole')),
+            sa.Column('created_at', sa.DateTime()),
+        )
+
+    if 'events' not in existing:
+        op.create_table(
+            'events',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(500), nullable=False),
+            sa.Column('description', sa.Text()),
+            sa.Column('topic_id', sa.Integer()),
+            sa.Column('status', sa.Enum('ACTIVE', 'CLOSED', name='eventstatus')),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('closed_at', sa.DateTime()),
+            sa.Column('created_by', sa.Integer(), sa.ForeignKey('users.id')),
+        )
+
+    if 'feedbacks' not in existing:
+        op.create_table(
+            'feedbacks',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id'), nullable=False),
+            sa.Column('message_text', sa.Text(), nullable=False),
+            sa.Column('photo_file_id', sa.String(255)),
+            sa.Column('status', sa.Enum('NEW', 'IN_PROGRESS', 'ANSWERED', 'CLOSED', name='feedbackstatus')),
+            sa.Column('topic_message_id', sa.Integer()),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('answered_at', sa.DateTime()),
+            sa.Column('answered_by', sa.Integer(), sa.ForeignKey('users.id')),
+        )
+
+    if 'ratings' not in existing:
+        op.create_table(
+            'ratings',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id'), nullable=False),
+            sa.Column('rating', sa.Integer(), nullable=False),
+            sa.Column('comment', sa.Text()),
+            sa.Column('created_at', sa.DateTime()),
+        )
+
+    if 'bot_settings' not in existing:
+        op.create_table(
+            'bot_settings',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('key', sa.String(100), nullable=False, unique=True),
+            sa.Column('value', sa.Text()),
+            sa.Column('updated_at', sa.DateTime()),
+            sa.Column('updated_by', sa.Integer(), sa.ForeignKey('users.id')),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('bot_settings')
+    op.drop_table('ratings')
+    op.drop_table('feedbacks')
+    op.drop_table('events')
+    op.drop_table('users')
+    sa.Enum(name='feedbackstatus').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='eventstatus').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='userrole').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,55 @@
+"""hot lookup indexes, unique rating per user, bigint telegram_id
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Telegram ID пользователей не помещаются в int4
+    op.alter_column('users', 'telegram_id', type_=sa.BigInteger(),
+                    existing_type=sa.Integer(), existing_nullable=False)
+    op.create_index('ix_users_username', 'users', ['username'])
+
+    op.create_index('ix_events_status', 'events', ['status'])
+
+    # Ответ менеджера ищет вопрос по id сообщения в топике
+    op.create_index('ix_feedbacks_topic_message_id', 'feedbacks', ['topic_message_id'])
+    op.create_index('ix_feedbacks_user_id', 'feedbacks', ['user_id'])
+    op.create_index('ix_feedbacks_event_id_status', 'feedbacks', ['event_id', 'status'])
+
+    # Перед уникальным ограничением оставляем только первую оценку пользователя
+    op.execute(
+        "DELETE FROM ratings a USING ratings b "
+        "WHERE a.user_id = b.user_id AND a.event_id = b.event_id AND a.id > b.id"
+    )
+    op.create_unique_constraint('uq_ratings_user_event', 'ratings', ['user_id', 'event_id'])
+    op.create_index('ix_ratings_event_id', 'ratings', ['event_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ratings_event_id', table_name='ratings')
+    op.drop_constraint('uq_ratings_user_event', 'ratings', type_='unique')
+
+    op.drop_index('ix_feedbacks_event_id_status', table_name='feedbacks')
+    op.drop_index('ix_feedbacks_user_id', table_name='feedbacks')
+    op.drop_index('ix_feedbacks_topic_message_id', table_name='feedbacks')
+
+    op.drop_index('ix_events_status', table_name='events')
+
+    op.drop_index('ix_users_username', table_name='users')
+    op.alter_column('users', 'telegram_id', type_=sa.Integer(),
+                    existing_type=sa.BigInteger(), existing_nullable=False)
@@ -0,0 +1,39 @@
+"""report cache for closed events, ratings.updated_at
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Версия данных отчета учитывает изменение оценок (например, добавленный комментарий)
+    op.add_column('ratings', sa.Column('updated_at', sa.DateTime()))
+    op.execute("UPDATE ratings SET updated_at = created_at")
+
+    op.create_table(
+        'report_cache',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id', ondelete='CASCADE'),
+                  nullable=False, unique=True),
+        sa.Column('version', sa.String(64), nullable=False),
+        sa.Column('file_id', sa.String(255), nullable=False),
+        sa.Column('created_at', sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('report_cache')
+    op.drop_column('ratings', 'updated_at')
@@ -0,0 +1,56 @@
+"""incremental word frequency table for feedback text
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Стоп-слова services.terms.DEFAULT_STOP_WORDS на момент миграции
+STOP_WORDS = [
+    'в', 'на', 'и', 'с', 'по', 'для', 'не', 'от', 'за', 'к', 'до', 'из', 'у', 'о',
+    'что', 'это', 'как', 'так', 'но', 'а', 'то', 'все', 'она', 'он', 'они', 'мы',
+    'вы', 'я', 'был', 'была', 'было', 'были', 'есть', 'быть', 'будет'
+]
+
+
+def upgrade() -> None:
+    op.create_table(
+        'feedback_terms',
+        sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('term', sa.String(64), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False),
+    )
+
+    # Заполняем словарь по уже накопленным вопросам правилами анализатора по умолчанию
+    # (services.terms.TermAnalyzer без стоп-слов из файла и стемминга): слова \w+
+    # в нижнем регистре от 4 символов, кроме чисел и стоп-слов, не длиннее 64 символов.
+    # Миграция не импортирует код бота, чтобы не меняться вместе с ним. При других
+    # TERMS_* после обновления нужен пересчет: python scripts/rebuild_feedback_terms.py
+    # lower() и \w работают с кириллицей при UTF-8 локали базы (LC_CTYPE не C)
+    stop_words = ', '.join(f"'{word}'" for word in STOP_WORDS)
+    op.execute(rf"""
+        INSERT INTO feedback_terms (event_id, term, count)
+        SELECT f.event_id, left(w.word[1], 64), count(*)
+        FROM feedbacks f
+        CROSS JOIN LATERAL regexp_matches(lower(f.message_text), '\w+', 'g') AS w(word)
+        WHERE char_length(w.word[1]) >= 4
+          AND w.word[1] !~ '^[0-9]+$'
+          AND w.word[1] <> ALL(ARRAY[{stop_words}])
+        GROUP BY f.event_id, left(w.word[1], 64)
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('feedback_terms')
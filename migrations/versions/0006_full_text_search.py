@@ -0,0 +1,47 @@
+"""full-text search over questions and rating comments
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Хранимый tsvector: проверка совпадения не пересчитывает to_tsvector для каждой строки
+    op.add_column('feedbacks', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('russian', message_text)", persisted=True)
+    ))
+    op.create_index('ix_feedbacks_search_vector', 'feedbacks', ['search_vector'], postgresql_using='gin')
+
+    op.add_column('ratings', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('russian', coalesce(comment, ''))", persisted=True)
+    ))
+    op.create_index('ix_ratings_search_vector', 'ratings', ['search_vector'], postgresql_using='gin')
+
+    # Подробная статистика лексем: иначе планировщик считает редкие слова частыми
+    # и ищет их перебором по первичному ключу вместо GIN-индекса
+    op.execute("ALTER TABLE feedbacks ALTER COLUMN search_vector SET STATISTICS 1000")
+    op.execute("ALTER TABLE ratings ALTER COLUMN search_vector SET STATISTICS 1000")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ratings_search_vector', table_name='ratings')
+    op.drop_column('ratings', 'search_vector')
+
+    op.drop_index('ix_feedbacks_search_vector', table_name='feedbacks')
+    op.drop_column('feedbacks', 'search_vector')
@@ -0,0 +1,33 @@
+"""case-insensitive prefix indexes for the user directory, staff index
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # text_pattern_ops: LIKE 'префикс%' использует индекс при любой локали базы
+    op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username) text_pattern_ops')])
+    op.create_index('ix_users_full_name_lower', 'users', [sa.text('lower(full_name) text_pattern_ops')])
+
+    # Администраторов и менеджеров единицы: частичный индекс не растет с числом участников
+    op.create_index('ix_users_staff', 'users', ['role'], postgresql_where=sa.text("role <> 'USER'"))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_staff', table_name='users')
+    op.drop_index('ix_users_full_name_lower', table_name='users')
+    op.drop_index('ix_users_username_lower', table_name='users')
@@ -0,0 +1,31 @@
+"""count failed forwards of questions to the work group
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('feedbacks', sa.Column('forward_attempts', sa.Integer(), nullable=False, server_default='0'))
+
+    # Непересланных вопросов единицы: запуск бота не читает всю таблицу вопросов
+    op.create_index('ix_feedbacks_unforwarded', 'feedbacks', ['id'],
+                    postgresql_where=sa.text("topic_message_id IS NULL AND status = 'NEW'"))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_feedbacks_unforwarded', table_name='feedbacks')
+    op.drop_column('feedbacks', 'forward_attempts')
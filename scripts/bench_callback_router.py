@@ -0,0 +1,46 @@
+"""
+Микробенчмарк маршрутизации callback-кнопок: стоимость поиска маршрута и
+разбора параметров для каждого зарегистрированного шаблона.
+    python scripts/bench_callback_router.py --number 200000
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handlers.admin import callback_router
+
+
+def sample_data(pattern: str) -> str:
+    """Пример callback_data для шаблона: параметры заменяются значениями"""
+    return re.sub(r'\{(\w+)(?::(int|str))?\}',
+                  lambda m: '12345' if m.group(2) == 'int' else 'value', pattern)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=200000, help='вызовов на шаблон')
+    args = parser.parse_args()
+
+    patterns = list(callback_router._exact)
+    patterns += [route.pattern for routes in callback_router._prefixed.values() for route in routes]
+
+    total = 0.0
+    for pattern in patterns:
+        data = sample_data(pattern)
+        route, _ = callback_router.resolve(data)
+        assert route is not None and route.pattern == pattern, f"{data} -> {route and route.pattern}"
+
+        seconds = timeit.timeit(lambda: callback_router.resolve(data), number=args.number)
+        total += seconds
+        roles = 'все' if route.roles is None else ', '.join(sorted(role.value for role in route.roles))
+        print(f"{pattern:42} {seconds / args.number * 1e9:8.0f} нс  ({roles})")
+
+    print(f"\nВ среднем: {total / (len(patterns) * args.number) * 1e9:.0f} нс на callback, маршрутов: {len(patterns)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Бенчмарк поиска вопроса по topic_message_id (ответ менеджера в топике) на
+большой таблице вопросов: с индексом ix_feedbacks_topic_message_id и без него.
+
+Данные создаются в отдельной схеме базы из DATABASE_URL и удаляются после
+замера; таблицы бота не затрагиваются.
+    python scripts/bench_reply_lookup.py --feedbacks 1000000 --lookups 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from database.db import engine
+from database.models import Base, Feedback
+from config import Config
+
+SCHEMA = 'bench_reply_lookup'
+
+
+def populate(feedbacks: int) -> None:
+    """Схема SCHEMA с таблицами бота и feedbacks вопросами, у каждого свой topic_message_id"""
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        Base.metadata.create_all(connection.execution_options(schema_translate_map={None: SCHEMA}))
+
+        connection.execute(text(
+            f"INSERT INTO {SCHEMA}.users (telegram_id, full_name, role, created_at) "
+            f"SELECT g, 'User ' || g, 'USER', now() FROM generate_series(1, 10000) g"))
+        connection.execute(text(
+            f"INSERT INTO {SCHEMA}.events (name, status, created_at) "
+            f"SELECT 'Event ' || g, 'CLOSED', now() FROM generate_series(1, 100) g"))
+        connection.execute(text(
+            f"INSERT INTO {SCHEMA}.feedbacks (user_id, event_id, message_text, status, topic_message_id, "
+            f"forward_attempts, created_at) "
+            f"SELECT 1 + g % 10000, 1 + g % 100, 'Вопрос номер ' || g, 'IN_PROGRESS', g, 0, now() "
+            f"FROM generate_series(1, :feedbacks) g"), {'feedbacks': feedbacks})
+        connection.execute(text(f"ANALYZE {SCHEMA}.feedbacks"))
+
+
+async def measure(lookups: int, feedbacks: int) -> list:
+    """Время (мс) каждого поиска тем же запросом, что и handle_manager_reply"""
+    bench_engine = create_async_engine(Config.ASYNC_DATABASE_URL).execution_options(
+        schema_translate_map={None: SCHEMA})
+    timings = []
+    try:
+        async with AsyncSession(bench_engine) as session:
+            for _ in range(lookups):
+                message_id = random.randint(1, feedbacks)
+                started = time.perf_counter()
+                feedback = await session.scalar(select(Feedback).filter_by(topic_message_id=message_id))
+                timings.append((time.perf_counter() - started) * 1000)
+                assert feedback is not None and feedback.topic_message_id == message_id
+                session.expunge_all()
+    finally:
+        await bench_engine.dispose()
+    return timings
+
+
+def report(title: str, timings: list) -> None:
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{title:14} p50 {statistics.median(timings):8.2f} мс   p95 {p95:8.2f} мс   ({len(timings)} поисков)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--feedbacks', type=int, default=1000000, help='вопросов в таблице')
+    parser.add_argument('--lookups', type=int, default=200, help='поисков на замер')
+    parser.add_argument('--keep', action='store_true', help=f'не удалять схему {SCHEMA}')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    populate(args.feedbacks)
+    print(f"Вопросов: {args.feedbacks}, заполнение {time.perf_counter() - started:.1f} с")
+
+    try:
+        report("с индексом", asyncio.run(measure(args.lookups, args.feedbacks)))
+
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP INDEX {SCHEMA}.ix_feedbacks_topic_message_id"))
+        report("без индекса", asyncio.run(measure(args.lookups, args.feedbacks)))
+    finally:
+        if not args.keep:
+            with engine.begin() as connection:
+                connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Сверка статистики мероприятий (services.analytics) с эталонной реализацией:
+исходный get_event_stats, считавший показатели перебором event.feedbacks и
+event.ratings в Python. Нужна после изменений в _collect_events_stats.
+
+Случайные данные создаются в отдельной схеме базы из DATABASE_URL и удаляются
+после проверки; таблицы бота не затрагиваются. Код возврата 1 при расхождении.
+    python scripts/check_event_stats_parity.py --events 30 --feedbacks 5000 --seed 1
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, desc, text
+from sqlalchemy.orm import Session
+from database.db import engine
+from database.models import Base, Event, EventStatus, Feedback, FeedbackStatus, Rating, User, UserRole
+from services.analytics import get_event_stats, get_all_events_stats, iter_events_stats
+
+SCHEMA = 'check_event_stats'
+
+WORDS = ['вопрос', 'доклад', 'слайды', 'когда', 'спасибо', 'звук', 'перерыв', 'микрофон']
+COMMENTS = [None, '', 'ок', 'Отличный доклад', 'Было тихо в зале']
+SUMMARY_KEYS = ('total_feedbacks', 'total_ratings', 'avg_rating', 'rating_distribution',
+                'feedback_statuses', 'avg_response_time_hours')
+DETAIL_KEYS = ('top_managers', 'comments', 'feedbacks_by_day')
+
+
+def reference_event_stats(session: Session, event: Event) -> dict:
+    """Исходная реализация get_event_stats: объекты ORM и подсчет в Python"""
+    total_feedbacks = len(event.feedbacks)
+    total_ratings = len(event.ratings)
+
+    feedback_statuses = {}
+    for feedback in event.feedbacks:
+        feedback_statuses[feedback.status.value] = feedback_statuses.get(feedback.status.value, 0) + 1
+
+    ratings_values = [r.rating for r in event.ratings]
+    avg_rating = sum(ratings_values) / len(ratings_values) if ratings_values else 0
+    rating_distribution = {}
+    for value in ratings_values:
+        rating_distribution[value] = rating_distribution.get(value, 0) + 1
+
+    response_times = [
+        (feedback.answered_at - feedback.created_at).total_seconds() / 3600
+        for feedback in event.feedbacks if feedback.answered_at and feedback.created_at
+    ]
+    avg_response_time = sum(response_times) / len(response_times) if response_times else 0
+
+    manager_stats = (
+        session.query(User.full_name, User.username, func.count(Feedback.id).label('answers_count'))
+        .join(Feedback, User.id == Feedback.answered_by)
+        .filter(Feedback.event_id == event.id)
+        .group_by(User.id, User.full_name, User.username)
+        .order_by(desc('answers_count'))
+        .all()
+    )
+
+    feedbacks_by_day = {}
+    for feedback in event.feedbacks:
+        day = feedback.created_at.date()
+        feedbacks_by_day[day] = feedbacks_by_day.get(day, 0) + 1
+
+    return {
+        'total_feedbacks': total_feedbacks,
+        'total_ratings': total_ratings,
+        'avg_rating': avg_rating,
+        'rating_distribution': rating_distribution,
+        'feedback_statuses': feedback_statuses,
+        'avg_response_time_hours': avg_response_time,
+        'top_managers': [{'name': m.full_name or m.username or 'Неизвестный', 'count': m.answers_count}
+                         for m in manager_stats],
+        'comments': [{'rating': r.rating, 'comment': r.comment, 'date': r.created_at}
+                     for r in event.ratings if r.comment],
+        'feedbacks_by_day': feedbacks_by_day
+    }
+
+
+def populate(session: Session, events: int, feedbacks: int, ratings: int, seed: int) -> None:
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+
+    users = [User(telegram_id=i + 1, username=f"user{i}" if i % 4 else None,
+                  full_name=f"Участник {i}" if i % 3 else None, role=rng.choice(list(UserRole)))
+             for i in range(max(50, events * 3))]
+    session.add_all(users)
+    session.flush()
+    # Пустое мероприятие и мероприятие без оценок тоже должны совпадать
+    event_rows = [Event(name=f"Мероприятие {i}", status=rng.choice(list(EventStatus)),
+                        created_at=start + timedelta(days=i)) for i in range(events)]
+    session.add_all(event_rows)
+    session.flush()
+    active = event_rows[2:] or event_rows
+
+    for _ in range(feedbacks):
+        created_at = start + timedelta(minutes=rng.randint(0, 60 * 24 * 30), microseconds=rng.randint(0, 999999))
+        answered = rng.random() < 0.6
+        session.add(Feedback(
+            user_id=rng.choice(users).id, event_id=rng.choice(active).id,
+            message_text=' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 8))),
+            status=rng.choice(list(FeedbackStatus)), created_at=created_at,
+            answered_at=created_at + timedelta(seconds=rng.randint(1, 86400)) if answered else None,
+            answered_by=rng.choice(users).id if answered else None))
+
+    rated = set()
+    for i in range(ratings):
+        key = (rng.choice(users).id, rng.choice(active[1:] or active).id)
+        if key in rated:
+            continue
+        rated.add(key)
+        session.add(Rating(user_id=key[0], event_id=key[1], rating=rng.randint(1, 5),
+                           comment=rng.choice(COMMENTS), created_at=start + timedelta(days=40, hours=i)))
+    session.flush()
+
+
+def _normalized(key: str, value):
+    # Порядок менеджеров с равным числом ответов и комментариев без ORDER BY не определен
+    if key == 'top_managers':
+        return sorted((item['count'], item['name']) for item in value)
+    if key == 'comments':
+        return sorted((item['date'], item['rating'], item['comment']) for item in value)
+    return value
+
+
+def compare(expected: dict, actual: dict, keys: tuple) -> list:
+    problems = []
+    for key in keys:
+        left, right = _normalized(key, expected[key]), _normalized(key, actual[key])
+        if isinstance(left, float) or isinstance(right, float):
+            equal = abs(left - right) < 1e-6
+        else:
+            equal = left == right
+        if not equal:
+            problems.append(f"{key}: ожидалось {left!r}, получено {right!r}")
+    return problems
+
+
+def check(session: Session) -> int:
+    events = session.query(Event).order_by(Event.id).all()
+    reference = {event.id: reference_event_stats(session, event) for event in events}
+    session.expire_all()
+
+    problems = []
+    for event in events:
+        for problem in compare(reference[event.id], get_event_stats(session, event.id), SUMMARY_KEYS + DETAIL_KEYS):
+            problems.append(f"get_event_stats #{event.id} {problem}")
+    for stats in get_all_events_stats(session):
+        for problem in compare(reference[stats['event'].id], stats, SUMMARY_KEYS + DETAIL_KEYS):
+            problems.append(f"get_all_events_stats #{stats['event'].id} {problem}")
+    for stats in iter_events_stats(session, chunk_size=7):
+        for problem in compare(reference[stats['event'].id], stats, SUMMARY_KEYS):
+            problems.append(f"iter_events_stats #{stats['event'].id} {problem}")
+
+    for problem in problems:
+        print(problem)
+    print(f"Мероприятий: {len(events)}, расхождений: {len(problems)}")
+    return len(problems)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=30)
+    parser.add_argument('--feedbacks', type=int, default=5000)
+    parser.add_argument('--ratings', type=int, default=1500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+
+    try:
+        with engine.connect() as connection:
+            connection = connection.execution_options(schema_translate_map={None: SCHEMA})
+            Base.metadata.create_all(connection)
+            with Session(bind=connection) as session:
+                populate(session, args.events, args.feedbacks, args.ratings, args.seed)
+                session.commit()
+                failures = check(session)
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
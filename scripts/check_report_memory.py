@@ -0,0 +1,127 @@
+"""
+Проверка потолка памяти общего PDF-отчета на большой истории мероприятий.
+
+Отчет верстается по синтетическим данным (отдельная схема базы из DATABASE_URL,
+удаляется после проверки) под tracemalloc. Проверяется, что пиковая память
+Python не превышает --max-mb, что LazyStory держит не больше --max-pending
+несверстанных flowables и что doc.build дочитал все ленивые источники (иначе
+ReportLab обошел список в обход LazyStory и отчет обрезан). Код возврата 1,
+если условие нарушено. Повторять при обновлении ReportLab.
+    python scripts/check_report_memory.py --events 10000 --feedbacks 100000 --max-mb 32
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from database.db import engine
+from database.models import Base
+from services.pdf_report import LazyStory, PDFReport, generate_pdf_report, REPORTLAB_VERSION
+
+SCHEMA = 'check_report_memory'
+
+
+def populate(connection, events: int, feedbacks: int) -> None:
+    connection.execute(text(
+        f"INSERT INTO {SCHEMA}.users (telegram_id, role, created_at) "
+        f"SELECT g, 'USER', now() FROM generate_series(1, 2000) g"))
+    connection.execute(text(
+        f"INSERT INTO {SCHEMA}.events (name, status, created_at) "
+        f"SELECT 'Мероприятие ' || g, 'CLOSED', now() - g * interval '1 hour' "
+        f"FROM generate_series(1, :events) g"), {'events': events})
+    connection.execute(text(f"UPDATE {SCHEMA}.events SET status = 'ACTIVE' WHERE id % 5 = 0"))
+    connection.execute(text(
+        f"INSERT INTO {SCHEMA}.feedbacks (user_id, event_id, message_text, status, forward_attempts, created_at) "
+        f"SELECT 1 + g % 2000, 1 + g % :events, 'Вопрос ' || g, 'NEW', 0, now() "
+        f"FROM generate_series(1, :feedbacks) g"), {'events': events, 'feedbacks': feedbacks})
+    connection.execute(text(
+        f"INSERT INTO {SCHEMA}.ratings (user_id, event_id, rating, created_at) "
+        f"SELECT 1 + g % 2000, 1 + (g / 2000) % :events, 1 + g % 5, now() "
+        f"FROM generate_series(0, least(:feedbacks / 5, 2000 * :events) - 1) g ON CONFLICT DO NOTHING"),
+        {'events': events, 'feedbacks': feedbacks})
+
+
+def build(connection) -> tuple:
+    """Сверстать общий отчет; (PDF, пик памяти в байтах, макс. несверстанных flowables, LazyStory)"""
+    stories = []
+    pending = [0]
+
+    original_build = PDFReport.build
+    original_refill = LazyStory._refill
+
+    def tracking_build(report):
+        stories.append(report.story)
+        return original_build(report)
+
+    def tracking_refill(story):
+        original_refill(story)
+        pending[0] = max(pending[0], list.__len__(story))
+
+    PDFReport.build = tracking_build
+    LazyStory._refill = tracking_refill
+    try:
+        with Session(bind=connection) as session:
+            tracemalloc.start()
+            content = generate_pdf_report(session)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    finally:
+        PDFReport.build = original_build
+        LazyStory._refill = original_refill
+
+    return content, peak, pending[0], stories[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--feedbacks', type=int, default=100000)
+    parser.add_argument('--max-mb', type=float, default=32, help='допустимый пик памяти Python, МБ')
+    parser.add_argument('--max-pending', type=int, default=100, help='допустимо несверстанных flowables')
+    args = parser.parse_args()
+
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+
+    try:
+        with engine.connect() as connection:
+            connection = connection.execution_options(schema_translate_map={None: SCHEMA})
+            Base.metadata.create_all(connection)
+            populate(connection, args.events, args.feedbacks)
+            connection.commit()
+
+            started = time.perf_counter()
+            content, peak, pending, story = build(connection)
+            elapsed = time.perf_counter() - started
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+    pages = len(re.findall(rb'/Type /Page[^s]', content))
+    peak_mb = peak / 2 ** 20
+    print(f"ReportLab {REPORTLAB_VERSION}: мероприятий {args.events}, вопросов {args.feedbacks}, "
+          f"страниц {pages}, {len(content) // 1024} КБ за {elapsed:.1f} с")
+    print(f"Пик памяти {peak_mb:.1f} МБ (допустимо {args.max_mb}), "
+          f"несверстанных flowables до {pending} (допустимо {args.max_pending})")
+
+    failures = []
+    if peak_mb > args.max_mb:
+        failures.append("пик памяти выше потолка")
+    if pending > args.max_pending:
+        failures.append("LazyStory держит слишком много flowables")
+    if story._sources or list.__len__(story):
+        failures.append("doc.build не дочитал ленивые источники: отчет неполный")
+    for failure in failures:
+        print(f"ОШИБКА: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
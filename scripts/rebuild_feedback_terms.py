@@ -0,0 +1,26 @@
+"""
+Пересчет частотного словаря вопросов (таблица feedback_terms).
+
+Нужен после изменения TERMS_STOP_WORDS_FILE, TERMS_STEMMER или TERMS_MIN_LENGTH:
+новые вопросы учитываются по новым настройкам, а накопленные - только после пересчета.
+    python scripts/rebuild_feedback_terms.py
+"""
+import os
+import sys
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db import get_session
+from services.terms import rebuild_feedback_terms
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    with get_session() as session:
+        processed = rebuild_feedback_terms(session)
+    print(f"Пересчитано вопросов: {processed}")
+
+
+if __name__ == '__main__':
+    main()
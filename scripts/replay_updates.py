@@ -0,0 +1,149 @@
+"""
+Запись и воспроизведение обновлений Telegram для проверки webhook-режима.
+
+Запись (webhook у бота должен быть снят, иначе getUpdates вернет ошибку):
+    python scripts/replay_updates.py record --token $BOT_TOKEN --out updates.jsonl
+
+Воспроизведение против локально запущенного бота (BOT_MODE=webhook):
+    python scripts/replay_updates.py replay --file updates.jsonl \\
+        --url http://127.0.0.1:8080/telegram --secret $WEBHOOK_SECRET --concurrency 20 --repeat 10
+
+Webhook-сервер отвечает сразу после постановки обновления в очередь, поэтому
+задержка здесь - это время приема обновления, а не полной обработки.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+
+import httpx
+
+
+async def record(token: str, out: str, limit: int, poll_timeout: int) -> None:
+    """Сохранить входящие обновления бота в JSONL-файл"""
+    url = f"https://api.telegram.org/bot{token}/getUpdates"
+    offset = None
+    saved = 0
+
+    async with httpx.AsyncClient(timeout=poll_timeout + 10) as client:
+        with open(out, 'a', encoding='utf-8') as f:
+            while limit <= 0 or saved < limit:
+                params = {'timeout': poll_timeout}
+                if offset is not None:
+                    params['offset'] = offset
+
+                response = (await client.get(url, params=params)).json()
+                if not response.get('ok'):
+                    raise SystemExit(f"getUpdates: {response.get('description')}")
+
+                for update in response['result']:
+                    f.write(json.dumps(update, ensure_ascii=False) + '\n')
+                    f.flush()
+                    offset = update['update_id'] + 1
+                    saved += 1
+                    print(f"Записано обновлений: {saved}", end='\r')
+
+    print(f"\nЗаписано обновлений: {saved} -> {out}")
+
+
+def load_updates(path: str) -> list:
+    """Прочитать обновления из JSONL-файла"""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def replay(path: str, url: str, secret: str, concurrency: int, repeat: int,
+                 start_id: int, rate: float) -> None:
+    """Отправить записанные обновления на webhook и вывести задержки"""
+    updates = load_updates(path)
+    if not updates:
+        raise SystemExit(f"В файле {path} нет обновлений")
+
+    # update_id перенумеровываются, чтобы повторы выглядели как новые обновления
+    update_ids = itertools.count(start_id)
+    payloads = []
+    for _ in range(repeat):
+        for update in updates:
+            payloads.append(dict(update, update_id=next(update_ids)))
+
+    headers = {'Content-Type': 'application/json'}
+    if secret:
+        headers['X-Telegram-Bot-Api-Secret-Token'] = secret
+
+    queue = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+
+    latencies = []
+    statuses = {}
+    interval = 1 / rate if rate > 0 else 0
+
+    async def worker(client: httpx.AsyncClient):
+        while True:
+            try:
+                payload = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json=payload, headers=headers)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+            if interval:
+                await asyncio.sleep(interval * concurrency)
+
+    started = time.perf_counter()
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"Отправлено: {len(payloads)} за {elapsed:.2f} с ({len(payloads) / elapsed:.0f} обновлений/с)")
+    print(f"Ответы: {', '.join(f'{status}: {count}' for status, count in sorted(statuses.items(), key=str))}")
+    print(f"Задержка, мс: p50 {percentile(0.5):.1f} | p95 {percentile(0.95):.1f} | "
+          f"p99 {percentile(0.99):.1f} | max {latencies[-1] * 1000:.1f} | "
+          f"среднее {statistics.mean(latencies) * 1000:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='записать обновления через getUpdates')
+    record_parser.add_argument('--token', required=True)
+    record_parser.add_argument('--out', default='updates.jsonl')
+    record_parser.add_argument('--limit', type=int, default=0, help='сколько обновлений записать (0 - без ограничения)')
+    record_parser.add_argument('--poll-timeout', type=int, default=30)
+
+    replay_parser = subparsers.add_parser('replay', help='отправить обновления на webhook')
+    replay_parser.add_argument('--file', default='updates.jsonl')
+    replay_parser.add_argument('--url', default='http://127.0.0.1:8080/telegram')
+    replay_parser.add_argument('--secret', default=None)
+    replay_parser.add_argument('--concurrency', type=int, default=10)
+    replay_parser.add_argument('--repeat', type=int, default=1)
+    replay_parser.add_argument('--start-id', type=int, default=1)
+    replay_parser.add_argument('--rate', type=float, default=0, help='ограничение, обновлений/с (0 - без ограничения)')
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        asyncio.run(record(args.token, args.out, args.limit, args.poll_timeout))
+    else:
+        asyncio.run(replay(args.file, args.url, args.secret, args.concurrency, args.repeat,
+                           args.start_id, args.rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from database.models import Event, Feedback, Rating, User, UserRole, EventStatus, FeedbackStatus
+from sqlalchemy import select, func, desc, true, literal_column, JSON
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from database.models import Event, Feedback, FeedbackTerm, Rating, User, UserRole, EventStatus, FeedbackStatus
 from datetime import datetime, timedelta
 from collections import Counter
 import logging
@@ -9,27 +10,33 @@ logger = logging.getLogger(__name__)
 
 
 def get_general_stats(session: Session) -> dict:
-    """Получить общую статистику по всем мероприятиям"""
-    
-    total_events = session.query(Event).count()
-    active_events = session.query(Event).filter_by(status=EventStatus.ACTIVE).count()
-    closed_events = session.query(Event).filter_by(status=EventStatus.CLOSED).count()
-    
-    total_feedbacks = session.query(Feedback).count()
-    total_ratings = session.query(Rating).count()
-    
-    avg_rating_result = session.query(func.avg(Rating.rating)).scalar()
-    avg_rating = f"{avg_rating_result:.2f}⭐" if avg_rating_result else "—"
-    
-    total_users = session.query(User).count()
-    total_managers = session.query(User).filter_by(role=UserRole.MANAGER).count()
-    total_admins = session.query(User).filter_by(role=UserRole.ADMIN).count()
-    
-    # Топ мероприятий по оценкам
+    """Получить общую статистику по всем мероприятиям (одним запросом к БД)"""
+    
+    events_summary = select(
+        func.count(Event.id).label('total_events'),
+        func.count(Event.id).filter(Event.status == EventStatus.ACTIVE).label('active_events'),
+        func.count(Event.id).filter(Event.status == EventStatus.CLOSED).label('closed_events')
+    ).subquery()
+    
+    feedbacks_summary = select(
+        func.count(Feedback.id).label('total_feedbacks')
+    ).subquery()
+    
+    ratings_summary = select(
+        func.count(Rating.id).label('total_ratings'),
+        func.avg(Rating.rating).label('avg_rating')
+    ).subquery()
+    
+    users_summary = select(
+        func.count(User.id).label('total_users'),
+        func.count(User.id).filter(User.role == UserRole.MANAGER).label('total_managers'),
+        func.count(User.id).filter(User.role == UserRole.ADMIN).label('total_admins')
+    ).subquery()
+    
+    # Топ мероприятий по оценкам, упакованный в JSON-массив той же строки
     top_events_query = (
-        session.query(
-            Event.id,
-            Event.name,
+        select(
+            Event.name.label('name'),
             func.avg(Rating.rating).label('avg_rating'),
             func.count(Rating.id).label('rating_count')
         )
@@ -38,28 +45,55 @@ def get_general_stats(session: Session) -> dict:
         .having(func.count(Rating.id) >= 3)
         .order_by(desc('avg_rating'))
         .limit(3)
-        .all()
+        .subquery()
     )
+    top_events_json = select(
+        func.coalesce(
+            func.json_agg(aggregate_order_by(
+                func.json_build_object(
+                    'name', top_events_query.c.name,
+                    'avg_rating', top_events_query.c.avg_rating,
+                    'count', top_events_query.c.rating_count
+                ),
+                top_events_query.c.avg_rating.desc()
+            )),
+            literal_column("'[]'::json"),
+            type_=JSON
+        )
+    ).scalar_subquery()
+    
+    row = session.execute(
+        select(events_summary, feedbacks_summary, ratings_summary, users_summary,
+               top_events_json.label('top_events'))
+        .select_from(
+            events_summary
+            .join(feedbacks_summary, true())
+            .join(ratings_summary, true())
+            .join(users_summary, true())
+        )
+    ).one()
+    
+    avg_rating = f"{row.avg_rating:.2f}⭐" if row.avg_rating else "—"
     
     top_events = [
         {
-            'name': event.name,
-            'avg_rating': f"{event.avg_rating:.2f}",
-            'count': event.rating_count
+            'name': event['name'],
+            'avg_rating': f"{event['avg_rating']:.2f}",
+            'count': event['count']
         }
-        for event in top_events_query
+        for event in row.top_events
     ]
     
     return {
-        'total_events': total_events,
-        'active_events': active_events,
-        'closed_events': closed_events,
-        'total_feedbacks': total_feedbacks,
-        'total_ratings': total_ratings,
+        'total_events': row.total_events,
+        'active_events': row.active_events,
+        'closed_events': row.closed_events,
+        'total_feedbacks': row.total_feedbacks,
+        'total_ratings': row.total_ratings,
         'avg_rating': avg_rating,
-        'total_users': total_users,
-        'total_managers': total_managers,
-        'total_admins': total_admins,
+        'total_users': row.total_users,
+        'total_managers': row.total_managers,
+        'total_admins': row.total_admins,
         'top_events': top_events
     }
 
@@ -71,123 +105,207 @@ def get_event_stats(session: Session, event_id: int) -> dict:
     if not event:
         return None
     
-    total_feedbacks = len(event.feedbacks)
-    total_ratings = len(event.ratings)
-    
-    feedback_statuses = Counter(f.status for f in event.feedbacks)
+    return _collect_events_stats(session, [event])[0]
+
+
+def get_all_events_stats(session: Session, limit: int = None, offset: int = 0,
+                         date_from: datetime = None, date_to: datetime = None,
+                         with_details: bool = True) -> list:
+    """
+    Получить статистику по мероприятиям (новые первыми).
+    
+    Число запросов не зависит от количества мероприятий: показатели всех
+    мероприятий страницы считаются одним GROUP BY запросом на каждую метрику.
+    date_from/date_to фильтруют по дате создания мероприятия.
+    with_details=False пропускает менеджеров, комментарии и разбивку по дням.
+    """
+    
+    events_query = session.query(Event)
+    if date_from:
+        events_query = events_query.filter(Event.created_at >= date_from)
+    if date_to:
+        events_query = events_query.filter(Event.created_at < date_to)
+    events_query = events_query.order_by(Event.created_at.desc(), Event.id.desc()).offset(offset)
+    if limit:
+        events_query = events_query.limit(limit)
+    
+    events = events_query.all()
+    if not events:
+        return []
     
-    ratings_values = [r.rating for r in event.ratings]
-    avg_rating = sum(ratings_values) / len(ratings_values) if ratings_values else 0
-    rating_distribution = Counter(ratings_values)
+    return _collect_events_stats(session, events, with_details)
+
+
+def iter_events_stats(session: Session, chunk_size: int = 200, with_details: bool = False):
+    """
+    Статистика по всем мероприятиям (новые первыми) порциями по chunk_size.
+    
+    Мероприятия читаются серверным курсором, а показатели считаются на каждую
+    порцию, поэтому в памяти одновременно находится не больше одной порции.
+    Вместо ORM-объектов отдаются строки, чтобы они не копились в identity map.
+    """
+    
+    result = session.execute(
+        select(Event.id, Event.name, Event.status, Event.created_at, Event.closed_at)
+        .order_by(Event.created_at.desc(), Event.id.desc())
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    for events in result.partitions():
+        yield from _collect_events_stats(session, events, with_details)
+
+
+def _collect_events_stats(session: Session, events: list, with_details: bool = True) -> list:
+    """Посчитать статистику для набора мероприятий агрегатами в БД, без загрузки ORM-объектов"""
     
-    response_times = []
-    for feedback in event.feedbacks:
-        if feedback.answered_at and feedback.created_at:
-            delta = feedback.answered_at - feedback.created_at
-            response_times.append(delta.total_seconds() / 3600)
+    event_ids = [event.id for event in events]
     
-    avg_response_time = sum(response_times) / len(response_times) if response_times else 0
+    feedback_statuses = {event_id: {} for event_id in event_ids}
+    status_rows = (
+        session.query(Feedback.event_id, Feedback.status, func.count(Feedback.id))
+        .filter(Feedback.event_id.in_(event_ids))
+        .group_by(Feedback.event_id, Feedback.status)
+        .all()
+    )
+    for event_id, status, count in status_rows:
+        feedback_statuses[event_id][status.value] = count
+    
+    rating_distribution = {event_id: {} for event_id in event_ids}
+    rating_rows = (
+        session.query(Rating.event_id, Rating.rating, func.count(Rating.id))
+        .filter(Rating.event_id.in_(event_ids))
+        .group_by(Rating.event_id, Rating.rating)
+        .all()
+    )
+    for event_id, rating, count in rating_rows:
+        rating_distribution[event_id][rating] = count
     
-    manager_stats = (
+    response_rows = (
         session.query(
-            User.full_name,
-            User.username,
-            func.count(Feedback.id).label('answers_count')
+            Feedback.event_id,
+            func.avg(func.extract('epoch', Feedback.answered_at - Feedback.created_at))
+        )
+        .filter(
+            Feedback.event_id.in_(event_ids),
+            Feedback.answered_at.isnot(None),
+            Feedback.created_at.isnot(None)
         )
-        .join(Feedback, User.id == Feedback.answered_by)
-        .filter(Feedback.event_id == event_id)
-        .group_by(User.id, User.full_name, User.username)
-        .order_by(desc('answers_count'))
+        .group_by(Feedback.event_id)
         .all()
     )
-    
-    top_managers = [
-        {
-            'name': m.full_name or m.username or 'Неизвестный',
-            'count': m.answers_count
-        }
-        for m in manager_stats
-    ]
-    
-    comments = [
-        {
-            'rating': r.rating,
-            'comment': r.comment,
-            'date': r.created_at
-        }
-        for r in event.ratings if r.comment
-    ]
-    
-    feedbacks_by_day = {}
-    for feedback in event.feedbacks:
-        day = feedback.created_at.date()
-        feedbacks_by_day[day] = feedbacks_by_day.get(day, 0) + 1
-    
-    return {
-        'event': event,
-        'total_feedbacks': total_feedbacks,
-        'total_ratings': total_ratings,
-        'avg_rating': avg_rating,
-        'rating_distribution': dict(rating_distribution),
-        'feedback_statuses': {status.value: count for status, count in feedback_statuses.items()},
-        'avg_response_time_hours': avg_response_time,
-        'top_managers': top_managers,
-        'comments': comments,
-        'feedbacks_by_day': feedbacks_by_day
-    }
-
-
-def get_all_events_stats(session: Session) -> list:
-    """Получить статистику по всем мероприятиям"""
-    
-    events = session.query(Event).order_by(Event.created_at.desc()).all()
+    avg_response_seconds = {event_id: float(seconds) for event_id, seconds in response_rows}
+    
+    top_managers = {event_id: [] for event_id in event_ids}
+    comments = {event_id: [] for event_id in event_ids}
+    feedbacks_by_day = {event_id: {} for event_id in event_ids}
+    
+    if with_details:
+        manager_stats = (
+            session.query(
+                Feedback.event_id,
+                User.full_name,
+                User.username,
+                func.count(Feedback.id).label('answers_count')
+            )
+            .join(Feedback, User.id == Feedback.answered_by)
+            .filter(Feedback.event_id.in_(event_ids))
+            .group_by(Feedback.event_id, User.id, User.full_name, User.username)
+            .order_by(Feedback.event_id, desc('answers_count'))
+            .all()
+        )
+        for m in manager_stats:
+            top_managers[m.event_id].append({
+                'name': m.full_name or m.username or 'Неизвестный',
+                'count': m.answers_count
+            })
+        
+        comment_rows = (
+            session.query(Rating.event_id, Rating.rating, Rating.comment, Rating.created_at)
+            .filter(Rating.event_id.in_(event_ids), Rating.comment.isnot(None), Rating.comment != '')
+            .order_by(Rating.id)
+            .all()
+        )
+        for r in comment_rows:
+            comments[r.event_id].append({
+                'rating': r.rating,
+                'comment': r.comment,
+                'date': r.created_at
+            })
+        
+        day = func.date(Feedback.created_at)
+        day_rows = (
+            session.query(Feedback.event_id, day, func.count(Feedback.id))
+            .filter(Feedback.event_id.in_(event_ids))
+            .group_by(Feedback.event_id, day)
+            .order_by(Feedback.event_id, day)
+            .all()
+        )
+        for event_id, feedback_day, count in day_rows:
+            feedbacks_by_day[event_id][feedback_day] = count
     
     stats = []
     for event in events:
-        event_stat = get_event_stats(session, event.id)
-        if event_stat:
-            stats.append(event_stat)
+        distribution = rating_distribution[event.id]
+        total_ratings = sum(distribution.values())
+        avg_rating = (
+            sum(rating * count for rating, count in distribution.items()) / total_ratings
+            if total_ratings else 0
+        )
+        response_seconds = avg_response_seconds.get(event.id)
+        
+        stats.append({
+            'event': event,
+            'total_feedbacks': sum(feedback_statuses[event.id].values()),
+            'total_ratings': total_ratings,
+            'avg_rating': avg_rating,
+            'rating_distribution': distribution,
+            'feedback_statuses': feedback_statuses[event.id],
+            'avg_response_time_hours': response_seconds / 3600 if response_seconds is not None else 0,
+            'top_managers': top_managers[event.id],
+            'comments': comments[event.id],
+            'feedbacks_by_day': feedbacks_by_day[event.id]
+        })
     
     return stats
 
 
 def get_word_frequency(session: Session, event_id: int = None, top_n: int = 50) -> list:
-    """Получить частоту слов из отзывов (для облака слов)"""
+    """Самые частые термины вопросов (для облака слов) из частотного словаря feedback_terms"""
     
     if event_id:
-        feedbacks = session.query(Feedback).filter_by(event_id=event_id).all()
+        query = (
+            select(FeedbackTerm.term, FeedbackTerm.count)
+            .where(FeedbackTerm.event_id == event_id)
+            .order_by(FeedbackTerm.count.desc(), FeedbackTerm.term)
+        )
     else:
-        feedbacks = session.query(Feedback).all()
-    
-    if not feedbacks:
-        return []
-    
-    all_text = ' '.join([f.message_text for f in feedbacks])
-    words = all_text.lower().split()
-    
-    stop_words = {
-        'в', 'на', 'и', 'с', 'по', 'для', 'не', 'от', 'за', 'к', 'до', 'из', 'у', 'о',
-        'что', 'это', 'как', 'так', 'но', 'а', 'то', 'все', 'она', 'он', 'они', 'мы',
-        'вы', 'я', 'был', 'была', 'было', 'были', 'есть', 'быть', 'будет'
-    }
-    
-    filtered_words = [w for w in words if len(w) > 3 and w not in stop_words]
+        total = func.sum(FeedbackTerm.count)
+        query = (
+            select(FeedbackTerm.term, total)
+            .group_by(FeedbackTerm.term)
+            .order_by(total.desc(), FeedbackTerm.term)
+        )
     
-    return Counter(filtered_words).most_common(top_n)
+    return [(term, int(count)) for term, count in session.execute(query.limit(top_n))]
 
 
 def calculate_nps(ratings: list) -> dict:
     """Рассчитать Net Promoter Score на основе оценок"""
     
-    if not ratings:
+    return calculate_nps_from_distribution(Counter(ratings))
+
+
+def calculate_nps_from_distribution(rating_distribution: dict) -> dict:
+    """Рассчитать Net Promoter Score по распределению оценок {оценка: количество}"""
+    
+    total = sum(rating_distribution.values())
+    
+    if not total:
         return {'nps': 0, 'promoters': 0, 'passives': 0, 'detractors': 0,
                 'promoters_pct': 0, 'passives_pct': 0, 'detractors_pct': 0}
     
-    promoters = sum(1 for r in ratings if r >= 5)
-    passives = sum(1 for r in ratings if r == 4)
-    detractors = sum(1 for r in ratings if r <= 3)
-    
-    total = len(ratings)
+    promoters = sum(count for r, count in rating_distribution.items() if r >= 5)
+    passives = sum(count for r, count in rating_distribution.items() if r == 4)
+    detractors = sum(count for r, count in rating_distribution.items() if r <= 3)
     
     nps = ((promoters - detractors) / total) * 100 if total > 0 else 0
     
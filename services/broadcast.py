@@ -0,0 +1,127 @@
+from telegram.error import RetryAfter, Forbidden, BadRequest, TelegramError
+from config import Config
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Ограничитель частоты: не более `rate` захватов в секунду"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+                now += wait
+            self._next_slot = max(now, self._next_slot) + self.interval
+
+    def pause(self, seconds: float):
+        """Сдвинуть ближайший слот (например, после floodwait от Telegram)"""
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+class ChatRateLimiter:
+    """Ограничитель частоты сообщений в один и тот же чат"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_slot = {}
+
+    async def acquire(self, chat_id: int):
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(chat_id, 0.0))
+        self._next_slot[chat_id] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        # Старые записи не нужны: чат снова свободен
+        if len(self._next_slot) > 10000:
+            self._next_slot = {k: v for k, v in self._next_slot.items() if v > now}
+
+
+# Общие лимиты на весь процесс: несколько рассылок делят одну квоту Telegram
+global_limiter = RateLimiter(Config.BROADCAST_RATE)
+chat_limiter = ChatRateLimiter(Config.BROADCAST_PER_CHAT_INTERVAL)
+
+
+class Broadcaster:
+    """Рассылка сообщений через очередь с ограниченным параллелизмом"""
+
+    def __init__(self, bot, concurrency: int = None, max_retries: int = None):
+        self.bot = bot
+        self.concurrency = concurrency or Config.BROADCAST_CONCURRENCY
+        self.max_retries = Config.BROADCAST_MAX_RETRIES if max_retries is None else max_retries
+        self.total = 0
+        self.sent = 0
+        self.failed = 0
+
+    async def send_all(self, messages: list, on_progress=None, progress_interval: float = 2.0) -> dict:
+        """
+        Отправить сообщения. messages — список (chat_id, kwargs для send_message).
+        on_progress(sent, failed, total) вызывается не чаще progress_interval секунд.
+        """
+        self.total = len(messages)
+        queue = asyncio.Queue()
+        for message in messages:
+            queue.put_nowait(message)
+
+        workers = [asyncio.create_task(self._worker(queue))
+                   for _ in range(min(self.concurrency, self.total))]
+        reporter = asyncio.create_task(self._report(on_progress, progress_interval)) if on_progress else None
+
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            if reporter:
+                reporter.cancel()
+            await asyncio.gather(*workers, *([reporter] if reporter else []), return_exceptions=True)
+
+        return {'total': self.total, 'sent': self.sent, 'failed': self.failed}
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            chat_id, kwargs = await queue.get()
+            try:
+                if await self._send(chat_id, kwargs):
+                    self.sent += 1
+                else:
+                    self.failed += 1
+            finally:
+                queue.task_done()
+
+    async def _send(self, chat_id: int, kwargs: dict) -> bool:
+        for attempt in range(self.max_retries + 1):
+            await chat_limiter.acquire(chat_id)
+            await global_limiter.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, **kwargs)
+                return True
+            except RetryAfter as e:
+                logger.warning(f"Floodwait от Telegram: пауза {e.retry_after} с.")
+                global_limiter.pause(e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except (Forbidden, BadRequest) as e:
+                logger.warning(f"Не удалось отправить сообщение в чат {chat_id}: {e}")
+                return False
+            except TelegramError as e:
+                logger.warning(f"Ошибка отправки в чат {chat_id} (попытка {attempt + 1}): {e}")
+                await asyncio.sleep(2 ** attempt)
+        return False
+
+    async def _report(self, on_progress, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await on_progress(self.sent, self.failed, self.total)
+            except Exception as e:
+                logger.warning(f"Не удалось обновить прогресс рассылки: {e}")
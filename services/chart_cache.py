@@ -0,0 +1,123 @@
+from config import Config
+from io import BytesIO
+import hashlib
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Меняется при изменении оформления графиков, чтобы старые PNG не использовались
+CHART_STYLE_VERSION = 1
+
+
+def figure_to_png(fig, dpi: int = None) -> bytes:
+    """Растеризовать matplotlib-фигуру в PNG и освободить ее"""
+    import matplotlib.pyplot as plt
+    
+    buffer = BytesIO()
+    try:
+        fig.savefig(buffer, format='png', dpi=dpi or Config.CHART_DPI, bbox_inches='tight')
+    finally:
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+class ChartCache:
+    """
+    Дисковый кэш PNG-графиков с адресацией по содержимому.
+    
+    Ключ - sha256 от вида графика, входных данных, dpi и версии оформления,
+    поэтому одинаковые данные (например, закрытого мероприятия) не рисуются
+    повторно. Время последнего использования хранится в mtime файла; при
+    превышении max_bytes удаляются давно не использованные графики (LRU).
+    Запись атомарная, кэш можно разделять между процессами очереди отчетов.
+    """
+    
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+    
+    def key(self, kind: str, data, dpi: int) -> str:
+        payload = json.dumps(
+            {'kind': kind, 'data': data, 'dpi': dpi, 'version': CHART_STYLE_VERSION},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+    
+    def get_or_render(self, kind: str, data, render) -> bytes:
+        """PNG графика: из кэша или render(data) -> matplotlib-фигура"""
+        dpi = Config.CHART_DPI
+        path = self._path(self.key(kind, data, dpi))
+        
+        try:
+            with open(path, 'rb') as f:
+                png = f.read()
+            os.utime(path)
+            self.hits += 1
+            return png
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать график из кэша {path}: {e}")
+        
+        self.misses += 1
+        png = figure_to_png(render(data), dpi)
+        
+        try:
+            self._store(path, png)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить график в кэш {path}: {e}")
+        return png
+    
+    def _store(self, path: str, png: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+        self._evict()
+    
+    def _evict(self) -> None:
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.png'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        
+        if total <= self.max_bytes:
+            return
+        
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+    
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total * 100, 1) if total else 0
+        }
+
+
+chart_cache = ChartCache(Config.CHART_CACHE_DIR, Config.CHART_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,80 @@
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import Event, Feedback, Rating
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EventsPage:
+    """Страница списка мероприятий, новые сначала"""
+    
+    __slots__ = ('rows', 'has_newer', 'has_older')
+    
+    def __init__(self, rows: list, has_newer: bool, has_older: bool):
+        self.rows = rows  # (Event, вопросов, оценок, средняя оценка)
+        self.has_newer = has_newer
+        self.has_older = has_older
+    
+    @property
+    def first_id(self) -> int:
+        return self.rows[0][0].id if self.rows else None
+    
+    @property
+    def last_id(self) -> int:
+        return self.rows[-1][0].id if self.rows else None
+
+
+async def get_events_page(session: AsyncSession, before_id: int = None, after_id: int = None,
+                          page_size: int = None) -> EventsPage:
+    """
+    Страница мероприятий со счетчиками вопросов и оценок (одним запросом).
+    
+    Пагинация по ключу: before_id - страница старше мероприятия before_id,
+    after_id - страница новее after_id, без параметров - самые новые.
+    Порядок по первичному ключу совпадает с порядком создания, поэтому
+    страница читается из индекса, а счетчики группируются только по ее
+    мероприятиям: стоимость не зависит от общего числа мероприятий.
+    """
+    page_size = page_size or Config.EVENTS_PAGE_SIZE
+    
+    page = select(Event.id)
+    if after_id is not None:
+        page = page.where(Event.id > after_id).order_by(Event.id.asc())
+    else:
+        if before_id is not None:
+            page = page.where(Event.id < before_id)
+        page = page.order_by(Event.id.desc())
+    # Лишняя строка показывает, есть ли страница дальше в том же направлении
+    page = page.limit(page_size + 1).subquery()
+    
+    feedbacks = (
+        select(Feedback.event_id, func.count(Feedback.id).label('count'))
+        .where(Feedback.event_id.in_(select(page.c.id)))
+        .group_by(Feedback.event_id)
+        .subquery()
+    )
+    ratings = (
+        select(Rating.event_id, func.count(Rating.id).label('count'), func.avg(Rating.rating).label('avg'))
+        .where(Rating.event_id.in_(select(page.c.id)))
+        .group_by(Rating.event_id)
+        .subquery()
+    )
+    
+    rows = (await session.execute(
+        select(Event, func.coalesce(feedbacks.c.count, 0), func.coalesce(ratings.c.count, 0), ratings.c.avg)
+        .join(page, page.c.id == Event.id)
+        .outerjoin(feedbacks, feedbacks.c.event_id == Event.id)
+        .outerjoin(ratings, ratings.c.event_id == Event.id)
+        .order_by(Event.id.desc())
+    )).all()
+    
+    more = len(rows) > page_size
+    if after_id is not None:
+        # Страница читалась от after_id вверх: лишняя - самая новая строка
+        rows = rows[1:] if more else rows
+        return EventsPage(rows, has_newer=more, has_older=True)
+    
+    rows = rows[:page_size]
+    return EventsPage(rows, has_newer=before_id is not None, has_older=more)
@@ -1,3 +1,4 @@
+from reportlab import Version as REPORTLAB_VERSION
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -12,9 +13,13 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
 from io import BytesIO
+from collections import deque
 import os
 from sqlalchemy.orm import Session
-from services.analytics import get_event_stats, get_all_events_stats, get_general_stats, calculate_nps, get_word_frequency
+from database.db import get_session
+from config import Config
+from services.chart_cache import chart_cache, figure_to_png
+from services.analytics import get_event_stats, iter_events_stats, get_general_stats, calculate_nps_from_distribution, get_word_frequency
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,16 +28,72 @@ plt.rcParams['font.family'] = 'DejaVu Sans'
 sns.set_style("whitegrid")
 
 
+# Версия ReportLab, с внутренним устройством которой сверен LazyStory (requirements.txt)
+LAZY_STORY_REPORTLAB_VERSION = '4.0.7'
+
+if REPORTLAB_VERSION != LAZY_STORY_REPORTLAB_VERSION:
+    logger.warning(f"ReportLab {REPORTLAB_VERSION} вместо {LAZY_STORY_REPORTLAB_VERSION}: перед обновлением "
+                   f"проверьте LazyStory скриптом scripts/check_report_memory.py")
+
+
+class LazyStory(list):
+    """
+    Список flowables, который дочитывает элементы из генераторов по мере верстки.
+    
+    doc.build забирает flowables с начала списка и удаляет уже отрисованные,
+    поэтому в памяти находится не больше refill_size еще не сверстанных элементов,
+    сколько бы их ни выдавали источники.
+    
+    Опирается на то, как SimpleDocTemplate.build в ReportLab 4.0.7 обходит список:
+    цикл while len(flowables), чтение flowables[0] и flowables[i], del flowables[0]
+    и del flowables[:i], возврат частей через flowables[0:0] = ... и insert(0, ...).
+    Это не публичный API: при обновлении ReportLab нужно сверить build и повторить
+    замер scripts/check_report_memory.py.
+    """
+    
+    def __init__(self, refill_size: int = 50):
+        super().__init__()
+        self.refill_size = refill_size
+        self._sources = deque()
+    
+    def append(self, flowable):
+        # После ленивого источника элементы должны идти за ним, а не перед ним
+        if self._sources:
+            self._sources.append(iter((flowable,)))
+        else:
+            super().append(flowable)
+    
+    def extend_lazy(self, flowables):
+        """Добавить источник flowables, который будет прочитан во время build"""
+        self._sources.append(iter(flowables))
+    
+    def _refill(self):
+        while self._sources and super().__len__() < self.refill_size:
+            try:
+                super().append(next(self._sources[0]))
+            except StopIteration:
+                self._sources.popleft()
+    
+    def __len__(self):
+        self._refill()
+        return super().__len__()
+    
+    def __getitem__(self, index):
+        self._refill()
+        return super().__getitem__(index)
+
+
 class PDFReport:
     """Генератор PDF отчетов"""
     
-    def __init__(self, filename: str):
-        self.filename = filename
+    def __init__(self, output):
+        # output - путь к файлу или файловый объект (например, BytesIO)
+        self.output = output
         self.doc = SimpleDocTemplate(
-            filename, pagesize=A4,
+            output, pagesize=A4,
             rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm
         )
-        self.story = []
+        self.story = LazyStory()
         self.styles = getSampleStyleSheet()
         self._setup_styles()
     
@@ -82,6 +143,14 @@ class PDFReport:
         if not data:
             return
         
+        self.story.append(self.make_table(data, col_widths))
+        self.add_spacer()
+    
+    def add_lazy(self, flowables):
+        """Добавить flowables из генератора: они создаются по мере верстки документа"""
+        self.story.extend_lazy(flowables)
+    
+    def make_table(self, data: list, col_widths: list = None, repeat_rows: int = 0) -> Table:
         default_style = [
             ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
@@ -96,20 +165,17 @@ class PDFReport:
             ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
         ]
         
-        table = Table(data, colWidths=col_widths)
+        table = Table(data, colWidths=col_widths, repeatRows=repeat_rows)
         table.setStyle(TableStyle(default_style))
-        self.story.append(table)
-        self.add_spacer()
+        return table
     
     def add_chart(self, fig):
-        img_buffer = BytesIO()
-        fig.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-        img_buffer.seek(0)
-        
-        img = Image(img_buffer, width=15*cm, height=10*cm)
+        self.add_png(figure_to_png(fig))
+    
+    def add_png(self, png: bytes):
+        img = Image(BytesIO(png), width=15*cm, height=10*cm)
         self.story.append(img)
         self.add_spacer()
-        plt.close(fig)
     
     def add_page_break(self):
         self.story.append(PageBreak())
@@ -178,14 +244,23 @@ def create_nps_gauge_chart(nps_data: dict):
     return fig
 
 
-def generate_pdf_report(session: Session, event_id: int = None) -> str:
-    reports_dir = '/app/reports'
-    os.makedirs(reports_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"{reports_dir}/report_{timestamp}.pdf"
-    
-    pdf = PDFReport(filename)
+def rating_distribution_png(rating_dist: dict) -> bytes:
+    """График распределения оценок (PNG из кэша графиков)"""
+    # Ключ кэша - только то, что влияет на картинку
+    counts = {r: rating_dist.get(r, 0) for r in range(1, 6)}
+    return chart_cache.get_or_render('rating_distribution', counts, create_rating_distribution_chart)
+
+
+def nps_gauge_png(nps_data: dict) -> bytes:
+    """График NPS (PNG из кэша графиков)"""
+    data = {key: nps_data[key] for key in ('nps', 'promoters', 'passives', 'detractors')}
+    return chart_cache.get_or_render('nps_gauge', data, create_nps_gauge_chart)
+
+
+def generate_pdf_report(session: Session, event_id: int = None) -> bytes:
+    """Сверстать отчет в памяти и вернуть содержимое PDF"""
+    buffer = BytesIO()
+    pdf = PDFReport(buffer)
     
     if event_id:
         stats = get_event_stats(session, event_id)
@@ -221,15 +296,12 @@ def generate_pdf_report(session: Session, event_id: int = None) -> str:
         
         if stats['rating_distribution']:
             pdf.add_heading("Распределение оценок")
-            chart = create_rating_distribution_chart(stats['rating_distribution'])
-            pdf.add_chart(chart)
+            pdf.add_png(rating_distribution_png(stats['rating_distribution']))
             
-            ratings = [r.rating for r in event.ratings]
-            if ratings:
-                nps_data = calculate_nps(ratings)
+            if stats['total_ratings']:
+                nps_data = calculate_nps_from_distribution(stats['rating_distribution'])
                 pdf.add_heading("Net Promoter Score (NPS)")
-                chart = create_nps_gauge_chart(nps_data)
-                pdf.add_chart(chart)
+                pdf.add_png(nps_gauge_png(nps_data))
         
         if stats['top_managers']:
             pdf.add_heading("Топ менеджеров по количеству ответов")
@@ -242,7 +314,6 @@ def generate_pdf_report(session: Session, event_id: int = None) -> str:
     
     else:
         general_stats = get_general_stats(session)
-        all_events_stats = get_all_events_stats(session)
         
         pdf.add_title("Общий отчет по обратной связи")
         pdf.add_paragraph(f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}")
@@ -274,30 +345,72 @@ def generate_pdf_report(session: Session, event_id: int = None) -> str:
             
             pdf.add_table(top_data, col_widths=[10*cm, 4*cm, 2*cm])
         
-        if all_events_stats:
+        if general_stats['total_events']:
             pdf.add_page_break()
             pdf.add_heading("Детализация по мероприятиям")
-            
-            for event_stat in all_events_stats[:10]:
-                event = event_stat['event']
-                
-                event_data = [
-                    ['Параметр', 'Значение'],
-                    ['Название', event.name[:50]],
-                    ['Статус', 'Активное' if event.status.value == 'active' else 'Завершено'],
-                    ['Отзывов', str(event_stat['total_feedbacks'])],
-                    ['Оценок', str(event_stat['total_ratings'])],
-                    ['Средняя оценка', f"{event_stat['avg_rating']:.2f}" if event_stat['avg_rating'] else '—']
-                ]
-                
-                pdf.add_table(event_data, col_widths=[8*cm, 8*cm])
-                pdf.add_spacer(0.5)
+            # Вся история мероприятий: строки таблицы создаются по мере верстки
+            pdf.add_lazy(_events_detail_tables(pdf, session))
     
     pdf.add_spacer(2)
     footer_text = f"Отчет сгенерирован автоматически | {datetime.now().strftime('%d.%m.%Y %H:%M')}"
     pdf.add_paragraph(f"<i>{footer_text}</i>")
     
     pdf.build()
+    content = buffer.getvalue()
+    
+    logger.info(f"PDF отчет сгенерирован: {len(content) // 1024} КБ")
+    
+    if Config.REPORT_ARCHIVE_DIR:
+        archive_report(content, event_id)
+    return content
+
+
+def archive_report(content: bytes, event_id: int = None) -> str:
+    """Сохранить копию отчета в архив (REPORT_ARCHIVE_DIR); ошибка архива не мешает отправке"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    filename = os.path.join(
+        Config.REPORT_ARCHIVE_DIR,
+        f"report_{event_id or 'all'}_{timestamp}_{os.getpid()}.pdf"
+    )
+    
+    try:
+        os.makedirs(Config.REPORT_ARCHIVE_DIR, exist_ok=True)
+        tmp_filename = f"{filename}.tmp"
+        with open(tmp_filename, 'wb') as pdf_file:
+            pdf_file.write(content)
+        os.replace(tmp_filename, filename)
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить отчет в архив {filename}: {e}")
+        return None
     
-    logger.info(f"PDF отчет сгенерирован: {filename}")
+    logger.info(f"Отчет сохранен в архив: {filename}")
     return filename
+
+
+def _events_detail_tables(pdf: PDFReport, session: Session, rows_per_table: int = 40):
+    """Таблицы детализации по всем мероприятиям, по rows_per_table строк в каждой"""
+    header = ['Мероприятие', 'Статус', 'Отзывов', 'Оценок', 'Ср. оценка']
+    col_widths = [7*cm, 2.5*cm, 2*cm, 2*cm, 2.5*cm]
+    
+    rows = [header]
+    for event_stat in iter_events_stats(session, with_details=False):
+        event = event_stat['event']
+        rows.append([
+            event.name[:40],
+            'Активное' if event.status.value == 'active' else 'Завершено',
+            str(event_stat['total_feedbacks']),
+            str(event_stat['total_ratings']),
+            f"{event_stat['avg_rating']:.2f}" if event_stat['avg_rating'] else '—'
+        ])
+        if len(rows) > rows_per_table:
+            yield pdf.make_table(rows, col_widths=col_widths, repeat_rows=1)
+            rows = [header]
+    
+    if len(rows) > 1:
+        yield pdf.make_table(rows, col_widths=col_widths, repeat_rows=1)
+
+
+def build_report_bytes(event_id: int = None) -> bytes:
+    """Сгенерировать отчет в собственной сессии БД (для рабочего процесса очереди отчетов)"""
+    with get_session() as session:
+        return generate_pdf_report(session, event_id=event_id)
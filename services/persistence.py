@@ -0,0 +1,204 @@
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from telegram.ext import BasePersistence, PersistenceInput
+from database.db import get_async_session
+from database.models import ConversationState
+from config import Config
+from datetime import datetime
+import asyncio
+import copy
+import logging
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = 'user'
+
+
+class MemoryStateStore:
+    """Хранилище состояния в памяти процесса (для локального запуска и проверок)"""
+    
+    def __init__(self):
+        self._data = {}
+    
+    async def load(self, kind: str, key: int) -> dict:
+        data = self._data.get((kind, key))
+        return copy.deepcopy(data) if data is not None else None
+    
+    async def save_many(self, kind: str, items: dict) -> None:
+        for key, data in items.items():
+            if data:
+                self._data[(kind, key)] = copy.deepcopy(data)
+            else:
+                self._data.pop((kind, key), None)
+
+
+class PostgresStateStore:
+    """Хранилище состояния в таблице conversation_state"""
+    
+    async def load(self, kind: str, key: int) -> dict:
+        async with get_async_session() as session:
+            return await session.scalar(
+                select(ConversationState.data).filter_by(kind=kind, key=key)
+            )
+    
+    async def save_many(self, kind: str, items: dict) -> None:
+        """Записать пачку состояний одной транзакцией: upsert непустых, удаление пустых"""
+        now = datetime.utcnow()
+        rows = [{'kind': kind, 'key': key, 'data': data, 'updated_at': now}
+                for key, data in items.items() if data]
+        # Пустое состояние не храним: большинство диалогов заканчиваются очисткой user_data
+        empty_keys = [key for key, data in items.items() if not data]
+        
+        async with get_async_session() as session:
+            if rows:
+                statement = insert(ConversationState).values(rows)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[ConversationState.kind, ConversationState.key],
+                    set_={'data': statement.excluded.data, 'updated_at': statement.excluded.updated_at}
+                )
+                await session.execute(statement)
+            if empty_keys:
+                await session.execute(
+                    delete(ConversationState)
+                    .where(ConversationState.kind == kind, ConversationState.key.in_(empty_keys))
+                )
+
+
+class StatePersistence(BasePersistence):
+    """
+    Персистентность context.user_data поверх подключаемого хранилища.
+    
+    Состояние не загружается целиком при старте: данные пользователя читаются
+    из хранилища при первом его обновлении в этой реплике (refresh_user_data),
+    так как при липкой маршрутизации каждая реплика обслуживает только свою
+    часть пользователей.
+    
+    Запись отложенная: раз в update_interval секунд PTB передает user_data
+    пользователей, от которых были обновления; изменившиеся с прошлой записи
+    копятся в буфере и сохраняются одной пачкой. При остановке бота буфер
+    сбрасывается в flush().
+    """
+    
+    def __init__(self, store, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.store = store
+        self._loaded_users = set()
+        self._saved = {}  # последнее записанное состояние пользователя
+        self._dirty = {}  # изменения, ожидающие записи (None - удалить)
+        self._flush_task: asyncio.Task = None
+    
+    def forget_user(self, user_id: int) -> None:
+        """Перечитать состояние из хранилища при следующем обновлении (пользователя обслуживала другая реплика)"""
+        self._loaded_users.discard(user_id)
+        self._saved.pop(user_id, None)
+    
+    def _mark_dirty(self, user_id: int, data: dict) -> None:
+        if data == self._saved.get(user_id, {}) and user_id not in self._dirty:
+            return
+        self._dirty[user_id] = data
+        
+        # PTB вызывает update_user_data для всех пользователей одним gather:
+        # запись запускается после того, как отработают все вызовы прохода
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._write_dirty())
+    
+    async def _write_dirty(self) -> None:
+        await asyncio.sleep(0)
+        while self._dirty:
+            batch, self._dirty = self._dirty, {}
+            try:
+                await self.store.save_many(USER_DATA, batch)
+            except Exception as e:
+                logger.error(f"Ошибка записи состояния диалогов ({len(batch)} польз.): {e}")
+                # Повторим на следующем проходе; более свежие изменения не перезаписываем
+                for user_id, data in batch.items():
+                    self._dirty.setdefault(user_id, data)
+                return
+            
+            for user_id, data in batch.items():
+                if data:
+                    self._saved[user_id] = data
+                else:
+                    self._saved.pop(user_id, None)
+            logger.debug(f"Записано состояний диалогов: {len(batch)}")
+    
+    async def get_user_data(self) -> dict:
+        return {}
+    
+    async def get_chat_data(self) -> dict:
+        return {}
+    
+    async def get_bot_data(self) -> dict:
+        return {}
+    
+    async def get_callback_data(self):
+        return None
+    
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+    
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+    
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._mark_dirty(user_id, data)
+    
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+    
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+    
+    async def update_callback_data(self, data) -> None:
+        pass
+    
+    async def drop_user_data(self, user_id: int) -> None:
+        self._loaded_users.discard(user_id)
+        self._mark_dirty(user_id, None)
+    
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+    
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if user_id in self._loaded_users:
+            return
+        
+        stored = await self.store.load(USER_DATA, user_id)
+        user_data.clear()
+        if stored:
+            user_data.update(stored)
+            self._saved[user_id] = copy.deepcopy(stored)
+        self._loaded_users.add(user_id)
+    
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+    
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+    
+    async def flush(self) -> None:
+        """Дописать буфер при остановке бота"""
+        if self._flush_task is not None:
+            await self._flush_task
+        if self._dirty:
+            await self._write_dirty()
+
+
+def create_persistence() -> StatePersistence:
+    """Персистентность по настройке PERSISTENCE_BACKEND (postgres, memory или none)"""
+    backend = Config.PERSISTENCE_BACKEND
+    
+    if backend == 'none':
+        return None
+    if backend == 'memory':
+        store = MemoryStateStore()
+    elif backend == 'postgres':
+        store = PostgresStateStore()
+    else:
+        raise ValueError(f"Неизвестный PERSISTENCE_BACKEND: {backend}")
+    
+    logger.info(f"Состояние диалогов хранится в: {backend}")
+    return StatePersistence(store, update_interval=Config.PERSISTENCE_UPDATE_INTERVAL)
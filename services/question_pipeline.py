@@ -0,0 +1,380 @@
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from telegram.error import RetryAfter, Forbidden, BadRequest, TelegramError
+from database.db import get_async_session
+from database.models import Feedback, FeedbackStatus, User, Event, EventStatus
+from services.broadcast import RateLimiter, global_limiter
+from services.routing import rendezvous_owner
+from services.terms import add_feedback_terms_batch
+from config import Config
+from collections import deque
+from datetime import datetime
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PendingQuestion:
+    """Вопрос, принятый от пользователя, вместе со всем нужным для пересылки"""
+
+    __slots__ = ('feedback_id', 'user_id', 'telegram_id', 'full_name', 'username', 'event_id',
+                 'event_name', 'topic_id', 'text', 'photo_file_id', 'created_at', 'forward_attempts')
+
+    def __init__(self, user_id: int, telegram_id: int, full_name: str, username: str, event_id: int,
+                 event_name: str, topic_id: int, text: str, photo_file_id: str = None,
+                 created_at: datetime = None, feedback_id: int = None, forward_attempts: int = 0):
+        self.feedback_id = feedback_id
+        self.user_id = user_id
+        self.telegram_id = telegram_id
+        self.full_name = full_name
+        self.username = username
+        self.event_id = event_id
+        self.event_name = event_name
+        self.topic_id = topic_id
+        self.text = text
+        self.photo_file_id = photo_file_id
+        self.created_at = created_at or datetime.utcnow()
+        self.forward_attempts = forward_attempts
+
+    @classmethod
+    def from_snapshots(cls, user, event, text: str, photo_file_id: str = None) -> 'PendingQuestion':
+        """Из CachedUser и ActiveEvent"""
+        return cls(user.id, user.telegram_id, user.full_name, user.username,
+                   event.id, event.name, event.topic_id, text, photo_file_id)
+
+
+def format_question(question: PendingQuestion) -> str:
+    """Текст вопроса для топика мероприятия в рабочей группе"""
+    user_info = f"👤 {question.full_name or question.username or 'Пользователь'}"
+    if question.username:
+        user_info += f" (@{question.username})"
+
+    return (
+        f"❓ Новый вопрос #{question.feedback_id}\n\n"
+        f"{user_info}\n"
+        f"📅 Мероприятие: {question.event_name}\n\n"
+        f"💬 Вопрос:\n{question.text}"
+    )
+
+
+class QuestionPipeline:
+    """
+    Прием вопросов пачками.
+
+    Обработчик сообщения кладет вопрос в очередь и сразу отвечает пользователю.
+    Писатель сохраняет все накопившиеся за время предыдущей записи вопросы
+    одним INSERT вместе с частотным словарем и передает их отправителю.
+    Отправитель пересылает вопросы в рабочую группу по одному с паузой между
+    сообщениями: топики обходятся по кругу, внутри топика сохраняется порядок
+    поступления. topic_message_id записывается пачками. Вопрос, который не
+    удалось переслать, остается первым в своем топике и повторяется после
+    паузы; неудачные серии повторов считаются в forward_attempts, и после
+    QUESTION_FORWARD_MAX_ATTEMPTS вопрос больше не пересылается, а автору
+    приходит сообщение. Вопросы, сохраненные, но не пересланные до остановки,
+    пересылаются при следующем запуске.
+    """
+
+    def __init__(self, batch_size: int = None, queue_size: int = None, forward_interval: float = None,
+                 write_back_delay: float = None, max_retries: int = None, max_attempts: int = None,
+                 backlog_limit: int = None):
+        self.batch_size = batch_size or Config.QUESTION_BATCH_SIZE
+        self.queue_size = queue_size or Config.QUESTION_QUEUE_SIZE
+        self.forward_interval = forward_interval or Config.QUESTION_FORWARD_INTERVAL
+        self.write_back_delay = Config.QUESTION_WRITE_BACK_DELAY if write_back_delay is None else write_back_delay
+        self.max_retries = Config.BROADCAST_MAX_RETRIES if max_retries is None else max_retries
+        self.max_attempts = max_attempts or Config.QUESTION_FORWARD_MAX_ATTEMPTS
+        self.backlog_limit = backlog_limit or Config.QUESTION_BACKLOG_LIMIT
+        self.bot = None
+        self._queue: asyncio.Queue = None
+        self._topics = {}  # event_id -> deque вопросов; порядок ключей - очередь обхода топиков
+        self._retry_at = {}  # event_id -> loop.time(), до которого топик ждет повтора первого вопроса
+        self._sent = []    # строки для записи topic_message_id или числа неудачных попыток
+        self._stopping = False
+        self._tasks = ()
+
+    async def start(self, bot) -> None:
+        self.bot = bot
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._group_limiter = RateLimiter(1.0 / self.forward_interval)
+        self._forward_ready = asyncio.Event()
+        self._sent_ready = asyncio.Event()
+        self._stopping = False
+
+        unsent = await self._load_unsent()
+        for question in unsent:
+            self._enqueue_forward(question)
+        if unsent:
+            logger.info(f"Вопросов, ожидающих пересылки с прошлого запуска: {len(unsent)}")
+
+        self._tasks = ()
+        for name, loop_factory in (('_writer', self._write_loop), ('_forwarder', self._forward_loop),
+                                   ('_write_back', self._write_back_loop)):
+            self._start_task(name, loop_factory)
+
+    def _start_task(self, name: str, loop_factory) -> None:
+        task = asyncio.get_running_loop().create_task(loop_factory())
+        task.add_done_callback(lambda done: self._on_task_done(name, loop_factory, done))
+        setattr(self, name, task)
+        self._tasks = tuple(other for other in self._tasks if not other.done()) + (task,)
+
+    def _on_task_done(self, name: str, loop_factory, task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is None:
+            return
+        # Без писателя submit() рано или поздно зависнет на полной очереди: перезапускаем
+        logger.error(f"Цикл {name} приема вопросов упал, перезапуск", exc_info=task.exception())
+        if self._tasks and not self._stopping:
+            self._start_task(name, loop_factory)
+
+    async def submit(self, question: PendingQuestion) -> None:
+        """Принять вопрос (ждет, только если очередь заполнена)"""
+        if self._queue is None:
+            raise RuntimeError("Прием вопросов не запущен")
+        await self._queue.put(question)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Сохранить принятые вопросы и записать уже отправленные; остальные перешлются после запуска"""
+        if not self._tasks:
+            return
+
+        await self._queue.put(None)
+        await self._writer
+
+        self._stopping = True
+        self._forward_ready.set()
+        _, pending = await asyncio.wait([self._forwarder], timeout=timeout)
+        if pending:
+            # Например, ждет floodwait: прерванный вопрос перешлется после запуска
+            self._forwarder.cancel()
+            await asyncio.gather(self._forwarder, return_exceptions=True)
+
+        self._sent_ready.set()
+        await self._write_back
+        self._tasks = ()
+        self._queue = None
+
+    # ---------- сохранение ----------
+
+    async def _write_loop(self):
+        stopping = False
+        while not stopping:
+            # Пока идет запись, в очереди копятся новые вопросы: пачка растет с нагрузкой
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            questions = [question for question in batch if question is not None]
+            stopping = len(questions) < len(batch)
+            if not questions:
+                continue
+            try:
+                await self._insert(questions)
+            except Exception:
+                # Ошибка одной пачки не должна останавливать прием следующих
+                logger.exception(f"Не удалось сохранить {len(questions)} вопросов")
+                await self._report_lost(questions)
+
+    async def _insert(self, questions: list):
+        rows = [{
+            'user_id': question.user_id,
+            'event_id': question.event_id,
+            'message_text': question.text,
+            'photo_file_id': question.photo_file_id,
+            'status': FeedbackStatus.NEW,
+            'created_at': question.created_at,
+        } for question in questions]
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with get_async_session() as session:
+                    feedback_ids = (await session.scalars(
+                        insert(Feedback).returning(Feedback.id, sort_by_parameter_order=True), rows
+                    )).all()
+                    await add_feedback_terms_batch(session, [(question.event_id, question.text)
+                                                             for question in questions])
+                break
+            except SQLAlchemyError as e:
+                logger.error(f"Не удалось сохранить {len(questions)} вопросов (попытка {attempt + 1}): {e}")
+                if attempt == self.max_retries:
+                    await self._report_lost(questions)
+                    return
+                await asyncio.sleep(2 ** attempt)
+
+        for question, feedback_id in zip(questions, feedback_ids):
+            question.feedback_id = feedback_id
+            self._enqueue_forward(question)
+        logger.info(f"Сохранено вопросов: {len(questions)} (#{feedback_ids[0]}-#{feedback_ids[-1]})")
+
+    async def _report_lost(self, questions: list,
+                           text: str = "❌ Не удалось сохранить ваш вопрос. Пожалуйста, отправьте его еще раз."):
+        for question in questions:
+            try:
+                await self.bot.send_message(chat_id=question.telegram_id, text=text)
+            except TelegramError as e:
+                logger.warning(f"Не удалось сообщить пользователю {question.telegram_id} о потере вопроса: {e}")
+
+    async def _load_unsent(self) -> list:
+        """Сохраненные, но не пересланные вопросы (остановка между записью и пересылкой)"""
+        async with get_async_session() as session:
+            rows = (await session.execute(
+                select(Feedback.id, Feedback.user_id, Feedback.event_id, Feedback.message_text,
+                       Feedback.photo_file_id, Feedback.created_at, Feedback.forward_attempts,
+                       User.telegram_id, User.full_name, User.username, Event.name, Event.topic_id)
+                .join(User, User.id == Feedback.user_id)
+                .join(Event, Event.id == Feedback.event_id)
+                .where(Feedback.topic_message_id.is_(None), Feedback.status == FeedbackStatus.NEW,
+                       Feedback.forward_attempts < self.max_attempts,
+                       Event.status == EventStatus.ACTIVE)
+                .order_by(Feedback.id)
+                .limit(self.backlog_limit)
+            )).all()
+
+        if len(rows) == self.backlog_limit:
+            logger.warning(f"Непересланных вопросов не меньше {self.backlog_limit}: "
+                           f"остальные будут пересланы при следующих запусках")
+
+        # Вопросы пользователя принимает его реплика: чужие могут еще пересылаться ею
+        if len(Config.REPLICA_URLS) > 1:
+            rows = [row for row in rows
+                    if rendezvous_owner(row.telegram_id, Config.REPLICA_URLS) == Config.REPLICA_ID]
+
+        return [PendingQuestion(row.user_id, row.telegram_id, row.full_name, row.username, row.event_id,
+                                row.name, row.topic_id, row.message_text, row.photo_file_id,
+                                row.created_at, feedback_id=row.id, forward_attempts=row.forward_attempts)
+                for row in rows]
+
+    # ---------- пересылка в рабочую группу ----------
+
+    def _enqueue_forward(self, question: PendingQuestion):
+        self._topics.setdefault(question.event_id, deque()).append(question)
+        self._forward_ready.set()
+
+    async def _forward_loop(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            # Топики по кругу: наплыв вопросов в одном не задерживает остальные,
+            # как и топик, который ждет повтора неудавшегося вопроса
+            now = loop.time()
+            event_id = next((event_id for event_id in self._topics
+                             if self._retry_at.get(event_id, 0) <= now), None)
+            if event_id is None:
+                delay = min((self._retry_at[event_id] - now for event_id in self._topics), default=None)
+                self._forward_ready.clear()
+                try:
+                    await asyncio.wait_for(self._forward_ready.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            pending = self._topics.pop(event_id)
+            question = pending.popleft()
+            if pending:
+                self._topics[event_id] = pending
+
+            message_id = await self._forward(question)
+            if message_id is not None:
+                self._retry_at.pop(event_id, None)
+                self._sent.append({'id': question.feedback_id, 'topic_message_id': message_id,
+                                   'status': FeedbackStatus.IN_PROGRESS})
+            else:
+                self._sent.append({'id': question.feedback_id, 'forward_attempts': question.forward_attempts})
+                if question.forward_attempts < self.max_attempts:
+                    # Вопрос остается первым в топике: следующие не обгонят его, пока он ждет повтора
+                    self._topics.setdefault(event_id, deque()).appendleft(question)
+                    self._retry_at[event_id] = loop.time() + self._retry_delay(question)
+                else:
+                    self._retry_at.pop(event_id, None)
+                    await self._report_lost(
+                        [question], "❌ Не удалось передать ваш вопрос организаторам. "
+                                    "Пожалуйста, отправьте его еще раз.")
+            self._sent_ready.set()
+
+    def _retry_delay(self, question: PendingQuestion) -> float:
+        # Продолжение пауз между повторами внутри _forward: 2 ** failures
+        return 2 ** (self.max_retries + question.forward_attempts)
+
+    async def _forward(self, question: PendingQuestion) -> int:
+        """
+        message_id сообщения в топике или None, если переслать не удалось.
+        При неудаче увеличивает question.forward_attempts, и вопрос повторяется
+        позже; если Telegram отклонил сообщение, повторять бессмысленно, и
+        попытки сразу исчерпываются.
+        """
+        message_text = format_question(question)
+        failures = 0
+        while True:
+            await self._group_limiter.acquire()
+            await global_limiter.acquire()
+            try:
+                if question.photo_file_id:
+                    sent_message = await self.bot.send_photo(
+                        chat_id=Config.WORK_GROUP_ID,
+                        message_thread_id=question.topic_id,
+                        photo=question.photo_file_id,
+                        caption=message_text
+                    )
+                else:
+                    sent_message = await self.bot.send_message(
+                        chat_id=Config.WORK_GROUP_ID,
+                        message_thread_id=question.topic_id,
+                        text=message_text
+                    )
+                return sent_message.message_id
+            except RetryAfter as e:
+                # Повторяем тот же вопрос: следующие в топике не должны его обогнать
+                logger.warning(f"Floodwait в рабочей группе: пауза {e.retry_after} с.")
+                self._group_limiter.pause(e.retry_after)
+                global_limiter.pause(e.retry_after)
+            except (Forbidden, BadRequest) as e:
+                logger.error(f"Вопрос #{question.feedback_id} не переслан в рабочую группу: {e}")
+                question.forward_attempts = self.max_attempts
+                return None
+            except TelegramError as e:
+                failures += 1
+                logger.warning(f"Ошибка пересылки вопроса #{question.feedback_id} (попытка {failures}): {e}")
+                if failures > self.max_retries:
+                    question.forward_attempts += 1
+                    if question.forward_attempts < self.max_attempts:
+                        logger.error(f"Вопрос #{question.feedback_id} не переслан, "
+                                     f"повтор через {self._retry_delay(question)} с.")
+                    else:
+                        logger.error(f"Вопрос #{question.feedback_id} не переслан: попытки исчерпаны")
+                    return None
+                await asyncio.sleep(2 ** failures)
+
+    # ---------- запись topic_message_id ----------
+
+    async def _write_back_loop(self):
+        while True:
+            if not self._stopping:
+                await self._sent_ready.wait()
+            if not self._stopping:
+                # Копим отправленные, чтобы записать их одним запросом
+                await asyncio.sleep(self.write_back_delay)
+            self._sent_ready.clear()
+
+            written = await self._flush_sent()
+            # При остановке дописываем и то, что отправитель успел добавить во время записи
+            if self._stopping and (not written or not self._sent):
+                return
+            if not written:
+                await asyncio.sleep(1)
+                self._sent_ready.set()
+
+    async def _flush_sent(self) -> bool:
+        if not self._sent:
+            return True
+
+        rows, self._sent = self._sent, []
+        try:
+            async with get_async_session() as session:
+                # ORM bulk UPDATE по первичному ключу: один executemany на пачку
+                await session.execute(update(Feedback), rows)
+            return True
+        except SQLAlchemyError as e:
+            logger.error(f"Не удалось записать результат пересылки {len(rows)} вопросов: {e}")
+            self._sent = rows + self._sent
+            return False
+
+
+question_pipeline = QuestionPipeline()
@@ -0,0 +1,73 @@
+from sqlalchemy import select, func, delete, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.db import get_async_session
+from database.models import Event, Feedback, Rating, ReportCache
+from services.chart_cache import CHART_STYLE_VERSION
+from datetime import datetime
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Меняется при изменении содержимого отчета, чтобы не отдавать отчеты старого вида
+REPORT_FORMAT_VERSION = 1
+
+
+async def get_report_version(session: AsyncSession, event_id: int) -> str:
+    """
+    Версия данных отчета по мероприятию (одним запросом).
+    
+    Меняется при любом новом или измененном отзыве/оценке (количество и
+    время последнего изменения), а также при изменении самого мероприятия.
+    """
+    feedbacks = select(
+        func.count(Feedback.id),
+        func.max(func.coalesce(Feedback.answered_at, Feedback.created_at))
+    ).where(Feedback.event_id == event_id).subquery()
+    
+    ratings = select(
+        func.count(Rating.id),
+        func.max(func.coalesce(Rating.updated_at, Rating.created_at))
+    ).where(Rating.event_id == event_id).subquery()
+    
+    row = (await session.execute(
+        select(Event.name, Event.status, Event.closed_at, feedbacks, ratings)
+        .select_from(Event)
+        .join(feedbacks, true())
+        .join(ratings, true())
+        .where(Event.id == event_id)
+    )).one_or_none()
+    
+    if row is None:
+        return None
+    
+    payload = repr((event_id, REPORT_FORMAT_VERSION, CHART_STYLE_VERSION, tuple(row)))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def get_cached_report(session: AsyncSession, event_id: int, version: str) -> str:
+    """file_id ранее отправленного отчета той же версии (None, если данные изменились)"""
+    return await session.scalar(
+        select(ReportCache.file_id).filter_by(event_id=event_id, version=version)
+    )
+
+
+async def store_cached_report(event_id: int, version: str, file_id: str) -> None:
+    """Запомнить file_id отправленного отчета для версии данных"""
+    statement = insert(ReportCache).values(
+        event_id=event_id, version=version, file_id=file_id, created_at=datetime.utcnow()
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[ReportCache.event_id],
+        set_={'version': statement.excluded.version, 'file_id': statement.excluded.file_id,
+              'created_at': statement.excluded.created_at}
+    )
+    async with get_async_session() as session:
+        await session.execute(statement)
+
+
+async def drop_cached_report(event_id: int) -> None:
+    """Забыть отчет (например, Telegram больше не принимает его file_id)"""
+    async with get_async_session() as session:
+        await session.execute(delete(ReportCache).filter_by(event_id=event_id))
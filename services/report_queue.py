@@ -0,0 +1,121 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+import asyncio
+import multiprocessing
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReportQueueFull(Exception):
+    """Слишком много отчетов в очереди"""
+
+
+class ReportJob:
+    """Задача генерации отчета, на результат которой могут подписаться несколько админов"""
+
+    def __init__(self, event_id: int = None):
+        self.event_id = event_id
+        self.status = 'queued'
+        self.started = asyncio.Event()
+        self.future = asyncio.get_running_loop().create_future()
+
+    async def wait_started(self):
+        await self.started.wait()
+
+    async def result(self) -> bytes:
+        return await asyncio.shield(self.future)
+
+
+class ReportQueue:
+    """Очередь генерации PDF отчетов в пуле процессов"""
+
+    def __init__(self, max_workers: int = None, max_pending: int = None):
+        self.max_workers = max_workers or Config.REPORT_WORKERS
+        self.max_pending = max_pending or Config.REPORT_MAX_PENDING
+        self._executor = None
+        self._slots = None
+        self._jobs = {}
+
+    def submit(self, event_id: int = None):
+        """
+        Поставить отчет в очередь. Возвращает (job, is_new): одинаковые запросы,
+        пока отчет не готов, получают одну и ту же задачу.
+        """
+        key = event_id or 'all'
+        job = self._jobs.get(key)
+        if job:
+            return job, False
+
+        if len(self._jobs) >= self.max_pending:
+            raise ReportQueueFull()
+
+        job = ReportJob(event_id)
+        self._jobs[key] = job
+        asyncio.get_running_loop().create_task(self._run(key, job))
+        return job, True
+
+    def position(self, job: ReportJob) -> int:
+        """Номер задачи среди ожидающих (0 — уже выполняется)"""
+        if job.status != 'queued':
+            return 0
+        jobs = list(self._jobs.values())
+        running = sum(1 for j in jobs if j.status == 'running')
+        queued = [j for j in jobs if j.status == 'queued']
+        free_slots = max(self.max_workers - running, 0)
+        return max(queued.index(job) + 1 - free_slots, 0)
+
+    async def _run(self, key, job: ReportJob):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        try:
+            async with self._slots:
+                job.status = 'running'
+                job.started.set()
+                result = await self._build(job.event_id)
+                job.future.set_result(result)
+        except Exception as e:
+            logger.error(f"Ошибка генерации отчета {key}: {e}")
+            job.started.set()
+            job.future.set_exception(e)
+        finally:
+            job.status = 'done'
+            self._jobs.pop(key, None)
+
+    async def _build(self, event_id: int) -> bytes:
+        from services.pdf_report import build_report_bytes
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                return await loop.run_in_executor(executor, build_report_bytes, event_id)
+            except BrokenProcessPool as e:
+                # Рабочий процесс упал (OOM, segfault): пул больше не принимает задачи
+                logger.error(f"Пул генерации отчетов сломан, пересоздаем: {e}")
+                self._reset_executor(executor)
+                if attempt:
+                    raise
+
+    def _reset_executor(self, executor: ProcessPoolExecutor):
+        # Параллельные задачи видят ту же ошибку: пересоздаем пул только один раз
+        if self._executor is executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: рабочие процессы создают свои подключения к БД, не наследуя пул родителя
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+report_queue = ReportQueue()
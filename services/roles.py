@@ -0,0 +1,224 @@
+from sqlalchemy import select, update, or_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import User, UserRole
+from services.user_directory import parse_telegram_id
+import csv
+import io
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Уведомления пользователю о новой роли
+ROLE_NOTIFICATIONS = {
+    UserRole.ADMIN: "👑 Вам назначена роль администратора!\n\nТеперь у вас есть доступ ко всем командам управления.\n"
+                    "Используйте /start для просмотра доступных функций.",
+    UserRole.MANAGER: "👔 Вам назначена роль менеджера!\n\nТеперь вы можете отвечать на вопросы пользователей "
+                      "в рабочей группе.\n\nПросто отвечайте (Reply) на сообщения в топиках мероприятий.",
+    UserRole.USER: "ℹ️ С вас снята роль {old_role}.\nТеперь у вас права обычного пользователя.",
+}
+
+_SEPARATORS_RE = re.compile(r'[\s,;]+')
+_USERNAME_RE = re.compile(r'@?([A-Za-z][A-Za-z0-9_]{3,31})')
+
+# Заголовки колонок CSV (без учета регистра), из которых берутся идентификаторы
+ID_COLUMNS = frozenset({'telegram_id', 'telegram id', 'tg_id', 'tg id', 'id', 'user_id', 'telegram'})
+USERNAME_COLUMNS = frozenset({'username', 'user_name', 'telegram_username', 'логин', 'ник', 'никнейм'})
+
+
+class IdentifierColumnNotFound(Exception):
+    """В CSV из нескольких колонок нет колонки с Telegram ID или username"""
+
+
+def parse_identifier(token: str):
+    """'123' -> 123 (Telegram ID), '@Name' -> 'name' (username), иначе None"""
+    token = token.strip()
+    telegram_id = parse_telegram_id(token)
+    if telegram_id is not None:
+        return telegram_id
+    if token.startswith('@'):
+        match = _USERNAME_RE.fullmatch(token)
+        if match:
+            return match.group(1).lower()
+    return None
+
+
+def parse_identifier_list(text: str) -> tuple:
+    """Список ID и @username через пробелы, запятые или переводы строк -> (идентификаторы, ошибочные)"""
+    identifiers, invalid = [], []
+    for token in _SEPARATORS_RE.split(text):
+        if not token:
+            continue
+        identifier = parse_identifier(token)
+        if identifier is None:
+            invalid.append(token)
+        else:
+            identifiers.append(identifier)
+    return identifiers, invalid
+
+
+def _parse_username(cell: str) -> str:
+    match = _USERNAME_RE.fullmatch(cell)
+    return match.group(1).lower() if match else None
+
+
+def parse_identifier_csv(content: str) -> tuple:
+    """
+    CSV со списком пользователей -> (идентификаторы, ошибочные строки).
+    
+    Файл из одной колонки читается целиком, первая строка без идентификатора
+    считается заголовком. В файле из нескольких колонок идентификаторы берутся
+    только из колонок с заголовком из ID_COLUMNS или USERNAME_COLUMNS: номер
+    телефона или другое число в соседней колонке не должно стать Telegram ID.
+    Если таких колонок нет, бросает IdentifierColumnNotFound.
+    """
+    # Excel в русской локали сохраняет CSV через ";", остальные программы - через ","
+    header = next((line for line in content.splitlines() if line.strip()), '')
+    delimiter = max(',;\t', key=header.count)
+    
+    rows = [[cell.strip() for cell in row] for row in csv.reader(io.StringIO(content), delimiter=delimiter)]
+    rows = [row for row in rows if any(row)]
+    identifiers, invalid = [], []
+    
+    if all(sum(1 for cell in row if cell) == 1 for row in rows):
+        for number, row in enumerate(rows):
+            cell = next(cell for cell in row if cell)
+            identifier = parse_identifier(cell)
+            if identifier is not None:
+                identifiers.append(identifier)
+            elif number > 0:
+                invalid.append(cell)
+        return identifiers, invalid
+    
+    columns = [cell.lower() for cell in rows[0]]
+    id_column = next((i for i, name in enumerate(columns) if name in ID_COLUMNS), None)
+    username_column = next((i for i, name in enumerate(columns) if name in USERNAME_COLUMNS), None)
+    if id_column is None and username_column is None:
+        raise IdentifierColumnNotFound()
+    
+    for row in rows[1:]:
+        identifier = None
+        if id_column is not None and id_column < len(row):
+            identifier = parse_identifier(row[id_column])
+        if identifier is None and username_column is not None and username_column < len(row):
+            identifier = _parse_username(row[username_column])
+        if identifier is not None:
+            identifiers.append(identifier)
+        else:
+            invalid.append(', '.join(cell for cell in row if cell))
+    return identifiers, invalid
+
+
+class BulkRoleResult:
+    """Итог массовой смены роли"""
+    
+    __slots__ = ('role', 'changed', 'created', 'unchanged', 'skipped', 'not_found', 'invalid')
+    
+    def __init__(self, role: UserRole, invalid: list = ()):
+        self.role = role
+        self.changed = []    # (telegram_id, отображаемое имя, прежняя роль)
+        self.created = []    # Telegram ID, которых еще не было в базе
+        self.unchanged = []  # отображаемые имена
+        self.skipped = []    # (отображаемое имя, причина)
+        self.not_found = []  # идентификаторы как во входных данных
+        self.invalid = list(invalid)
+    
+    @property
+    def affected_telegram_ids(self) -> list:
+        return [telegram_id for telegram_id, _, _ in self.changed] + self.created
+
+
+def _display(user: User) -> str:
+    return user.full_name or (f"@{user.username}" if user.username else f"ID{user.telegram_id}")
+
+
+def _skip_reason(user: User, role: UserRole, acting_telegram_id: int) -> str:
+    """Причина не менять роль (правила те же, что у одиночных команд)"""
+    if role == UserRole.MANAGER and user.role == UserRole.ADMIN:
+        return "уже администратор"
+    if role == UserRole.USER and user.telegram_id == acting_telegram_id:
+        return "нельзя снять роль с себя"
+    return None
+
+
+async def apply_bulk_role(session: AsyncSession, identifiers: list, role: UserRole,
+                          acting_telegram_id: int, invalid: list = (), dry_run: bool = False) -> BulkRoleResult:
+    """
+    Назначить роль role всем пользователям из identifiers (UserRole.USER - снять роль).
+    
+    Пользователи находятся одним запросом по Telegram ID и username (без учета
+    регистра) и блокируются до конца транзакции; роли меняются одним UPDATE.
+    Неизвестные Telegram ID регистрируются только при назначении менеджеров:
+    администратором массово можно сделать лишь того, кто уже писал боту.
+    dry_run=True только считает итог для подтверждения, ничего не меняя.
+    Транзакцию завершает вызывающий код.
+    """
+    result = BulkRoleResult(role, invalid)
+    # Повторы во входных данных не важны, порядок сохраняем для итогов
+    identifiers = list(dict.fromkeys(identifiers))
+    telegram_ids = [identifier for identifier in identifiers if isinstance(identifier, int)]
+    usernames = [identifier for identifier in identifiers if isinstance(identifier, str)]
+    
+    conditions = []
+    if telegram_ids:
+        conditions.append(User.telegram_id.in_(telegram_ids))
+    if usernames:
+        # Выражение совпадает с индексом ix_users_username_lower
+        conditions.append(func.lower(User.username).in_(usernames))
+    users = []
+    if conditions:
+        query = select(User).where(or_(*conditions)).order_by(User.id)
+        if not dry_run:
+            query = query.with_for_update()
+        users = (await session.scalars(query)).all()
+    
+    by_telegram_id = {user.telegram_id: user for user in users}
+    by_username = {user.username.lower(): user for user in users if user.username}
+    
+    to_change, seen = [], set()
+    for identifier in identifiers:
+        user = by_telegram_id.get(identifier) if isinstance(identifier, int) else by_username.get(identifier)
+        if user is None:
+            if isinstance(identifier, int) and role == UserRole.MANAGER:
+                result.created.append(identifier)
+            else:
+                result.not_found.append(identifier if isinstance(identifier, int) else f"@{identifier}")
+            continue
+        if user.id in seen:
+            continue
+        seen.add(user.id)
+        
+        reason = _skip_reason(user, role, acting_telegram_id)
+        if reason:
+            result.skipped.append((_display(user), reason))
+        elif user.role == role:
+            result.unchanged.append(_display(user))
+        else:
+            to_change.append(user.id)
+            result.changed.append((user.telegram_id, _display(user), user.role))
+    
+    if dry_run:
+        return result
+    
+    if to_change:
+        await session.execute(
+            update(User).where(User.id.in_(to_change)).values(role=role)
+            .execution_options(synchronize_session=False)
+        )
+    if result.created:
+        session.add_all([User(telegram_id=telegram_id, role=role) for telegram_id in result.created])
+        await session.flush()
+    
+    logger.info(f"Массовая смена роли на {role.value}: изменено {len(result.changed)}, "
+                f"добавлено {len(result.created)}, не найдено {len(result.not_found)}")
+    return result
+
+
+def build_role_notifications(result: BulkRoleResult) -> list:
+    """Сообщения для Broadcaster: (chat_id, kwargs send_message) каждому, чья роль изменилась"""
+    template = ROLE_NOTIFICATIONS[result.role]
+    messages = [(telegram_id, {'text': template.format(old_role=old_role.value)})
+                for telegram_id, _, old_role in result.changed]
+    messages += [(telegram_id, {'text': template.format(old_role=UserRole.USER.value)})
+                 for telegram_id in result.created]
+    return messages
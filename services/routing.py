@@ -0,0 +1,92 @@
+from telegram import Update
+from config import Config
+import hashlib
+import httpx
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def rendezvous_owner(key: int, nodes: list) -> int:
+    """Индекс узла, отвечающего за ключ (rendezvous hashing, HRW)"""
+    best_index, best_score = 0, -1
+    for index, node in enumerate(nodes):
+        digest = hashlib.blake2b(f"{node}:{key}".encode(), digest_size=8).digest()
+        score = int.from_bytes(digest, 'big')
+        if score > best_score:
+            best_index, best_score = index, score
+    return best_index
+
+
+class StickyRouter:
+    """
+    Липкая маршрутизация обновлений по id пользователя между репликами бота.
+    
+    Балансировщик отдает webhook-запрос любой реплике. Если пользователь
+    закреплен за другой репликой, обновление пересылается на ее webhook,
+    поэтому все шаги диалога одного пользователя обрабатывает одна реплика.
+    При добавлении или удалении реплики переезжает только ~1/N пользователей.
+    Если реплика-владелец недоступна, обновление обрабатывается локально.
+    """
+    
+    def __init__(self, replica_id: int, replica_urls: list, url_path: str,
+                 secret_token: str = None, timeout: float = 5.0, persistence=None):
+        self.replica_id = replica_id
+        self.replica_urls = [url.rstrip('/') for url in replica_urls]
+        self.url_path = url_path.strip('/')
+        self.secret_token = secret_token
+        self.timeout = timeout
+        self.persistence = persistence
+        self._client: httpx.AsyncClient = None
+    
+    def owner(self, user_id: int) -> int:
+        return rendezvous_owner(user_id, self.replica_urls)
+    
+    async def forward(self, update: object) -> bool:
+        """Переслать обновление реплике-владельцу; False - обработать локально"""
+        if not isinstance(update, Update) or update.effective_user is None:
+            return False
+        
+        user_id = update.effective_user.id
+        owner = self.owner(user_id)
+        if owner == self.replica_id:
+            return False
+        
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        
+        headers = {}
+        if self.secret_token:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = self.secret_token
+        
+        try:
+            response = await self._client.post(
+                f"{self.replica_urls[owner]}/{self.url_path}",
+                json=update.to_dict(), headers=headers
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Реплика {owner} недоступна ({e}), обновление {update.update_id} обрабатываем сами")
+            return False
+        
+        # Если пользователь раньше обслуживался здесь, его состояние в памяти устарело
+        if self.persistence is not None:
+            self.persistence.forget_user(user_id)
+        return True
+    
+    async def shutdown(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_router(persistence=None) -> StickyRouter:
+    """Маршрутизатор по настройкам REPLICA_ID/REPLICA_URLS (None для одной реплики)"""
+    if len(Config.REPLICA_URLS) < 2:
+        return None
+    
+    logger.info(f"Реплика {Config.REPLICA_ID} из {len(Config.REPLICA_URLS)}, липкая маршрутизация включена")
+    return StickyRouter(
+        Config.REPLICA_ID, Config.REPLICA_URLS, Config.WEBHOOK_PATH,
+        secret_token=Config.WEBHOOK_SECRET, persistence=persistence
+    )
@@ -0,0 +1,106 @@
+from sqlalchemy import select, func, text as sql_text
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import Event, Feedback, Rating
+from config import Config
+from datetime import datetime
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Должна совпадать с конфигурацией в вычисляемых колонках search_vector (миграция 0006)
+SEARCH_CONFIG = 'russian'
+
+# Сколько совпадений читать без сортировки, чтобы понять, частое ли слово
+SEARCH_PROBE_LIMIT = 1000
+
+_EVENT_FILTER_RE = re.compile(r'(?:^|\s)#(\d+)(?=\s|$)')
+
+
+class SearchHit:
+    """Найденный вопрос или комментарий к оценке"""
+    
+    __slots__ = ('kind', 'id', 'event_id', 'event_name', 'text', 'rating', 'created_at')
+    
+    def __init__(self, kind: str, id: int, event_id: int, event_name: str, text: str,
+                 rating: int, created_at):
+        self.kind = kind  # 'feedback' или 'rating'
+        self.id = id
+        self.event_id = event_id
+        self.event_name = event_name
+        self.text = text
+        self.rating = rating
+        self.created_at = created_at
+
+
+def parse_search_query(raw: str) -> tuple:
+    """Разобрать строку поиска: '#12 звук слайды' -> ('звук слайды', 12)"""
+    event_id = None
+    match = _EVENT_FILTER_RE.search(raw)
+    if match:
+        event_id = int(match.group(1))
+        raw = raw[:match.start()] + ' ' + raw[match.end():]
+    return ' '.join(raw.split()), event_id
+
+
+async def _latest_matches(session: AsyncSession, model, tsquery, event_id: int, limit: int) -> list:
+    """(id, created_at) последних limit совпадений в таблице model, новые сначала"""
+    conditions = [model.search_vector.op('@@')(tsquery)]
+    if event_id:
+        conditions.append(model.event_id == event_id)
+    columns = select(model.id, model.created_at).where(*conditions)
+    
+    # Редкие слова: GIN-индекс отдает все совпадения, сортируем их сами
+    rows = (await session.execute(columns.limit(SEARCH_PROBE_LIMIT))).all()
+    if len(rows) < SEARCH_PROBE_LIMIT:
+        return sorted(rows, key=lambda row: row.id, reverse=True)[:limit]
+    
+    # Частые слова: совпадения плотно лежат и среди последних записей,
+    # обход первичного ключа с конца находит их, не сортируя все совпадения
+    return (await session.execute(columns.order_by(model.id.desc()).limit(limit))).all()
+
+
+async def search_feedback(session: AsyncSession, text: str, event_id: int = None,
+                          page: int = 0, page_size: int = None) -> tuple:
+    """
+    Поиск по вопросам и комментариям к оценкам, новые сначала.
+    
+    text разбирается websearch_to_tsquery: поддерживаются "фразы", or и -исключение.
+    Возвращает (список SearchHit, есть ли следующая страница).
+    """
+    page_size = page_size or Config.SEARCH_PAGE_SIZE
+    offset = page * page_size
+    window = offset + page_size + 1
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, text)
+    
+    # План зависит от частоты слов запроса; общий план подготовленного запроса
+    # один на все слова и для редких слов перебирает всю таблицу
+    await session.execute(sql_text("SET LOCAL plan_cache_mode = force_custom_plan"))
+    
+    matches = [('feedback', row) for row in await _latest_matches(session, Feedback, tsquery, event_id, window)]
+    matches += [('rating', row) for row in await _latest_matches(session, Rating, tsquery, event_id, window)]
+    matches.sort(key=lambda match: (match[1].created_at or datetime.min, match[1].id), reverse=True)
+    page_matches = matches[offset:offset + page_size]
+    
+    feedback_ids = [row.id for kind, row in page_matches if kind == 'feedback']
+    rating_ids = [row.id for kind, row in page_matches if kind == 'rating']
+    found = {}
+    if feedback_ids:
+        for row in await session.execute(
+            select(Feedback.id, Feedback.event_id, Event.name, Feedback.message_text, Feedback.created_at)
+            .join(Event, Event.id == Feedback.event_id)
+            .where(Feedback.id.in_(feedback_ids))
+        ):
+            found['feedback', row.id] = SearchHit('feedback', row.id, row.event_id, row.name,
+                                                  row.message_text, None, row.created_at)
+    if rating_ids:
+        for row in await session.execute(
+            select(Rating.id, Rating.event_id, Event.name, Rating.comment, Rating.rating, Rating.created_at)
+            .join(Event, Event.id == Rating.event_id)
+            .where(Rating.id.in_(rating_ids))
+        ):
+            found['rating', row.id] = SearchHit('rating', row.id, row.event_id, row.name,
+                                                row.comment, row.rating, row.created_at)
+    
+    results = [found[kind, row.id] for kind, row in page_matches if (kind, row.id) in found]
+    return results, len(matches) > offset + page_size
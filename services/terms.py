@@ -0,0 +1,119 @@
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database.models import Feedback, FeedbackTerm
+from config import Config
+from collections import Counter
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STOP_WORDS = frozenset({
+    'в', 'на', 'и', 'с', 'по', 'для', 'не', 'от', 'за', 'к', 'до', 'из', 'у', 'о',
+    'что', 'это', 'как', 'так', 'но', 'а', 'то', 'все', 'она', 'он', 'они', 'мы',
+    'вы', 'я', 'был', 'была', 'было', 'были', 'есть', 'быть', 'будет'
+})
+
+TERM_MAX_LENGTH = 64
+
+_WORD_RE = re.compile(r'\w+')
+
+
+class TermAnalyzer:
+    """
+    Разбор текста вопроса на термины для частотного словаря.
+    
+    Слова приводятся к нижнему регистру, короткие и стоп-слова отбрасываются,
+    остальные проходят через stemmer (функция слово -> основа), если он задан.
+    """
+    
+    def __init__(self, stop_words=DEFAULT_STOP_WORDS, stemmer=None, min_length: int = 4):
+        self.stop_words = frozenset(stop_words)
+        self.stemmer = stemmer
+        self.min_length = min_length
+    
+    def terms(self, text: str) -> Counter:
+        counts = Counter()
+        for word in _WORD_RE.findall((text or '').lower()):
+            if len(word) < self.min_length or word in self.stop_words or word.isdigit():
+                continue
+            if self.stemmer is not None:
+                word = self.stemmer(word)
+            counts[word[:TERM_MAX_LENGTH]] += 1
+        return counts
+
+
+def _load_stemmer(name: str):
+    if not name:
+        return None
+    if name == 'snowball':
+        try:
+            import snowballstemmer
+        except ImportError:
+            logger.error("TERMS_STEMMER=snowball, но пакет snowballstemmer не установлен: термины без стемминга")
+            return None
+        return snowballstemmer.stemmer('russian').stemWord
+    raise ValueError(f"Неизвестный TERMS_STEMMER: {name}")
+
+
+def create_analyzer() -> TermAnalyzer:
+    """Анализатор по настройкам TERMS_STOP_WORDS_FILE, TERMS_STEMMER, TERMS_MIN_LENGTH"""
+    stop_words = set(DEFAULT_STOP_WORDS)
+    if Config.TERMS_STOP_WORDS_FILE:
+        with open(Config.TERMS_STOP_WORDS_FILE, encoding='utf-8') as f:
+            stop_words.update(line.strip().lower() for line in f if line.strip())
+    
+    return TermAnalyzer(stop_words, _load_stemmer(Config.TERMS_STEMMER), Config.TERMS_MIN_LENGTH)
+
+
+analyzer = create_analyzer()
+
+
+def _upsert_statement(event_id: int, counts: Counter):
+    # Сортировка по термину: параллельные транзакции блокируют строки в одном порядке
+    rows = [{'event_id': event_id, 'term': term, 'count': count}
+            for term, count in sorted(counts.items())]
+    statement = insert(FeedbackTerm).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=[FeedbackTerm.event_id, FeedbackTerm.term],
+        set_={'count': FeedbackTerm.count + statement.excluded.count}
+    )
+
+
+async def add_feedback_terms_batch(session: AsyncSession, items: list) -> None:
+    """
+    Учесть новые вопросы [(event_id, текст), ...] в частотном словаре
+    (в транзакции их сохранения): один upsert на мероприятие.
+    """
+    per_event = {}
+    for event_id, text in items:
+        per_event.setdefault(event_id, Counter()).update(analyzer.terms(text))
+    for event_id in sorted(per_event):
+        if per_event[event_id]:
+            await session.execute(_upsert_statement(event_id, per_event[event_id]))
+
+
+def rebuild_feedback_terms(session: Session, chunk_size: int = 1000) -> int:
+    """Пересчитать частотный словарь по всем вопросам (после смены стоп-слов или стемминга)"""
+    session.execute(delete(FeedbackTerm))
+    
+    result = session.execute(
+        select(Feedback.event_id, Feedback.message_text)
+        .order_by(Feedback.event_id)
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    
+    processed = 0
+    for chunk in result.partitions():
+        per_event = {}
+        for event_id, text in chunk:
+            per_event.setdefault(event_id, Counter()).update(analyzer.terms(text))
+        for event_id, counts in per_event.items():
+            if counts:
+                session.execute(_upsert_statement(event_id, counts))
+        processed += len(chunk)
+    
+    logger.info(f"Частотный словарь пересчитан по {processed} вопросам")
+    return processed
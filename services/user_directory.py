@@ -0,0 +1,103 @@
+from sqlalchemy import select, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import User, UserRole
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+# users.telegram_id - BIGINT
+TELEGRAM_ID_LIMIT = 2 ** 63
+
+
+class UsersPage:
+    """Страница справочника пользователей, новые сначала"""
+    
+    __slots__ = ('users', 'has_newer', 'has_older')
+    
+    def __init__(self, users: list, has_newer: bool, has_older: bool):
+        self.users = users
+        self.has_newer = has_newer
+        self.has_older = has_older
+    
+    @property
+    def first_id(self) -> int:
+        return self.users[0].id if self.users else None
+    
+    @property
+    def last_id(self) -> int:
+        return self.users[-1].id if self.users else None
+
+
+def normalize_user_query(raw: str) -> str:
+    """'@Ivan ' -> 'ivan': начало username или имени без учета регистра"""
+    return ' '.join(raw.split()).lstrip('@').lower()
+
+
+def parse_telegram_id(token: str) -> int:
+    """Telegram ID из строки ASCII-цифр в диапазоне BIGINT, иначе None"""
+    # isdigit() пропускает и '²', и числа, которые не поместятся в BIGINT
+    if token.isascii() and token.isdigit():
+        value = int(token)
+        if 0 < value < TELEGRAM_ID_LIMIT:
+            return value
+    return None
+
+
+def _escape_like(value: str) -> str:
+    # Обратная косая черта - экранирующий символ LIKE по умолчанию
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search_condition(prefix: str):
+    pattern = _escape_like(prefix) + '%'
+    # Выражения совпадают с индексами ix_users_username_lower / ix_users_full_name_lower
+    conditions = [
+        func.lower(User.username).like(pattern),
+        func.lower(User.full_name).like(pattern),
+    ]
+    telegram_id = parse_telegram_id(prefix)
+    if telegram_id is not None:
+        conditions.append(User.telegram_id == telegram_id)
+    return or_(*conditions)
+
+
+async def get_staff(session: AsyncSession) -> list:
+    """Администраторы и менеджеры (частичный индекс ix_users_staff)"""
+    return (await session.scalars(
+        select(User).where(User.role != UserRole.USER).order_by(User.role, User.id)
+    )).all()
+
+
+async def get_users_page(session: AsyncSession, prefix: str = None, before_id: int = None,
+                         after_id: int = None, page_size: int = None) -> UsersPage:
+    """
+    Страница пользователей, при prefix - только с username/именем на этот префикс
+    (или с таким Telegram ID).
+    
+    Пагинация по ключу, как в списке мероприятий: before_id - страница старше,
+    after_id - новее, без параметров - самые новые. Общее число пользователей
+    не считается: без префикса страница читается из первичного ключа, с
+    префиксом - из индексов по lower(...).
+    """
+    page_size = page_size or Config.USERS_PAGE_SIZE
+    
+    statement = select(User)
+    if prefix:
+        statement = statement.where(_search_condition(prefix))
+    if after_id is not None:
+        statement = statement.where(User.id > after_id).order_by(User.id.asc())
+    else:
+        if before_id is not None:
+            statement = statement.where(User.id < before_id)
+        statement = statement.order_by(User.id.desc())
+    # Лишняя строка показывает, есть ли страница дальше в том же направлении
+    users = list((await session.scalars(statement.limit(page_size + 1))).all())
+    
+    more = len(users) > page_size
+    if after_id is not None:
+        users = users[:page_size]
+        users.reverse()
+        return UsersPage(users, has_newer=more, has_older=True)
+    
+    return UsersPage(users[:page_size], has_newer=before_id is not None, has_older=more)
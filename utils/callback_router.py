@@ -0,0 +1,113 @@
+from telegram import Update
+from utils.user_cache import get_user
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+_PARAM_RE = re.compile(r'\{(\w+)(?::(int|str))?\}')
+
+# Тип параметра: (регулярное выражение, преобразование)
+_CONVERTERS = {
+    'int': (r'-?\d+', int),
+    'str': (r'[^_]+', str),
+}
+
+
+class Route:
+    """Маршрут callback-кнопки"""
+    
+    __slots__ = ('pattern', 'handler', 'roles', 'regex', 'converters')
+    
+    def __init__(self, pattern: str, handler, roles, regex=None, converters=()):
+        self.pattern = pattern
+        self.handler = handler
+        self.roles = roles
+        self.regex = regex
+        self.converters = converters
+
+
+class CallbackRouter:
+    """
+    Маршрутизация callback_data по таблице маршрутов.
+    
+    Шаблон маршрута - строка с параметрами: "close_event_{event_id:int}",
+    "rate_{event_id:int}_{rating_value:int}". Маршруты без параметров ищутся в словаре
+    по точному совпадению, с параметрами - по литеральному префиксу до первого
+    параметра (он должен заканчиваться на "_"): перебираются только префиксы
+    callback_data по границам "_", от длинного к короткому, поэтому
+    "confirm_close_all" и "confirm_close_{id}" не путаются и порядок
+    регистрации не важен.
+    
+    roles - роли, которым доступен маршрут; None - всем. Роль читается из кэша
+    пользователей и только для маршрутов с ограничением.
+    """
+    
+    def __init__(self, denied_text: str = "❌ У вас нет прав"):
+        self.denied_text = denied_text
+        self._exact = {}
+        self._prefixed = {}
+    
+    def add(self, pattern: str, handler, roles=None) -> None:
+        """Зарегистрировать handler(update, context, **параметры) для шаблона"""
+        roles = frozenset(roles) if roles is not None else None
+        
+        first = _PARAM_RE.search(pattern)
+        if first is None:
+            if pattern in self._exact:
+                raise ValueError(f"Маршрут {pattern} уже зарегистрирован")
+            self._exact[pattern] = Route(pattern, handler, roles)
+            return
+        
+        prefix = pattern[:first.start()]
+        if not prefix.endswith('_'):
+            raise ValueError(f"Параметр маршрута {pattern} должен идти после '_'")
+        
+        regex, converters, position = '', [], first.start()
+        for param in _PARAM_RE.finditer(pattern, first.start()):
+            expression, convert = _CONVERTERS[param.group(2) or 'str']
+            regex += re.escape(pattern[position:param.start()]) + f"(?P<{param.group(1)}>{expression})"
+            converters.append((param.group(1), convert))
+            position = param.end()
+        regex += re.escape(pattern[position:])
+        
+        routes = self._prefixed.setdefault(prefix, [])
+        if any(route.pattern == pattern for route in routes):
+            raise ValueError(f"Маршрут {pattern} уже зарегистрирован")
+        routes.append(Route(pattern, handler, roles, re.compile(regex), tuple(converters)))
+    
+    def resolve(self, data: str) -> tuple:
+        """(маршрут, параметры) для callback_data или (None, None)"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, {}
+        
+        end = len(data)
+        while True:
+            end = data.rfind('_', 0, end)
+            if end < 0:
+                return None, None
+            for route in self._prefixed.get(data[:end + 1], ()):
+                match = route.regex.fullmatch(data, end + 1)
+                if match is not None:
+                    return route, {name: convert(match.group(name)) for name, convert in route.converters}
+    
+    async def dispatch(self, update: Update, context) -> bool:
+        """Обработать callback-запрос; False - маршрут не найден"""
+        query = update.callback_query
+        route, params = self.resolve(query.data or '')
+        
+        if route is None:
+            await query.answer()
+            logger.warning(f"Неизвестный callback: {query.data}")
+            return False
+        
+        if route.roles is not None:
+            user = await get_user(update.effective_user.id)
+            if not user or user.role not in route.roles:
+                await query.answer(self.denied_text, show_alert=True)
+                return True
+        
+        await query.answer()
+        await route.handler(update, context, **params)
+        return True
@@ -1,7 +1,7 @@
 from functools import wraps
 from telegram import Update
-from database.db import get_session
-from database.models import User, UserRole
+from database.models import UserRole
+from utils.user_cache import get_user, get_or_create_user
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,15 +12,14 @@ def admin_only(func):
     async def wrapper(update: Update, context, *args, **kwargs):
         telegram_id = update.effective_user.id
         
-        with get_session() as session:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            
-            if not user or user.role != UserRole.ADMIN:
-                if update.message:
-                    await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-                elif update.callback_query:
-                    await update.callback_query.answer("❌ У вас нет прав для выполнения этой команды.", show_alert=True)
-                return
+        user = await get_user(telegram_id)
+        
+        if not user or user.role != UserRole.ADMIN:
+            if update.message:
+                await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+            elif update.callback_query:
+                await update.callback_query.answer("❌ У вас нет прав для выполнения этой команды.", show_alert=True)
+            return
         
         return await func(update, context, *args, **kwargs)
     return wrapper
@@ -31,16 +30,15 @@ def manager_or_admin(func):
     async def wrapper(update: Update, context, *args, **kwargs):
         telegram_id = update.effective_user.id
         
-        with get_session() as session:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            
-            # АДМИН АВТОМАТИЧЕСКИ МОЖЕТ ВСЁ ЧТО И МЕНЕДЖЕР
-            if not user or user.role not in [UserRole.MANAGER, UserRole.ADMIN]:
-                if update.message:
-                    await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
-                elif update.callback_query:
-                    await update.callback_query.answer("❌ У вас нет прав для выполнения этой команды.", show_alert=True)
-                return
+        user = await get_user(telegram_id)
+        
+        # АДМИН АВТОМАТИЧЕСКИ МОЖЕТ ВСЁ ЧТО И МЕНЕДЖЕР
+        if not user or user.role not in [UserRole.MANAGER, UserRole.ADMIN]:
+            if update.message:
+                await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
+            elif update.callback_query:
+                await update.callback_query.answer("❌ У вас нет прав для выполнения этой команды.", show_alert=True)
+            return
         
         return await func(update, context, *args, **kwargs)
     return wrapper
@@ -49,22 +47,8 @@ def registered_user(func):
     """Декоратор для проверки регистрации пользователя"""
     @wraps(func)
     async def wrapper(update: Update, context, *args, **kwargs):
-        telegram_id = update.effective_user.id
-        
-        with get_session() as session:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            
-            if not user:
-                # Создаем пользователя автоматически
-                user = User(
-                    telegram_id=telegram_id,
-                    username=update.effective_user.username,
-                    full_name=update.effective_user.full_name,
-                    role=UserRole.USER
-                )
-                session.add(user)
-                session.commit()
-                logger.info(f"Создан новый пользователь: {telegram_id}")
+        # Создаем пользователя автоматически, если его еще нет
+        await get_or_create_user(update.effective_user, UserRole.USER)
         
         return await func(update, context, *args, **kwargs)
     return wrapper
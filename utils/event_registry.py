@@ -0,0 +1,109 @@
+from sqlalchemy import select
+from telegram import InlineKeyboardMarkup
+from database.db import get_async_session
+from database.models import Event, EventStatus
+from utils.keyboards import get_events_keyboard
+from utils.settings import register_invalidator, publish_invalidation
+from config import Config
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ActiveEvent:
+    """Снимок активного мероприятия, не привязанный к сессии БД"""
+    
+    __slots__ = ('id', 'name', 'topic_id', 'status')
+    
+    def __init__(self, event_id: int, name: str, topic_id: int):
+        self.id = event_id
+        self.name = name
+        self.topic_id = topic_id
+        self.status = EventStatus.ACTIVE
+
+
+class ActiveEventRegistry:
+    """
+    Активные мероприятия в памяти процесса.
+    
+    Набор загружается одним запросом при первом обращении и сбрасывается
+    при создании или закрытии мероприятия, в том числе по уведомлению
+    от другой реплики бота. Клавиатура выбора мероприятия строится один раз
+    на каждую версию набора. TTL ограничивает устаревание данных, если
+    уведомление потерялось.
+    """
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._snapshot: tuple = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._lock = asyncio.Lock()
+    
+    def _fresh_snapshot(self) -> tuple:
+        if self._snapshot is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return self._snapshot
+        return None
+    
+    async def _ensure_loaded(self) -> tuple:
+        """Текущий снимок (events, keyboard), при необходимости загруженный из БД"""
+        snapshot = self._fresh_snapshot()
+        if snapshot is not None:
+            return snapshot
+        
+        async with self._lock:
+            snapshot = self._fresh_snapshot()
+            if snapshot is not None:
+                return snapshot
+            
+            version = self._version
+            async with get_async_session() as session:
+                rows = (await session.execute(
+                    select(Event.id, Event.name, Event.topic_id)
+                    .where(Event.status == EventStatus.ACTIVE)
+                    .order_by(Event.id)
+                )).all()
+            
+            events = {row.id: ActiveEvent(row.id, row.name, row.topic_id) for row in rows}
+            keyboard = get_events_keyboard(list(events.values())) if events else None
+            snapshot = (events, keyboard)
+            
+            # Пока шел запрос, набор могли сбросить: такой результат не кэшируем
+            if version == self._version:
+                self._snapshot = snapshot
+                self._loaded_at = time.monotonic()
+            return snapshot
+    
+    async def get_all(self) -> list:
+        """Список активных мероприятий"""
+        events, _ = await self._ensure_loaded()
+        return list(events.values())
+    
+    async def get(self, event_id: int) -> ActiveEvent:
+        """Активное мероприятие по id (None, если не найдено или закрыто)"""
+        events, _ = await self._ensure_loaded()
+        return events.get(event_id)
+    
+    async def get_keyboard(self) -> InlineKeyboardMarkup:
+        """Готовая клавиатура выбора мероприятия (None, если активных нет)"""
+        _, keyboard = await self._ensure_loaded()
+        return keyboard
+    
+    def invalidate(self) -> None:
+        """Сбросить набор (после создания или закрытия мероприятия)"""
+        self._version += 1
+        self._snapshot = None
+
+
+active_events = ActiveEventRegistry(ttl=Config.ACTIVE_EVENTS_CACHE_TTL)
+
+
+register_invalidator('active_events', lambda _: active_events.invalidate())
+
+
+async def invalidate_active_events() -> None:
+    """Сбросить реестр активных мероприятий во всех репликах"""
+    active_events.invalidate()
+    await publish_invalidation('active_events')
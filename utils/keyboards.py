@@ -46,19 +46,48 @@ def get_users_management_menu():
     """Меню управления пользователями"""
     keyboard = [
         [InlineKeyboardButton("📋 Список пользователей", callback_data="users_list")],
+        [InlineKeyboardButton("🔎 Найти пользователя", callback_data="users_search")],
         [InlineKeyboardButton("➕ Добавить админа", callback_data="users_add_admin")],
         [InlineKeyboardButton("➕ Добавить менеджера", callback_data="users_add_manager")],
         [InlineKeyboardButton("➖ Снять роль", callback_data="users_remove_role")],
+        [InlineKeyboardButton("📥 Массовое назначение", callback_data="users_bulk")],
         [InlineKeyboardButton("↩️ Назад", callback_data="main_menu")]
     ]
     return InlineKeyboardMarkup(keyboard)
 
+def get_users_page_keyboard(first_id: int, last_id: int, has_newer: bool, has_older: bool,
+                            found: bool = False) -> InlineKeyboardMarkup:
+    """Клавиатура страницы справочника пользователей (found - страница результатов поиска)"""
+    prefix = "users_found" if found else "users"
+    keyboard = []
+    navigation = []
+    if has_newer:
+        navigation.append(InlineKeyboardButton("⬅️ Новее", callback_data=f"{prefix}_newer_{first_id}"))
+    if has_older:
+        navigation.append(InlineKeyboardButton("Старше ➡️", callback_data=f"{prefix}_older_{last_id}"))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("🔎 Найти пользователя", callback_data="users_search")])
+    keyboard.append([InlineKeyboardButton("↩️ Назад", callback_data="users_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
+def get_bulk_roles_keyboard() -> InlineKeyboardMarkup:
+    """Выбор действия для массового назначения ролей"""
+    keyboard = [
+        [InlineKeyboardButton("👑 Назначить администраторов", callback_data="users_bulk_admin")],
+        [InlineKeyboardButton("👔 Назначить менеджеров", callback_data="users_bulk_manager")],
+        [InlineKeyboardButton("➖ Снять роли", callback_data="users_bulk_user")],
+        [InlineKeyboardButton("↩️ Назад", callback_data="users_menu")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
 def get_stats_menu():
     """Меню статистики"""
     keyboard = [
         [InlineKeyboardButton("📊 Общая статистика", callback_data="stats_general")],
         [InlineKeyboardButton("📄 Экспорт PDF (все)", callback_data="stats_export_all")],
         [InlineKeyboardButton("📄 Экспорт по мероприятию", callback_data="stats_export_event")],
+        [InlineKeyboardButton("🔎 Поиск по вопросам", callback_data="search_start")],
         [InlineKeyboardButton("↩️ Назад", callback_data="main_menu")]
     ]
     return InlineKeyboardMarkup(keyboard)
@@ -87,6 +116,19 @@ def get_events_keyboard(events: list) -> InlineKeyboardMarkup:
     keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel")])
     return InlineKeyboardMarkup(keyboard)
 
+def get_events_list_keyboard(first_id: int, last_id: int, has_newer: bool, has_older: bool) -> InlineKeyboardMarkup:
+    """Клавиатура страницы списка мероприятий"""
+    keyboard = []
+    navigation = []
+    if has_newer:
+        navigation.append(InlineKeyboardButton("⬅️ Новее", callback_data=f"events_newer_{first_id}"))
+    if has_older:
+        navigation.append(InlineKeyboardButton("Старше ➡️", callback_data=f"events_older_{last_id}"))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("↩️ Назад", callback_data="events_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
 def get_events_to_close_keyboard(events: list) -> InlineKeyboardMarkup:
     """Клавиатура для выбора мероприятия для закрытия"""
     keyboard = []
@@ -129,8 +171,8 @@ def get_rating_keyboard(event_id: int) -> InlineKeyboardMarkup:
     keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel")])
     return InlineKeyboardMarkup(keyboard)
 
-def get_events_to_rate_keyboard(events: list) -> InlineKeyboardMarkup:
-    """Клавиатура для выбора мероприятия для оценки"""
+def get_events_to_rate_keyboard(events: list, page: int = 0, has_next: bool = False) -> InlineKeyboardMarkup:
+    """Клавиатура для выбора мероприятия для оценки (с постраничной навигацией)"""
     keyboard = []
     for event in events:
         keyboard.append([
@@ -139,9 +181,30 @@ def get_events_to_rate_keyboard(events: list) -> InlineKeyboardMarkup:
                 callback_data=f"rate_select_{event.id}"
             )
         ])
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"rate_page_{page - 1}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton("Далее ➡️", callback_data=f"rate_page_{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
     keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel")])
     return InlineKeyboardMarkup(keyboard)
 
+def get_search_results_keyboard(page: int = 0, has_next: bool = False) -> InlineKeyboardMarkup:
+    """Навигация по страницам результатов поиска"""
+    keyboard = []
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"search_page_{page - 1}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton("Далее ➡️", callback_data=f"search_page_{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("🔎 Новый поиск", callback_data="search_start")])
+    keyboard.append([InlineKeyboardButton("↩️ Назад", callback_data="stats_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
 # ============ ПОДТВЕРЖДЕНИЯ ============
 
 def get_confirm_keyboard(action: str, item_id: int = None) -> InlineKeyboardMarkup:
@@ -1,17 +1,83 @@
-from database.db import get_session
+from sqlalchemy import select, text
+from sqlalchemy.exc import SQLAlchemyError
+from database.db import async_engine, get_async_session
 from database.models import BotSetting
+from config import Config
 from datetime import datetime
+import asyncio
+import asyncpg
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Канал Postgres, через который реплики бота узнают об изменении настроек
+SETTINGS_CHANNEL = 'bot_settings_changed'
+# Канал сброса кэшей процесса (роли пользователей, меню оценки, активные мероприятия)
+CACHE_CHANNEL = 'bot_cache_invalidated'
+# Ограничение Postgres на размер payload NOTIFY - 8000 байт
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+# Кэш настроек процесса: заполняется при старте, чтение не обращается к БД
+_settings: dict = {}
+_listener_task: asyncio.Task = None
+# Сброс кэшей по уведомлениям: {вид кэша: callback(key или None для всего кэша)}
+_invalidators: dict = {}
+
+
+async def load_settings() -> None:
+    """Загрузить все настройки из БД в кэш процесса"""
+    async with get_async_session() as session:
+        rows = (await session.execute(select(BotSetting.key, BotSetting.value))).all()
+    
+    _settings.clear()
+    _settings.update({key: value for key, value in rows})
+    logger.info(f"Загружено настроек: {len(_settings)}")
+
+
+async def reload_setting(key: str) -> None:
+    """Перечитать одну настройку из БД (по уведомлению от другой реплики)"""
+    async with get_async_session() as session:
+        value = await session.scalar(select(BotSetting.value).filter_by(key=key))
+    
+    if value is None:
+        _settings.pop(key, None)
+    else:
+        _settings[key] = value
+
 
 def get_setting(key: str, default: str = None) -> str:
-    """Получить настройку по ключу"""
-    with get_session() as session:
-        setting = session.query(BotSetting).filter_by(key=key).first()
-        return setting.value if setting else default
-
-def set_setting(key: str, value: str, user_id: int = None) -> None:
-    """Установить настройку"""
-    with get_session() as session:
-        setting = session.query(BotSetting).filter_by(key=key).first()
+    """Получить настройку по ключу (из кэша процесса)"""
+    value = _settings.get(key)
+    return value if value is not None else default
+
+
+def get_int_setting(key: str, default: int = None) -> int:
+    """Получить целочисленную настройку"""
+    value = _settings.get(key)
+    try:
+        return int(value) if value is not None else default
+    except ValueError:
+        logger.warning(f"Настройка {key} не является числом: {value!r}")
+        return default
+
+
+def get_bool_setting(key: str, default: bool = False) -> bool:
+    """Получить логическую настройку"""
+    value = _settings.get(key)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on', 'да')
+
+
+def get_no_events_message() -> str:
+    """Сообщение, которое получает пользователь, если нет активных мероприятий"""
+    return get_setting('no_events_message', DEFAULT_NO_EVENTS_MESSAGE)
+
+
+async def set_setting(key: str, value: str, user_id: int = None) -> None:
+    """Установить настройку (запись в БД, кэш и уведомление остальных реплик)"""
+    async with get_async_session() as session:
+        setting = await session.scalar(select(BotSetting).filter_by(key=key))
         
         if setting:
             setting.value = value
@@ -25,7 +91,126 @@ def set_setting(key: str, value: str, user_id: int = None) -> None:
             )
             session.add(setting)
         
-        session.commit()
+        # NOTIFY доставляется подписчикам только после коммита транзакции
+        await session.execute(
+            text("SELECT pg_notify(:channel, :key)"),
+            {'channel': SETTINGS_CHANNEL, 'key': key}
+        )
+        await session.commit()
+    
+    _settings[key] = value
+
+
+def register_invalidator(kind: str, callback) -> None:
+    """Подписать кэш процесса на сброс по уведомлениям других реплик"""
+    _invalidators[kind] = callback
+
+
+def _invalidation_payloads(kind: str, keys) -> list:
+    """Payload уведомлений вида 'kind' или 'kind:key1,key2', не длиннее лимита NOTIFY"""
+    if keys is None:
+        return [kind]
+    
+    payloads, chunk, size = [], [], len(kind) + 1
+    for key in map(str, keys):
+        if chunk and size + len(key) + 1 > NOTIFY_PAYLOAD_LIMIT:
+            payloads.append(f"{kind}:{','.join(chunk)}")
+            chunk, size = [], len(kind) + 1
+        chunk.append(key)
+        size += len(key) + 1
+    if chunk:
+        payloads.append(f"{kind}:{','.join(chunk)}")
+    return payloads
+
+
+async def publish_invalidation(kind: str, keys=None) -> None:
+    """Сбросить кэш kind во всех репликах (keys=None - весь кэш, иначе только эти ключи)"""
+    try:
+        async with get_async_session() as session:
+            for payload in _invalidation_payloads(kind, keys):
+                await session.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {'channel': CACHE_CHANNEL, 'payload': payload}
+                )
+    except SQLAlchemyError as e:
+        # Остальные реплики увидят изменение по истечении TTL своего кэша
+        logger.error(f"Не удалось разослать сброс кэша {kind}: {e}")
+
+
+def _on_notification(connection, pid, channel, key):
+    """Обработчик уведомления Postgres: перечитать измененную настройку"""
+    asyncio.get_running_loop().create_task(reload_setting(key))
+
+
+def _on_cache_notification(connection, pid, channel, payload):
+    """Обработчик уведомления Postgres: сбросить кэш процесса"""
+    kind, _, keys = payload.partition(':')
+    callback = _invalidators.get(kind)
+    if callback is None:
+        return
+    
+    if not keys:
+        callback(None)
+        return
+    for key in keys.split(','):
+        callback(int(key))
+
+
+def _invalidate_all_caches() -> None:
+    for callback in _invalidators.values():
+        callback(None)
+
+
+async def _listen_settings() -> None:
+    """Держать LISTEN-соединение, переподключаясь при обрыве"""
+    # Отдельное соединение вне пула: LISTEN живет, пока соединение открыто
+    connect_args, connect_kwargs = async_engine.dialect.create_connect_args(async_engine.url)
+    
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(*connect_args, **connect_kwargs)
+            closed = asyncio.Event()
+            connection.add_termination_listener(lambda conn: closed.set())
+            await connection.add_listener(SETTINGS_CHANNEL, _on_notification)
+            await connection.add_listener(CACHE_CHANNEL, _on_cache_notification)
+            
+            # Пока соединения не было, уведомления могли быть пропущены
+            await load_settings()
+            _invalidate_all_caches()
+            await closed.wait()
+            logger.warning("Соединение для уведомлений о настройках закрыто, переподключение")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка подписки на изменения настроек: {e}")
+        finally:
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        
+        await asyncio.sleep(Config.SETTINGS_LISTEN_RETRY)
+
+
+async def start_settings_listener() -> None:
+    """Загрузить настройки и подписаться на их изменения и сброс кэшей"""
+    global _listener_task
+    
+    await load_settings()
+    if _listener_task is None:
+        _listener_task = asyncio.create_task(_listen_settings())
+
+
+async def stop_settings_listener() -> None:
+    """Остановить подписку на изменения настроек"""
+    global _listener_task
+    
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
 
 # Дефолтные сообщения
 DEFAULT_NO_EVENTS_MESSAGE = """ℹ️ В данный момент нет активных мероприятий для обратной связи.
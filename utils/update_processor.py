@@ -0,0 +1,65 @@
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+import asyncio
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений с сохранением порядка внутри одного пользователя.
+    
+    Обновления разных пользователей обрабатываются одновременно (не больше
+    max_concurrent_updates), а обновления одного пользователя - строго по очереди,
+    чтобы шаги диалога (выбор мероприятия, текст вопроса) не перепутались.
+    
+    Если задан router, обновления пользователей другой реплики пересылаются
+    ей до начала обработки (до загрузки user_data из персистентности).
+    """
+    
+    __slots__ = ('_locks', 'router')
+    
+    def __init__(self, max_concurrent_updates: int, router=None):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}
+        self.router = router
+    
+    @staticmethod
+    def _key(update: object):
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None
+    
+    async def process_update(self, update: object, coroutine) -> None:
+        if self.router is not None and await self.router.forward(update):
+            coroutine.close()
+            return
+        
+        key = self._key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+        
+        # Блокировка берется до семафора: очередь одного пользователя не занимает слоты
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+    
+    async def do_process_update(self, update: object, coroutine) -> None:
+        await coroutine
+    
+    async def initialize(self) -> None:
+        pass
+    
+    async def shutdown(self) -> None:
+        if self.router is not None:
+            await self.router.shutdown()
@@ -0,0 +1,92 @@
+from sqlalchemy import select
+from database.db import get_async_session
+from database.models import User, UserRole
+from utils.cache import TTLCache
+from utils.settings import register_invalidator, publish_invalidation
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CachedUser:
+    """Снимок пользователя, не привязанный к сессии БД"""
+
+    __slots__ = ('id', 'telegram_id', 'username', 'full_name', 'role')
+
+    def __init__(self, user: User):
+        self.id = user.id
+        self.telegram_id = user.telegram_id
+        self.username = user.username
+        self.full_name = user.full_name
+        self.role = user.role
+
+
+_cache = TTLCache(ttl=Config.USER_CACHE_TTL, maxsize=Config.USER_CACHE_SIZE)
+
+
+async def get_user(telegram_id: int) -> CachedUser:
+    """Получить пользователя по telegram_id (из кэша или из БД)"""
+    user = _cache.get(telegram_id)
+    if user is not None:
+        return user
+
+    async with get_async_session() as session:
+        db_user = await session.scalar(select(User).filter_by(telegram_id=telegram_id))
+        if not db_user:
+            return None
+        return cache_user(db_user)
+
+
+async def get_or_create_user(tg_user, role: UserRole = UserRole.USER) -> CachedUser:
+    """Получить пользователя или зарегистрировать его с указанной ролью"""
+    user = await get_user(tg_user.id)
+    if user is not None:
+        return user
+
+    async with get_async_session() as session:
+        db_user = User(
+            telegram_id=tg_user.id,
+            username=tg_user.username,
+            full_name=tg_user.full_name,
+            role=role
+        )
+        session.add(db_user)
+        await session.commit()
+        logger.info(f"Создан новый пользователь: {tg_user.id}")
+        return cache_user(db_user)
+
+
+def cache_user(user: User) -> CachedUser:
+    """Положить пользователя в кэш"""
+    cached = CachedUser(user)
+    _cache.set(cached.telegram_id, cached)
+    return cached
+
+
+def _invalidate_local(telegram_id: int = None) -> None:
+    if telegram_id is None:
+        _cache.clear()
+    else:
+        _cache.invalidate(telegram_id)
+
+
+register_invalidator('user', _invalidate_local)
+
+
+async def invalidate_users(telegram_ids: list) -> None:
+    """Сбросить пользователей из кэша во всех репликах (например, после смены роли)"""
+    for telegram_id in telegram_ids:
+        _cache.invalidate(telegram_id)
+    # Роль проверяется по кэшу: без рассылки другая реплика помнила бы старую до TTL
+    await publish_invalidation('user', telegram_ids)
+
+
+async def invalidate_user(telegram_id: int) -> None:
+    """Сбросить пользователя из кэша во всех репликах"""
+    await invalidate_users([telegram_id])
+
+
+def get_user_cache_stats() -> dict:
+    """Счетчики попаданий/промахов кэша пользователей"""
+    return _cache.stats()